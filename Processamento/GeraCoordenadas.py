@@ -1,7 +1,17 @@
-import time
+import argparse
+import csv
+import os
 import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from Processamento.geocodificacao import (
+    BackendLimitado,
+    BackendNominatim,
+    Geocodificador,
+    geocodificar_em_lote,
+    normalizar_endereco,
+    obter_geocodificador
+)
+
+CAMINHO_SAIDA = "coordenadas_associacoes_df.csv"
 
 # =============================================================================
 # LISTA DE ASSOCIAÇÕES E LOCALIDADES
@@ -59,21 +69,16 @@ def get_coordinates(address: str) -> tuple[float | None, float | None]:
     """
     Obtém as coordenadas geográficas de um endereço utilizando o serviço Nominatim.
 
+    As consultas passam pelo cache de `geocodificacao` (LRU em memória + SQLite).
+
     Parâmetros:
         address (str): Endereço para o qual se deseja obter latitude e longitude.
 
     Retorno:
         tuple: Latitude e longitude, ou (None, None) se falhar.
     """
-    geolocator = Nominatim(user_agent="meu_app_localizacao")
-    try:
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude
-        print(f"[Aviso] Endereço não encontrado: {address}")
-    except GeocoderTimedOut:
-        print(f"[Erro] Tempo esgotado para: {address}")
-    return None, None
+    coordenadas = obter_geocodificador().geocodificar(address)
+    return coordenadas if coordenadas else (None, None)
 
 
 # =============================================================================
@@ -84,17 +89,76 @@ def main() -> None:
     """
     Realiza o processo de geocodificação de endereços e salva as coordenadas
     geográficas em um arquivo CSV.
+
+    Localidades repetidas são consultadas uma única vez e resultados em cache são
+    reaproveitados; as demais consultas rodam em paralelo, respeitando o limite
+    de taxa do Nominatim, com novas tentativas em caso de falha transitória.
+
+    Cada associação é acrescentada ao CSV assim que sua localidade é resolvida.
+    Se a execução for interrompida, a próxima retoma do ponto em que parou: as
+    linhas já presentes no arquivo (com coordenadas) não são refeitas. Ao final,
+    o arquivo é reescrito na ordem da lista `enderecos`.
     """
-    dados = []
-    for nome, endereco in enderecos:
-        lat, lon = get_coordinates(endereco)
-        dados.append([nome, endereco, lat, lon])
-        time.sleep(1)  # Delay para respeitar os limites da API
-
-    df = pd.DataFrame(dados, columns=["Mercado", "Endereço", "Latitude", "Longitude"])
-    df.to_csv("coordenadas_associacoes_df.csv", index=False, encoding="utf-8")
+    parser = argparse.ArgumentParser(description="Geocodifica as associações e salva as coordenadas.")
+    parser.add_argument("--saida", default=CAMINHO_SAIDA)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    colunas = ["Mercado", "Endereço", "Latitude", "Longitude"]
+    concluidos = carregar_concluidos(args.saida)
+    pendentes = [(nome, endereco) for nome, endereco in enderecos if (nome, endereco) not in concluidos]
+    print(f"{len(concluidos)} associações já geocodificadas; {len(pendentes)} pendentes.")
+
+    associacoes_por_local = {}
+    for nome, endereco in pendentes:
+        associacoes_por_local.setdefault(normalizar_endereco(endereco), []).append((nome, endereco))
+
+    geocodificador = Geocodificador(backend=BackendLimitado(BackendNominatim()))
+    novo_arquivo = not os.path.exists(args.saida)
+    with open(args.saida, "a", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo)
+        if novo_arquivo:
+            escritor.writerow(colunas)
+
+        locais = [endereco for _, endereco in pendentes]
+        for endereco, coordenadas in geocodificar_em_lote(locais, geocodificador, max_workers=args.workers):
+            if coordenadas is None:
+                continue
+            for nome, endereco_associacao in associacoes_por_local[normalizar_endereco(endereco)]:
+                concluidos[(nome, endereco_associacao)] = coordenadas
+                escritor.writerow([nome, endereco_associacao, *coordenadas])
+            arquivo.flush()
+
+    # Reescreve na ordem original (a ordem define as colunas do modelo)
+    dados = [
+        [nome, endereco, *concluidos.get((nome, endereco), (None, None))]
+        for nome, endereco in enderecos
+    ]
+    df = pd.DataFrame(dados, columns=colunas)
+    temporario = args.saida + ".tmp"
+    df.to_csv(temporario, index=False, encoding="utf-8")
+    os.replace(temporario, args.saida)
     print(df)
 
 
+def carregar_concluidos(caminho: str) -> dict[tuple[str, str], tuple[float, float]]:
+    """
+    Lê um CSV de saída (completo ou parcial) e devolve as associações que já têm coordenadas.
+
+    Parâmetros:
+        caminho (str): CSV com as colunas Mercado, Endereço, Latitude e Longitude.
+
+    Retorno:
+        dict: (Mercado, Endereço) -> (latitude, longitude).
+    """
+    if not os.path.exists(caminho):
+        return {}
+    df = pd.read_csv(caminho).dropna(subset=["Latitude", "Longitude"])
+    return {
+        (nome, endereco): (lat, lon)
+        for nome, endereco, lat, lon in df[["Mercado", "Endereço", "Latitude", "Longitude"]].itertuples(index=False)
+    }
+
+
 if __name__ == "__main__":
     main()
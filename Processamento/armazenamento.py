@@ -0,0 +1,106 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# FORMATOS DE ARQUIVO DAS MATRIZES
+# =============================================================================
+#
+# O formato é escolhido pela extensão do caminho:
+#   .csv      texto, para inspeção (padrão histórico do projeto)
+#   .npy      binário NumPy; os rótulos ficam num arquivo .json ao lado e a
+#             leitura usa np.load(mmap_mode='r'), sem interpretar texto
+#   .parquet  colunar (requer pyarrow), preserva os tipos de cada coluna
+
+FORMATOS = (".csv", ".npy", ".parquet")
+
+
+def formato(caminho: str) -> str:
+    """
+    Devolve a extensão (formato) do caminho, validando-a.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in FORMATOS:
+        raise ValueError(f"Formato de matriz não suportado: '{caminho}' (use {', '.join(FORMATOS)}).")
+    return extensao
+
+
+def caminho_rotulos(caminho: str) -> str:
+    """
+    Caminho do arquivo .json com os rótulos de uma matriz .npy.
+    """
+    return os.path.splitext(caminho)[0] + ".json"
+
+
+def salvar_matriz(df: pd.DataFrame, caminho: str, indice: bool = False, dtype=None) -> None:
+    """
+    Salva uma matriz (DataFrame) no formato indicado pela extensão do caminho.
+
+    Parâmetros:
+        df (pd.DataFrame): Matriz a salvar.
+        caminho (str): Arquivo de saída (.csv, .npy ou .parquet).
+        indice (bool): Se True, os rótulos das linhas também são salvos.
+        dtype: Tipo numérico dos valores (ex.: np.float32). Se None, mantém o
+            tipo original; no .npy, todas as colunas são convertidas para um tipo comum.
+    """
+    extensao = formato(caminho)
+    if dtype is not None:
+        df = df.astype(dtype)
+
+    if extensao == ".csv":
+        df.to_csv(caminho, index=indice)
+    elif extensao == ".parquet":
+        df.to_parquet(caminho, index=indice)
+    else:
+        valores = df.to_numpy(dtype=dtype)
+        np.save(caminho, np.ascontiguousarray(valores), allow_pickle=False)
+        rotulos = {
+            "colunas": [str(c) for c in df.columns],
+            "indice": [str(i) for i in df.index] if indice else None,
+        }
+        with open(caminho_rotulos(caminho), "w", encoding="utf-8") as arquivo:
+            json.dump(rotulos, arquivo, ensure_ascii=False)
+
+
+def carregar_array(caminho: str, mmap: bool = True) -> tuple[np.ndarray, list[str], list[str] | None]:
+    """
+    Carrega uma matriz .npy como array, sem cópia (memory map somente leitura).
+
+    Parâmetros:
+        caminho (str): Arquivo .npy salvo por `salvar_matriz`.
+        mmap (bool): Se True, mapeia o arquivo em memória em vez de lê-lo.
+
+    Retorno:
+        tuple: (valores, rótulos das colunas, rótulos das linhas ou None).
+    """
+    if formato(caminho) != ".npy":
+        raise ValueError(f"carregar_array só lê arquivos .npy: '{caminho}'.")
+    valores = np.load(caminho, mmap_mode="r" if mmap else None, allow_pickle=False)
+    with open(caminho_rotulos(caminho), encoding="utf-8") as arquivo:
+        rotulos = json.load(arquivo)
+    return valores, rotulos["colunas"], rotulos["indice"]
+
+
+def carregar_matriz(caminho: str, indice: bool = False, mmap: bool = True) -> pd.DataFrame:
+    """
+    Carrega uma matriz salva por `salvar_matriz` (ou um CSV do projeto).
+
+    Parâmetros:
+        caminho (str): Arquivo .csv, .npy ou .parquet.
+        indice (bool): Para .csv, indica se a primeira coluna são os rótulos das
+            linhas (nos demais formatos essa informação está no próprio arquivo).
+        mmap (bool): Para .npy, usa memory map em vez de ler o arquivo inteiro.
+
+    Retorno:
+        pd.DataFrame: A matriz com seus rótulos.
+    """
+    extensao = formato(caminho)
+    if extensao == ".csv":
+        return pd.read_csv(caminho, index_col=0 if indice else None)
+    if extensao == ".parquet":
+        return pd.read_parquet(caminho)
+
+    valores, colunas, linhas = carregar_array(caminho, mmap=mmap)
+    return pd.DataFrame(valores, columns=colunas, index=linhas, copy=False)
@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# =============================================================================
+# PARÂMETROS
+# =============================================================================
+
+# Rotas medidas na primeira requisição de cada processo, na ordem em que são chamadas
+ROTAS = ["/", "/avaliar", "/mapa/mercados.html", "/recomendacoes"]
+
+# Sessão usada em /recomendacoes (coordenadas informadas: sem geocodificação)
+SESSAO_RECOMENDACOES = {
+    "nome": "benchmark",
+    "dist_max_km": 20.0,
+    "latitude": "-15.7634",
+    "longitude": "-47.8703",
+    "endereco": "ULEG UNB",
+    "preferencias_str": "banana,manga,tomate",
+    "data_preferencia": "2026-05-10",
+    "prefere_organicos": 1,
+}
+
+# =============================================================================
+# MEDIÇÃO EM UM PROCESSO NOVO
+# =============================================================================
+
+
+def medir_processo(aguardar_aquecimento: bool) -> dict:
+    """
+    Importa o app neste processo (que deve ser novo) e mede, em segundos: a
+    importação, a espera pelo aquecimento (se `aguardar_aquecimento`) e a
+    primeira requisição a cada rota de ROTAS.
+    """
+    medidas = {}
+    # O app e o pipeline imprimem mensagens de depuração; a saída é descartada
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        import app as aplicacao
+        medidas["importacao"] = time.perf_counter() - inicio
+
+        if aguardar_aquecimento and aplicacao.aquecimento is not None:
+            inicio = time.perf_counter()
+            aplicacao.aquecimento.join()
+            medidas["aquecimento"] = time.perf_counter() - inicio
+
+        cliente = aplicacao.app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao.update(SESSAO_RECOMENDACOES)
+        for rota in ROTAS:
+            inicio = time.perf_counter()
+            resposta = cliente.get(rota)
+            medidas[rota] = time.perf_counter() - inicio
+            if resposta.status_code != 200:
+                raise RuntimeError(f"{rota} respondeu {resposta.status_code}")
+    return medidas
+
+
+def executar_processo(modo: str) -> dict:
+    """
+    Roda `medir_processo` num interpretador novo, no modo 'frio' (sem aquecimento:
+    tudo é gerado na primeira requisição) ou 'aquecido' (aguarda o aquecimento
+    em segundo plano antes das requisições). Inclui o tempo total do processo.
+    """
+    ambiente = dict(os.environ)
+    if modo == "frio":
+        ambiente["SRA_AQUECER"] = "0"
+    else:
+        ambiente.pop("SRA_AQUECER", None)
+
+    inicio = time.perf_counter()
+    saida = subprocess.run(
+        [sys.executable, "-m", "Processamento.benchmark_inicializacao", "--processo", modo],
+        env=ambiente, capture_output=True, text=True, check=True
+    ).stdout
+    total = time.perf_counter() - inicio
+
+    medidas = json.loads(saida.strip().splitlines()[-1])
+    medidas["processo"] = total
+    return medidas
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+
+def main() -> int:
+    """
+    Mede a inicialização do app em processos novos: tempo de importação, do
+    aquecimento em segundo plano e da primeira requisição a cada rota, com e
+    sem aquecimento. Mostra a mediana de cada medida (em ms) entre as repetições.
+
+    Deve ser executado na raiz do repositório (os caminhos do config são relativos).
+    """
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização do app Flask.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--modos", nargs="+", choices=["frio", "aquecido"], default=["frio", "aquecido"])
+    parser.add_argument("--json", help="Grava as medidas de todas as repetições neste arquivo.")
+    parser.add_argument("--processo", choices=["frio", "aquecido"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.processo:
+        print(json.dumps(medir_processo(aguardar_aquecimento=args.processo == "aquecido")))
+        return 0
+
+    resultados = {
+        modo: [executar_processo(modo) for _ in range(args.repeticoes)]
+        for modo in args.modos
+    }
+
+    for modo, execucoes in resultados.items():
+        print(f"Modo {modo} (mediana de {len(execucoes)} processos):")
+        for medida in execucoes[0]:
+            mediana = statistics.median(execucao[medida] for execucao in execucoes)
+            print(f"  {medida:<22} {mediana * 1000:9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,424 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from Processamento.cache_recomendacoes import normalizar_itens
+from Processamento.catalogo import CatalogoMercados
+from Processamento.config import ITENS_DISPONIVEIS, SAZONALIDADE
+from Processamento.gerar_matriz import (
+    gerar_matriz_usuario_item,
+    gerar_usuario_item_esparso,
+    gerar_matriz_item_mercado,
+    gerar_matriz_utilidade
+)
+from Processamento.gerar_previsao import prever_top_n, recomendar_para_novo_usuario, similaridades_vizinhos
+from Processamento.main import colunas_proximas, gerar_recomendacoes, itens_sazonais, montar_recomendacoes
+from Processamento.modelo import PERCENTUAL_ORGANICO, ModeloMensal
+from Processamento.usuarios_registrados import linha_utilidade
+
+# =============================================================================
+# PARÂMETROS
+# =============================================================================
+
+# Cenários padrão, "mercados x usuários simulados"
+CENARIOS_PADRAO = ["40x5000", "400x5000", "400x20000"]
+
+# Linha de base versionada no repositório (ver --salvar-linha-de-base e --comparar)
+CAMINHO_LINHA_DE_BASE = "Processamento/benchmarks/linha_de_base.json"
+
+# Uma etapa regride quando o p50 passa da linha de base por mais que TOLERANCIA
+# (fração) e por mais que PISO_RUIDO_MS (diferenças menores são ruído de medição).
+# Entre execuções na mesma máquina o p50 varia até ~40%; a linha de base só é
+# comparável com medições da máquina em que foi gerada (ver "metadados").
+TOLERANCIA = 0.5
+PISO_RUIDO_MS = 0.05
+
+# Mercados sintéticos: espalhados num quadrado de +-0,35 grau (~40 km) em torno
+# do centro de Brasília, com endereços nas regiões administrativas abaixo
+CENTRO_BRASILIA = (-15.7939, -47.8828)
+RAIO_GRAUS = 0.35
+REGIOES = [
+    "Plano Piloto, DF", "Gama, DF", "Taguatinga, DF", "Ceilândia, DF", "Sobradinho, DF",
+    "Planaltina, DF", "Santa Maria, DF", "São Sebastião, DF", "Brazlândia, DF", "Guará, DF",
+]
+
+# Pedidos sintéticos: raio sorteado entre estes valores e de 1 a 3 itens
+RAIOS_KM = (10, 20, 30, 50)
+TOP_N = 3
+
+# =============================================================================
+# DADOS SINTÉTICOS
+# =============================================================================
+
+
+def catalogo_sintetico(num_mercados: int, seed: int = 42) -> CatalogoMercados:
+    """
+    Catálogo com `num_mercados` mercados fictícios em torno de Brasília
+    (mesmas colunas do CSV de coordenadas).
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Mercado": [f"Mercado Sintético {i}" for i in range(num_mercados)],
+        "Endereço": [REGIOES[i % len(REGIOES)] for i in range(num_mercados)],
+        "Latitude": CENTRO_BRASILIA[0] + rng.uniform(-RAIO_GRAUS, RAIO_GRAUS, num_mercados),
+        "Longitude": CENTRO_BRASILIA[1] + rng.uniform(-RAIO_GRAUS, RAIO_GRAUS, num_mercados),
+    })
+    return CatalogoMercados(f"<sintético {num_mercados}>", (None, 0, num_mercados), df)
+
+
+def pedidos_sinteticos(num_pedidos: int, mes: int, seed: int = 42) -> list[tuple]:
+    """
+    Pedidos de recomendação (latitude, longitude, raio_km, itens, orgânico) na
+    mesma região dos mercados sintéticos. Os itens são sorteados entre os
+    sazonais do mês, para que quase todos os pedidos passem por todas as etapas.
+    """
+    rng = np.random.default_rng(seed + 1)
+    sazonais = [item for item in ITENS_DISPONIVEIS if mes in SAZONALIDADE.get(item, [])]
+    pedidos = []
+    for _ in range(num_pedidos):
+        itens = rng.choice(sazonais, size=rng.integers(1, min(3, len(sazonais)) + 1), replace=False).tolist()
+        pedidos.append((
+            CENTRO_BRASILIA[0] + rng.uniform(-RAIO_GRAUS, RAIO_GRAUS),
+            CENTRO_BRASILIA[1] + rng.uniform(-RAIO_GRAUS, RAIO_GRAUS),
+            float(rng.choice(RAIOS_KM)),
+            itens,
+            int(rng.integers(0, 2)),
+        ))
+    return pedidos
+
+# =============================================================================
+# MEDIÇÃO
+# =============================================================================
+
+
+class Cronometro:
+    """
+    Executa funções registrando a duração de cada uma (em segundos) na sua etapa.
+    """
+
+    def __init__(self):
+        self.amostras = defaultdict(list)
+
+    def __call__(self, etapa: str, funcao):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        self.amostras[etapa].append(time.perf_counter() - inicio)
+        return resultado
+
+
+class PicoMemoria:
+    """
+    Executa funções medindo, com tracemalloc, o pico de memória alocada durante
+    a primeira execução de cada etapa (as seguintes não são medidas).
+    """
+
+    def __init__(self):
+        self.picos = {}
+
+    def __call__(self, etapa: str, funcao):
+        if etapa in self.picos:
+            return funcao()
+        tracemalloc.start()
+        try:
+            resultado = funcao()
+            self.picos[etapa] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return resultado
+
+
+def resumir(amostras: list[float], pico_bytes: int | None) -> dict:
+    """
+    Percentis p50/p95/p99 e média (em ms) das amostras, e o pico de memória (em MB).
+    """
+    ms = np.asarray(amostras) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "amostras": len(amostras),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "media_ms": round(float(ms.mean()), 4),
+        "pico_memoria_mb": None if pico_bytes is None else round(pico_bytes / 2 ** 20, 3),
+    }
+
+# =============================================================================
+# ETAPAS
+# =============================================================================
+
+
+def construir_modelo_sintetico(catalogo: CatalogoMercados, num_usuarios: int, mes: int, medir) -> ModeloMensal:
+    """
+    Monta o modelo do mês sobre o catálogo sintético, como `modelo.construir_modelo`,
+    medindo cada matriz como uma etapa.
+    """
+    mercados = [f"{m} {e}" for m, e in zip(catalogo.nomes, catalogo.enderecos)]
+    usuario_item = medir("gerar_usuario_item_esparso", lambda: gerar_usuario_item_esparso(
+        mes=mes, percentual_organico=PERCENTUAL_ORGANICO, num_usuarios=num_usuarios
+    ))
+    item_mercado = medir("gerar_matriz_item_mercado", lambda: gerar_matriz_item_mercado(
+        mes=mes, mercados=mercados, path_saida=None
+    ))
+    utilidade = medir("gerar_matriz_utilidade", lambda: gerar_matriz_utilidade(
+        usuario_item=usuario_item, item_mercado=item_mercado, path_saida=None
+    ))
+    return medir("modelo_mensal", lambda: ModeloMensal(
+        mes=mes,
+        versao="benchmark",
+        itens=usuario_item.itens,
+        mercados=mercados,
+        usuario_item=usuario_item.pesos,
+        usuario_organico=usuario_item.organico,
+        item_mercado=item_mercado.drop(index="Organico").to_numpy(dtype=float),
+        mercado_organico=item_mercado.loc["Organico"].to_numpy(dtype=float),
+        utilidade=utilidade.to_numpy(dtype=float)
+    ))
+
+
+def recomendar(catalogo: CatalogoMercados, modelo: ModeloMensal, pedido: tuple, medir):
+    """
+    Atende um pedido com as etapas de `main._calcular_recomendacoes` (as mesmas
+    funções, chamadas uma a uma), medindo cada uma separadamente. A matriz é a
+    do modelo sintético, sem os usuários registrados, e sem k vizinhos.
+
+    Retorno:
+        tuple | None: (mercados recomendados, colunas próximas, linha do usuário),
+        ou None se o pedido não tiver mercados no raio ou itens sazonais.
+    """
+    latitude, longitude, raio_km, itens, organico = pedido
+    itens = normalizar_itens(itens)
+
+    ids, distancias = medir("distancia", lambda: catalogo.indice_espacial.no_raio(latitude, longitude, raio_km))
+    sazonais = medir("filtro_sazonal", lambda: itens_sazonais(itens, modelo.mes))
+    if len(ids) == 0 or not sazonais:
+        return None
+
+    vetor = medir("linha_usuario", lambda: linha_utilidade(modelo, sazonais, organico))
+
+    def similaridade():
+        colunas = colunas_proximas(modelo, ids)
+        return (colunas, *similaridades_vizinhos(modelo.matriz, vetor, colunas))
+
+    colunas, matriz, similaridades = medir("similaridade", similaridade)
+    recomendacoes = medir("previsao", lambda: prever_top_n(matriz, vetor, colunas, similaridades, TOP_N))
+    resultado = medir("montagem", lambda: montar_recomendacoes(
+        catalogo, modelo, recomendacoes["item_index"], ids, distancias
+    ))
+    return resultado, colunas, vetor
+
+
+def aquecer(mes: int) -> None:
+    """
+    Executa uma vez, sem medir e com dados mínimos, os caminhos medidos: importa
+    as dependências carregadas sob demanda (sklearn no índice espacial e na
+    similaridade legada) e evita que o primeiro cenário pague a primeira execução.
+    """
+    catalogo = catalogo_sintetico(2)
+    construir_modelo_sintetico(catalogo, 10, mes, lambda _, funcao: funcao())
+    recomendar_para_novo_usuario(pd.DataFrame(np.eye(3)), top_n=1)
+
+
+def executar_cenario(num_mercados: int, num_usuarios: int, pedidos: list[tuple], mes: int,
+                     repeticoes_matriz: int, pedidos_legado: int, seed: int) -> dict:
+    """
+    Mede um cenário: catálogo e matrizes (`repeticoes_matriz` vezes cada), cada
+    etapa de um pedido (para todos os `pedidos`) e o caminho legado
+    `recomendar_para_novo_usuario` (nos primeiros `pedidos_legado` atendidos).
+    """
+    cronometro, memoria = Cronometro(), PicoMemoria()
+    for _ in range(repeticoes_matriz):
+        cronometro("catalogo", lambda: catalogo_sintetico(num_mercados, seed))
+    catalogo = memoria("catalogo", lambda: catalogo_sintetico(num_mercados, seed))
+
+    for _ in range(repeticoes_matriz):
+        construir_modelo_sintetico(catalogo, num_usuarios, mes, cronometro)
+    modelo = construir_modelo_sintetico(catalogo, num_usuarios, mes, memoria)
+
+    # Versão densa (DataFrame) da matriz usuário x item, usada pelo pipeline em CSV
+    for _ in range(repeticoes_matriz):
+        cronometro("gerar_matriz_usuario_item", lambda: gerar_matriz_usuario_item(
+            mes=mes, percentual_organico=PERCENTUAL_ORGANICO, num_usuarios=num_usuarios, path_saida=None
+        ))
+    memoria("gerar_matriz_usuario_item", lambda: gerar_matriz_usuario_item(
+        mes=mes, percentual_organico=PERCENTUAL_ORGANICO, num_usuarios=num_usuarios, path_saida=None
+    ))
+
+    atendidos = []
+    for pedido in pedidos:
+        atendido = cronometro("pedido_total", lambda: recomendar(catalogo, modelo, pedido, cronometro))
+        if atendido is not None:
+            atendidos.append(pedido)
+            if len(atendidos) <= pedidos_legado:
+                _, colunas, vetor = atendido
+                base = np.vstack([modelo.utilidade[:, colunas], vetor[colunas]])
+                cronometro("recomendar_para_novo_usuario",
+                           lambda: recomendar_para_novo_usuario(pd.DataFrame(base), top_n=TOP_N))
+    if atendidos:
+        # Pico do pedido inteiro e, numa segunda passada, o de cada etapa
+        # (as medições do tracemalloc não podem ser aninhadas)
+        memoria("pedido_total", lambda: recomendar(catalogo, modelo, atendidos[0], lambda _, funcao: funcao()))
+        _, colunas, vetor = recomendar(catalogo, modelo, atendidos[0], memoria)
+        base = np.vstack([modelo.utilidade[:, colunas], vetor[colunas]])
+        memoria("recomendar_para_novo_usuario",
+                lambda: recomendar_para_novo_usuario(pd.DataFrame(base), top_n=TOP_N))
+
+    return {
+        "mercados": num_mercados,
+        "usuarios": num_usuarios,
+        "pedidos_atendidos": len(atendidos),
+        "etapas": {
+            etapa: resumir(amostras, memoria.picos.get(etapa))
+            for etapa, amostras in cronometro.amostras.items()
+        },
+    }
+
+
+def executar_pipeline_real(pedidos: list[tuple], mes: int) -> dict:
+    """
+    Mede `main.gerar_recomendacoes` de ponta a ponta (sem cache) sobre os dados
+    do repositório: catálogo real e modelo do mês com os usuários simulados.
+    """
+    cronometro = Cronometro()
+    # gerar_recomendacoes é verboso; a saída é descartada durante a medição
+    with contextlib.redirect_stdout(io.StringIO()):
+        for latitude, longitude, raio_km, itens, organico in [pedidos[0]] + pedidos:
+            cronometro("gerar_recomendacoes", lambda: gerar_recomendacoes(
+                None, itens, organico, mes, raio_km, latitude, longitude, usar_cache=False
+            ))
+    # A primeira chamada (que gera o modelo do mês) fica de fora
+    cronometro.amostras["gerar_recomendacoes"].pop(0)
+    return {"etapas": {etapa: resumir(a, None) for etapa, a in cronometro.amostras.items()}}
+
+# =============================================================================
+# COMPARAÇÃO COM A LINHA DE BASE
+# =============================================================================
+
+
+def comparar(atual: dict, base: dict, tolerancia: float = TOLERANCIA) -> list[str]:
+    """
+    Lista as etapas cujo p50 piorou em relação à linha de base (mesmo cenário e
+    etapa), além de TOLERANCIA e de PISO_RUIDO_MS.
+    """
+    regressoes = []
+    for cenario, resultado in atual["cenarios"].items():
+        etapas_base = base.get("cenarios", {}).get(cenario, {}).get("etapas", {})
+        for etapa, medidas in resultado["etapas"].items():
+            if etapa not in etapas_base:
+                continue
+            p50, p50_base = medidas["p50_ms"], etapas_base[etapa]["p50_ms"]
+            if p50 > p50_base * (1 + tolerancia) and p50 - p50_base > PISO_RUIDO_MS:
+                regressoes.append(
+                    f"{cenario} / {etapa}: p50 {p50:.3f} ms (linha de base {p50_base:.3f} ms, "
+                    f"+{(p50 / p50_base - 1) * 100:.0f}%)"
+                )
+    return regressoes
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+
+def main() -> int:
+    """
+    Mede cada etapa do pipeline de recomendação em cenários sintéticos de N
+    mercados x M usuários e grava/compara os resultados em JSON.
+
+    Retorno:
+        int: 1 se alguma etapa regrediu em relação à linha de base (--comparar), 0 caso contrário.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline de recomendação.")
+    parser.add_argument("--cenarios", nargs="+", default=CENARIOS_PADRAO,
+                        help="Cenários 'mercadosxusuarios' (ex.: 400x20000).")
+    parser.add_argument("--pedidos", type=int, default=200, help="Pedidos sintéticos por cenário.")
+    parser.add_argument("--pedidos-legado", type=int, default=20,
+                        help="Pedidos medidos também com recomendar_para_novo_usuario.")
+    parser.add_argument("--repeticoes-matriz", type=int, default=5)
+    parser.add_argument("--mes", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sem-pipeline-real", action="store_true",
+                        help="Não mede gerar_recomendacoes sobre os dados do repositório.")
+    parser.add_argument("--saida", help="Grava o resultado neste arquivo JSON.")
+    parser.add_argument("--salvar-linha-de-base", action="store_true",
+                        help=f"Grava o resultado em {CAMINHO_LINHA_DE_BASE}.")
+    parser.add_argument("--comparar", nargs="?", const=CAMINHO_LINHA_DE_BASE,
+                        help="Compara com uma linha de base (padrão: a versionada).")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args()
+
+    pedidos = pedidos_sinteticos(args.pedidos, args.mes, args.seed)
+    aquecer(args.mes)
+    resultado = {
+        "metadados": {
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pedidos": args.pedidos,
+            "pedidos_legado": args.pedidos_legado,
+            "repeticoes_matriz": args.repeticoes_matriz,
+            "mes": args.mes,
+            "seed": args.seed,
+        },
+        "cenarios": {},
+    }
+
+    for cenario in args.cenarios:
+        num_mercados, num_usuarios = (int(parte) for parte in cenario.lower().split("x"))
+        print(f"Cenário {cenario}...", file=sys.stderr)
+        resultado["cenarios"][cenario] = executar_cenario(
+            num_mercados, num_usuarios, pedidos, args.mes,
+            args.repeticoes_matriz, args.pedidos_legado, args.seed
+        )
+    if not args.sem_pipeline_real:
+        print("Pipeline real (dados do repositório)...", file=sys.stderr)
+        resultado["cenarios"]["repositorio"] = executar_pipeline_real(pedidos, args.mes)
+
+    # ru_maxrss é dado em KB no Linux
+    resultado["metadados"]["pico_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    for cenario, medidas in resultado["cenarios"].items():
+        print(f"\n{cenario}")
+        print(f"  {'etapa':<30} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'pico MB':>9}")
+        for etapa, m in medidas["etapas"].items():
+            pico = "" if m["pico_memoria_mb"] is None else f"{m['pico_memoria_mb']:.2f}"
+            print(f"  {etapa:<30} {m['amostras']:>5} {m['p50_ms']:>10.3f} {m['p95_ms']:>10.3f} "
+                  f"{m['p99_ms']:>10.3f} {pico:>9}")
+
+    caminhos = [args.saida] if args.saida else []
+    if args.salvar_linha_de_base:
+        caminhos.append(CAMINHO_LINHA_DE_BASE)
+    for caminho in caminhos:
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+            arquivo.write("\n")
+        print(f"\nResultado gravado em {caminho}.")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(resultado, base, args.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} etapa(s) acima da linha de base ({args.comparar}):")
+            for regressao in regressoes:
+                print("  " + regressao)
+            return 1
+        print(f"\nNenhuma regressão em relação a {args.comparar}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
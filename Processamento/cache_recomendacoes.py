@@ -0,0 +1,172 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# =============================================================================
+# PARÂMETROS DO CACHE
+# =============================================================================
+
+# Número máximo de respostas guardadas e validade de cada uma
+TAMANHO_CACHE = 4096
+TTL_SEGUNDOS = 10 * 60
+
+# =============================================================================
+# CHAVE
+# =============================================================================
+
+
+def normalizar_itens(itens_preferidos: list[str]) -> list[str]:
+    """
+    Itens como aparecem em config.SAZONALIDADE ("banana " -> "Banana"), sem
+    repetição e na ordem em que foram informados.
+
+    `main.gerar_recomendacoes` normaliza os itens uma única vez e usa a mesma
+    lista na chave e no cálculo, de modo que pedidos com a mesma chave têm a
+    mesma resposta.
+    """
+    return list(dict.fromkeys(item.strip().capitalize() for item in itens_preferidos))
+
+
+def chave_recomendacao(mes: int, itens_preferidos: list[str], organico: int, ids_mercados,
+                       k_vizinhos: int | None = None, aproximado: bool = False) -> tuple:
+    """
+    Chave do cache de um pedido, com os itens já normalizados (`normalizar_itens`):
+    (mês, itens ordenados, orgânico, ids dos mercados no raio, k, aproximado).
+
+    A resposta depende da localização e do raio só pelo conjunto de mercados
+    no raio, então pedidos de pontos e raios diferentes que alcançam os mesmos
+    mercados compartilham a entrada (e nenhuma entrada traz mercado fora do raio).
+    """
+    return (
+        int(mes),
+        tuple(sorted(itens_preferidos)),
+        int(organico),
+        np.sort(np.asarray(ids_mercados, dtype=np.int64)).tobytes(),
+        k_vizinhos,
+        bool(aproximado),
+    )
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+
+class CacheRecomendacoes:
+    """
+    Cache LRU em memória das respostas de `main.gerar_recomendacoes`.
+
+    Cada entrada guarda, por referência fraca, o modelo do mês e a matriz de
+    vizinhança (utilidade do modelo + usuários registrados, ver
+    `usuarios_registrados.matriz_com_registrados`) usados no cálculo. Se o
+    modelo em uso for outro (nova versão das entradas ou atualização
+    incremental) ou se a matriz tiver mudado (novos registrados ou
+    compactação), a entrada é descartada na consulta.
+
+    Parâmetros:
+        tamanho (int): Número máximo de entradas.
+        ttl (float): Validade de cada entrada, em segundos.
+    """
+
+    def __init__(self, tamanho: int = TAMANHO_CACHE, ttl: float = TTL_SEGUNDOS):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.expiradas = 0
+        self.invalidadas = 0
+        self.removidas = 0
+
+    def buscar(self, chave: tuple, modelo, vizinhos, distancia_por_id: dict) -> list[dict] | None:
+        """
+        Devolve a resposta guardada para `chave`, calculada com `modelo` e a
+        matriz de vizinhança `vizinhos`, ou None. As distâncias são as do pedido
+        atual (`distancia_por_id`, ver `com_distancias`).
+        """
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                resultado, expira, referencia_modelo, referencia_vizinhos = entrada
+                if referencia_modelo() is not modelo or referencia_vizinhos() is not vizinhos:
+                    del self._entradas[chave]
+                    self.invalidadas += 1
+                elif expira <= time.monotonic():
+                    del self._entradas[chave]
+                    self.expiradas += 1
+                else:
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return com_distancias(resultado, distancia_por_id)
+            self.falhas += 1
+            return None
+
+    def gravar(self, chave: tuple, modelo, vizinhos, resultado: list[dict]) -> None:
+        """
+        Guarda a resposta calculada com `modelo` e a matriz de vizinhança
+        `vizinhos`, removendo a menos usada se necessário.
+        """
+        entrada = (
+            [dict(mercado) for mercado in resultado],
+            time.monotonic() + self.ttl, weakref.ref(modelo), weakref.ref(vizinhos)
+        )
+        with self._trava:
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho:
+                self._entradas.popitem(last=False)
+                self.removidas += 1
+
+    def limpar(self) -> None:
+        """
+        Descarta todas as entradas (os contadores são mantidos).
+        """
+        with self._trava:
+            self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        """
+        Contadores para dimensionar o cache: acertos, falhas, taxa de acerto,
+        entradas atuais e descartes por validade, mudança de modelo e falta de espaço.
+        """
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "tamanho": self.tamanho,
+                "ttl_segundos": self.ttl,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "expiradas": self.expiradas,
+                "invalidadas": self.invalidadas,
+                "removidas": self.removidas,
+            }
+
+
+def com_distancias(resultado: list[dict], distancia_por_id: dict) -> list[dict]:
+    """
+    Copia uma resposta do cache com 'Distance_km' do pedido atual: a distância
+    de cada mercado (pelo 'Id') vem da consulta ao raio feita para o pedido,
+    que alcança os mesmos mercados da resposta guardada.
+    """
+    return [
+        {**mercado, "Distance_km": distancia_por_id[mercado["Id"]]}
+        for mercado in resultado
+    ]
+
+# =============================================================================
+# INSTÂNCIA DA APLICAÇÃO
+# =============================================================================
+
+_cache = CacheRecomendacoes()
+
+
+def obter_cache() -> CacheRecomendacoes:
+    """
+    Devolve o cache de recomendações usado por `main.gerar_recomendacoes`.
+    """
+    return _cache
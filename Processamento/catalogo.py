@@ -0,0 +1,119 @@
+import os
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from Processamento.config import CAMINHO_COORDENADAS
+from Processamento.geo import IndiceEspacial
+
+# =============================================================================
+# NORMALIZAÇÃO DE NOMES
+# =============================================================================
+
+
+def normalize_str(s):
+    s = str(s).lower().strip().replace(',', '').replace('"', '')
+    s = ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+    return s
+
+# =============================================================================
+# CATÁLOGO DE MERCADOS
+# =============================================================================
+
+
+class CatalogoMercados:
+    """
+    Mercados do CSV de coordenadas, já preparados para as consultas da aplicação.
+
+    Montado uma vez por versão do arquivo (ver `obter_catalogo`) e compartilhado
+    entre requisições; nenhum atributo deve ser alterado.
+
+    O id de um mercado é a posição da sua linha no CSV, a mesma de `config.MERCADOS`
+    e das colunas dos modelos mensais (`ModeloMensal.ids_mercados`). Os arrays
+    abaixo são indexados por esse id e formam a tabela id -> dados do mercado.
+
+    Atributos:
+        caminho (str): CSV de origem (colunas Mercado, Endereço, Latitude, Longitude).
+        assinatura (tuple): (caminho, mtime_ns, tamanho) do arquivo carregado.
+        df (pd.DataFrame): O CSV, na ordem original.
+        nomes (np.ndarray): Coluna Mercado, sem espaços nas pontas.
+        enderecos (np.ndarray): Coluna Endereço, sem espaços nas pontas.
+        latitudes (np.ndarray): Latitudes (float).
+        longitudes (np.ndarray): Longitudes (float).
+        ids (np.ndarray): Id de cada mercado (0 a n-1).
+        chaves (np.ndarray): normalize_str(Mercado) + ' ' + normalize_str(Endereço), por linha.
+        nomes_exibicao (np.ndarray): Nome mostrado nas recomendações (chave do
+            modelo normalizada, com iniciais maiúsculas).
+        id_por_chave (dict[str, int]): Chave do modelo ("Mercado Endereço", como em
+            `config.carregar_mercados`) -> id.
+        produtores (list[str]): "Mercado - Endereço" sem repetição, em ordem alfabética
+            (lista exibida no formulário de avaliação).
+        indice_espacial (IndiceEspacial): Índice para consultas por raio.
+    """
+
+    def __init__(self, caminho: str, assinatura: tuple, df: pd.DataFrame):
+        self.caminho = caminho
+        self.assinatura = assinatura
+        self.df = df
+        self.nomes = df["Mercado"].astype(str).str.strip().to_numpy()
+        self.enderecos = df["Endereço"].astype(str).str.strip().to_numpy()
+        self.latitudes = df["Latitude"].to_numpy(dtype=float)
+        self.longitudes = df["Longitude"].to_numpy(dtype=float)
+        self.ids = np.arange(len(df))
+        self.chaves = np.array([
+            normalize_str(m) + ' ' + normalize_str(e)
+            for m, e in zip(df["Mercado"], df["Endereço"])
+        ], dtype=object)
+        chaves_modelo = [f"{m} {e}" for m, e in zip(self.nomes, self.enderecos)]
+        self.nomes_exibicao = np.array([normalize_str(c).title() for c in chaves_modelo], dtype=object)
+        self.id_por_chave = {chave: i for i, chave in enumerate(chaves_modelo)}
+        self.produtores = sorted({f"{m} - {e}" for m, e in zip(self.nomes, self.enderecos)})
+        self.indice_espacial = IndiceEspacial(self.latitudes, self.longitudes)
+
+        for array in (self.nomes, self.enderecos, self.latitudes, self.longitudes,
+                      self.ids, self.chaves, self.nomes_exibicao):
+            array.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+
+_catalogo: CatalogoMercados | None = None
+_trava = threading.Lock()
+
+
+def assinatura_arquivo(caminho: str) -> tuple:
+    """
+    (caminho, mtime_ns, tamanho) do arquivo; muda sempre que ele é regravado.
+    """
+    estado = os.stat(caminho)
+    return (caminho, estado.st_mtime_ns, estado.st_size)
+
+
+def obter_catalogo(caminho: str = CAMINHO_COORDENADAS) -> CatalogoMercados:
+    """
+    Devolve o catálogo de mercados, carregando o CSV só na primeira chamada e
+    quando o arquivo muda (data de modificação ou tamanho).
+
+    Parâmetros:
+        caminho (str): CSV de coordenadas dos mercados.
+
+    Retorno:
+        CatalogoMercados: Catálogo da versão atual do arquivo.
+
+    Levanta:
+        FileNotFoundError: Se o CSV não existir.
+    """
+    global _catalogo
+    assinatura = assinatura_arquivo(caminho)
+
+    atual = _catalogo
+    if atual is None or atual.assinatura != assinatura:
+        with _trava:
+            atual = _catalogo
+            if atual is None or atual.assinatura != assinatura:
+                atual = CatalogoMercados(caminho, assinatura, pd.read_csv(caminho))
+                _catalogo = atual
+    return atual
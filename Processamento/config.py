@@ -48,13 +48,29 @@ SAZONALIDADE = {
     "Tomate": [2,3,5,10]
 }
 
-import pandas as pd
+CAMINHO_COORDENADAS = "Processamento/coordenadas_associacoes_df.csv"
 
-# Carregue o CSV
-df = pd.read_csv("Processamento/coordenadas_associacoes_df.csv")
 
-# Crie a lista de chaves únicas: nome + endereço, padronizados
-MERCADOS = (df['Mercado'].str.strip() + ' ' + df['Endereço'].str.strip()).tolist()
+def carregar_mercados(caminho=CAMINHO_COORDENADAS):
+    """
+    Lê o CSV de coordenadas e devolve a lista de chaves dos mercados (nome + endereço).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(caminho)
+    return (df['Mercado'].str.strip() + ' ' + df['Endereço'].str.strip()).tolist()
+
+
+# Crie a lista de chaves únicas: nome + endereço, padronizados.
+# A posição de cada chave é o id do mercado (ver catalogo.CatalogoMercados).
+# MERCADOS é lido do CSV no primeiro acesso (config.MERCADOS), não na importação.
+def __getattr__(nome):
+    if nome == "MERCADOS":
+        global MERCADOS
+        MERCADOS = carregar_mercados()
+        return MERCADOS
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
 
 # MERCADOS = [
 #     "Afeca  São Sebastião",
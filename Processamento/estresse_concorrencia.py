@@ -0,0 +1,124 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from Processamento.cache_recomendacoes import CacheRecomendacoes, chave_recomendacao
+from Processamento.main import gerar_recomendacoes
+from Processamento.modelo import limpar_modelos, obter_modelo
+from Processamento.usuarios_registrados import limpar_usuarios_registrados, matriz_com_registrados, registrar_usuario
+
+# =============================================================================
+# CENÁRIOS DE REQUISIÇÃO
+# =============================================================================
+
+# (itens preferidos, orgânico, mês, distância máxima, latitude, longitude)
+CENARIOS = [
+    (["Banana", "Manga", "Tomate"], 1, 5, 20, -15.7634, -47.8703),
+    (["Coco", "Tomate", "Abóbora"], 0, 3, 30, -15.83, -48.05),
+    (["Morango"], 0, 8, 50, -15.8, -47.9),
+    (["Atemóia", "Lichia", "Mamão"], 1, 1, 25, -15.65, -47.79),
+    (["Abacate", "Goiaba", "Quiabo"], 0, 2, 40, -15.88, -48.0),
+    (["Alface", "Repolho"], 1, 4, 35, -16.01, -48.06),
+    (["Tangerina", "Batata", "Agrião"], 0, 6, 30, -15.82, -48.11),
+    (["Uva", "Couve", "Cebola"], 1, 7, 45, -15.6, -47.66),
+    (["Mandioca", "Couve"], 0, 9, 60, -15.79, -47.88),
+    (["Pimentão", "Chuchu", "Gengibre"], 1, 10, 30, -15.9, -47.77),
+    (["Maracujá", "Cenoura"], 0, 11, 25, -15.87, -47.97),
+    (["Cajamanga", "Pitaia", "Beterraba"], 1, 12, 50, -15.76, -47.92),
+]
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+
+def executar(cenario) -> list[dict]:
+    itens, organico, mes, distancia, lat, lon = cenario
+    return gerar_recomendacoes(
+        endereco=None,
+        itens_preferidos=itens,
+        organico=organico,
+        mes_atual=mes,
+        distancia_max_km=distancia,
+        latitude=lat,
+        longitude=lon,
+        usar_cache=False  # o teste compara cálculos concorrentes, não respostas guardadas
+    )
+
+
+def verificar_cache_apos_registro() -> bool:
+    """
+    Confere que uma resposta guardada no cache deixa de valer quando um usuário
+    é registrado no mês (o modelo continua o mesmo; muda a matriz de vizinhança).
+    Usa um arquivo de registro temporário, sem tocar no do repositório.
+    """
+    itens, organico, mes, _, _, _ = CENARIOS[0]
+    cache = CacheRecomendacoes()
+    modelo = obter_modelo(mes)
+    chave = chave_recomendacao(mes, itens, organico, [0, 1, 2])
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "usuarios_registrados.jsonl")
+        try:
+            vizinhos = matriz_com_registrados(modelo, caminho)
+            cache.gravar(chave, modelo, vizinhos, [])
+            if cache.buscar(chave, modelo, vizinhos, {}) is None:
+                return False
+
+            registrar_usuario("verificacao-cache", itens, organico, mes, caminho)
+            novos_vizinhos = matriz_com_registrados(modelo, caminho)
+            return (novos_vizinhos.shape[0] == vizinhos.shape[0] + 1
+                    and cache.buscar(chave, modelo, novos_vizinhos, {}) is None
+                    and cache.estatisticas()["invalidadas"] == 1)
+        finally:
+            limpar_usuarios_registrados()
+
+
+def main() -> int:
+    """
+    Executa os cenários em série para obter as respostas de referência e depois
+    os repete de forma embaralhada em várias threads, com os modelos descartados
+    a cada rodada (forçando gerações concorrentes). Qualquer divergência em
+    relação à referência é reportada.
+
+    Retorno:
+        int: 0 se todas as respostas concorrentes forem idênticas às de referência
+        e o cache for invalidado por novos registros (`verificar_cache_apos_registro`).
+    """
+    parser = argparse.ArgumentParser(description="Teste de estresse concorrente de gerar_recomendacoes.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--repeticoes", type=int, default=10, help="Repetições de cada cenário por rodada.")
+    args = parser.parse_args()
+
+    divergencias = 0
+    total = 0
+    # gerar_recomendacoes é verboso; a saída é descartada durante o teste
+    with contextlib.redirect_stdout(io.StringIO()):
+        limpar_modelos()
+        cache_invalidado = verificar_cache_apos_registro()
+        referencia = {i: executar(c) for i, c in enumerate(CENARIOS)}
+
+        for rodada in range(args.rodadas):
+            limpar_modelos()
+            fila = list(range(len(CENARIOS))) * args.repeticoes
+            random.Random(rodada).shuffle(fila)
+
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                resultados = executor.map(lambda i: (i, executar(CENARIOS[i])), fila)
+                for i, resultado in resultados:
+                    total += 1
+                    if resultado != referencia[i]:
+                        divergencias += 1
+
+    print(f"{total} requisições concorrentes em {args.threads} threads; {divergencias} divergências.")
+    if not cache_invalidado:
+        print("Cache de recomendações não foi invalidado após um novo registro.")
+    return 1 if divergencias or not cache_invalidado else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,399 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# O geopy (~0,2 s de importação) só é carregado pelo BackendNominatim, que o
+# Geocodificador cria na primeira consulta que não está em cache: endereços já
+# em cache e o BackendFixo não dependem dele. Os backends convertem os erros do
+# serviço nos tipos de ERROS, abaixo, e o restante do módulo só trata esses.
+
+# =============================================================================
+# CONFIGURAÇÃO
+# =============================================================================
+
+CAMINHO_CACHE = "Processamento/cache_geocodificacao.sqlite3"
+TTL_SEGUNDOS = 30 * 24 * 3600          # Endereços encontrados: 30 dias
+TTL_NEGATIVO_SEGUNDOS = 24 * 3600      # Endereços não encontrados: 1 dia
+TAMANHO_LRU = 1024
+TAXA_NOMINATIM = 1.0                   # Política de uso do Nominatim: no máximo 1 consulta/s
+
+# =============================================================================
+# NORMALIZAÇÃO DE ENDEREÇOS
+# =============================================================================
+
+
+def normalizar_endereco(endereco: str) -> str:
+    """
+    Gera a chave de cache de um endereço: minúsculas, sem acentos, sem pontuação
+    e com espaços simples. Assim "Gama, DF" e "gama  df" usam a mesma entrada.
+    """
+    s = unicodedata.normalize('NFD', str(endereco).lower())
+    s = ''.join(c for c in s if unicodedata.category(c) != 'Mn')
+    s = re.sub(r"[^\w\s-]", " ", s)
+    return " ".join(s.split())
+
+# =============================================================================
+# ERROS
+# =============================================================================
+
+
+class ErroGeocodificacao(Exception):
+    """
+    Falha do serviço de geocodificação que não adianta repetir (ex.: consulta
+    inválida, autenticação recusada).
+    """
+
+
+class ErroTransitorioGeocodificacao(ErroGeocodificacao):
+    """
+    Falha transitória do serviço (indisponibilidade, cota, timeout): a consulta
+    pode ser repetida mais tarde.
+    """
+
+
+class TempoEsgotadoGeocodificacao(ErroTransitorioGeocodificacao):
+    """
+    O serviço não respondeu dentro do tempo limite.
+    """
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+
+class BackendNominatim:
+    """
+    Geocodificação pelo serviço Nominatim (OpenStreetMap).
+
+    Retorna None quando o endereço não é encontrado. Falhas do serviço são
+    levantadas como ErroGeocodificacao (ou um dos seus subtipos), para que não
+    sejam gravadas no cache.
+
+    Parâmetros:
+        user_agent (str): Identificação exigida pelo Nominatim.
+        timeout (float): Tempo máximo de cada consulta, em segundos.
+    """
+
+    def __init__(self, user_agent: str = "meu_app_localizacao", timeout: float = 10):
+        from geopy.geocoders import Nominatim
+
+        self.timeout = timeout
+        self._cliente = Nominatim(user_agent=user_agent)
+
+    def geocodificar(self, endereco: str) -> tuple[float, float] | None:
+        from geopy.exc import (
+            GeocoderAuthenticationFailure, GeocoderQueryError, GeocoderServiceError, GeocoderTimedOut
+        )
+
+        try:
+            location = self._cliente.geocode(endereco, timeout=self.timeout)
+        except GeocoderTimedOut as erro:
+            raise TempoEsgotadoGeocodificacao(str(erro)) from erro
+        except (GeocoderQueryError, GeocoderAuthenticationFailure) as erro:
+            raise ErroGeocodificacao(str(erro)) from erro
+        except GeocoderServiceError as erro:
+            raise ErroTransitorioGeocodificacao(str(erro)) from erro
+        if location:
+            return location.latitude, location.longitude
+        return None
+
+
+class BackendFixo:
+    """
+    Backend local, sem rede, com coordenadas pré-definidas (útil em testes).
+
+    Parâmetros:
+        coordenadas (dict[str, tuple[float, float]]): Endereço -> (latitude, longitude).
+            As chaves são normalizadas com `normalizar_endereco`.
+    """
+
+    def __init__(self, coordenadas: dict[str, tuple[float, float]]):
+        self.coordenadas = {normalizar_endereco(k): v for k, v in coordenadas.items()}
+        self.consultas = 0
+
+    def geocodificar(self, endereco: str) -> tuple[float, float] | None:
+        self.consultas += 1
+        return self.coordenadas.get(normalizar_endereco(endereco))
+
+
+class LimitadorTaxa:
+    """
+    Balde de fichas (token bucket) compartilhado entre threads.
+
+    Parâmetros:
+        taxa (float): Fichas repostas por segundo (consultas por segundo em regime).
+        capacidade (float): Máximo de fichas acumuladas (tamanho da rajada).
+    """
+
+    def __init__(self, taxa: float, capacidade: float = 1.0):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = capacidade
+        self._ultimo = time.monotonic()
+        self._trava = threading.Lock()
+
+    def aguardar(self) -> None:
+        """
+        Bloqueia até haver uma ficha disponível e a consome.
+        """
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+
+class BackendLimitado:
+    """
+    Envolve um backend com limite de taxa e novas tentativas com espera exponencial.
+
+    Falhas transitórias do serviço (ErroTransitorioGeocodificacao: timeout,
+    indisponibilidade, cota) são repetidas até `tentativas` vezes, esperando
+    `espera_inicial`, 2x, 4x... segundos entre elas. Os demais erros não são repetidos.
+
+    Parâmetros:
+        backend: Backend real (ex.: BackendNominatim).
+        limitador (LimitadorTaxa | None): Limite de taxa; padrão: TAXA_NOMINATIM.
+        tentativas (int): Número máximo de tentativas por endereço.
+        espera_inicial (float): Espera antes da segunda tentativa, em segundos.
+    """
+
+    def __init__(self, backend, limitador: LimitadorTaxa | None = None,
+                 tentativas: int = 3, espera_inicial: float = 1.0):
+        self.backend = backend
+        self.limitador = limitador if limitador is not None else LimitadorTaxa(TAXA_NOMINATIM)
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+
+    def geocodificar(self, endereco: str) -> tuple[float, float] | None:
+        for tentativa in range(self.tentativas):
+            self.limitador.aguardar()
+            try:
+                return self.backend.geocodificar(endereco)
+            except ErroTransitorioGeocodificacao:
+                if tentativa == self.tentativas - 1:
+                    raise
+                time.sleep(self.espera_inicial * 2 ** tentativa)
+
+# =============================================================================
+# CACHE PERSISTENTE (SQLITE)
+# =============================================================================
+
+
+class CacheGeocodificacao:
+    """
+    Cache persistente de geocodificação em SQLite, com validade (TTL).
+
+    Guarda também os endereços não encontrados (cache negativo), com validade
+    própria, normalmente menor.
+
+    Parâmetros:
+        caminho (str): Arquivo SQLite (":memory:" para um cache volátil).
+        ttl (float): Validade de um endereço encontrado, em segundos.
+        ttl_negativo (float): Validade de um endereço não encontrado, em segundos.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CACHE, ttl: float = TTL_SEGUNDOS,
+                 ttl_negativo: float = TTL_NEGATIVO_SEGUNDOS):
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._trava = threading.Lock()
+
+        pasta = os.path.dirname(caminho)
+        if pasta and caminho != ":memory:":
+            os.makedirs(pasta, exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        with self._trava, self._conexao:
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS geocodificacao ("
+                " chave TEXT PRIMARY KEY,"
+                " latitude REAL,"
+                " longitude REAL,"
+                " gravado_em REAL NOT NULL)"
+            )
+
+    def buscar(self, chave: str) -> tuple[bool, tuple[float, float] | None, float | None]:
+        """
+        Procura a chave no cache.
+
+        Retorno:
+            tuple[bool, tuple | None, float | None]: (encontrado_no_cache, coordenadas,
+            gravado_em). Um acerto com coordenadas None é um endereço sabidamente
+            inexistente; `gravado_em` é o timestamp da gravação (None se não encontrado).
+        """
+        with self._trava:
+            linha = self._conexao.execute(
+                "SELECT latitude, longitude, gravado_em FROM geocodificacao WHERE chave = ?",
+                (chave,)
+            ).fetchone()
+        if linha is None:
+            return False, None, None
+
+        latitude, longitude, gravado_em = linha
+        negativo = latitude is None
+        validade = self.ttl_negativo if negativo else self.ttl
+        if time.time() - gravado_em > validade:
+            return False, None, None
+        return True, None if negativo else (latitude, longitude), gravado_em
+
+    def gravar(self, chave: str, coordenadas: tuple[float, float] | None) -> float:
+        """
+        Grava (ou substitui) a chave; coordenadas None registram um endereço não encontrado.
+
+        Retorno:
+            float: O timestamp gravado (`gravado_em`).
+        """
+        latitude, longitude = coordenadas if coordenadas else (None, None)
+        gravado_em = time.time()
+        with self._trava, self._conexao:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO geocodificacao (chave, latitude, longitude, gravado_em)"
+                " VALUES (?, ?, ?, ?)",
+                (chave, latitude, longitude, gravado_em)
+            )
+        return gravado_em
+
+# =============================================================================
+# GEOCODIFICADOR
+# =============================================================================
+
+
+class Geocodificador:
+    """
+    Geocodificação com cache em dois níveis: LRU em memória e SQLite em disco.
+
+    A consulta ao backend (rede) só acontece quando o endereço normalizado não
+    está em nenhum dos caches ou sua entrada expirou. Uma entrada vale no LRU
+    até o mesmo instante em que expira no SQLite (gravação + validade).
+
+    Parâmetros:
+        backend: Objeto com o método `geocodificar(endereco)`, que levanta
+            ErroGeocodificacao em falhas do serviço; padrão: Nominatim, criado
+            só na primeira consulta que não está em cache.
+        cache (CacheGeocodificacao | None): Cache persistente; padrão: SQLite em CAMINHO_CACHE.
+        tamanho_lru (int): Número máximo de endereços no cache em memória.
+    """
+
+    def __init__(self, backend=None, cache: CacheGeocodificacao | None = None,
+                 tamanho_lru: int = TAMANHO_LRU):
+        self._backend = backend
+        self.cache = cache if cache is not None else CacheGeocodificacao()
+        self.tamanho_lru = tamanho_lru
+        self._lru = OrderedDict()
+        self._trava = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._trava:
+                if self._backend is None:
+                    self._backend = BackendNominatim()
+        return self._backend
+
+    def geocodificar(self, endereco: str) -> tuple[float, float] | None:
+        """
+        Obtém as coordenadas (latitude, longitude) do endereço.
+
+        Retorno:
+            tuple[float, float] | None: Coordenadas, ou None se o endereço não
+            foi encontrado ou o serviço falhou.
+        """
+        chave = normalizar_endereco(endereco)
+
+        with self._trava:
+            entrada = self._lru.get(chave)
+            if entrada is not None and entrada[1] > time.time():
+                self._lru.move_to_end(chave)
+                return entrada[0]
+
+        encontrado, coordenadas, gravado_em = self.cache.buscar(chave)
+        if not encontrado:
+            try:
+                coordenadas = self.backend.geocodificar(endereco)
+            except TempoEsgotadoGeocodificacao:
+                print(f"[Erro] Timeout ao tentar geocodificar: {endereco}")
+                return None
+            except ErroGeocodificacao as erro:
+                print(f"[Erro] Falha ao geocodificar {endereco}: {erro}")
+                return None
+            gravado_em = self.cache.gravar(chave, coordenadas)
+
+        if coordenadas is None:
+            print(f"[Erro] Endereço não encontrado: {endereco}")
+        self._lembrar(chave, coordenadas, gravado_em)
+        return coordenadas
+
+    def _lembrar(self, chave: str, coordenadas: tuple[float, float] | None, gravado_em: float) -> None:
+        validade = self.cache.ttl if coordenadas is not None else self.cache.ttl_negativo
+        with self._trava:
+            self._lru[chave] = (coordenadas, gravado_em + validade)
+            self._lru.move_to_end(chave)
+            while len(self._lru) > self.tamanho_lru:
+                self._lru.popitem(last=False)
+
+
+_geocodificador = None
+_trava_geocodificador = threading.Lock()
+
+
+def obter_geocodificador() -> Geocodificador:
+    """
+    Devolve o geocodificador compartilhado do processo, criando-o na primeira chamada.
+    """
+    global _geocodificador
+    with _trava_geocodificador:
+        if _geocodificador is None:
+            _geocodificador = Geocodificador()
+        return _geocodificador
+
+
+def configurar_geocodificador(geocodificador: Geocodificador) -> None:
+    """
+    Substitui o geocodificador compartilhado (ex.: por um com `BackendFixo`, sem rede).
+    """
+    global _geocodificador
+    with _trava_geocodificador:
+        _geocodificador = geocodificador
+
+
+def geocodificar_em_lote(enderecos, geocodificador: Geocodificador | None = None, max_workers: int = 4):
+    """
+    Geocodifica vários endereços em paralelo, consultando cada endereço distinto uma única vez.
+
+    Endereços equivalentes após `normalizar_endereco` são deduplicados. Os que já
+    estão em cache retornam sem consultar o serviço; os demais passam pelo backend
+    do geocodificador (que deve ter seu próprio limite de taxa, ex.: BackendLimitado).
+
+    Parâmetros:
+        enderecos (Iterable[str]): Endereços a geocodificar (podem se repetir).
+        geocodificador (Geocodificador | None): Padrão: o geocodificador compartilhado.
+        max_workers (int): Número de threads.
+
+    Retorno:
+        Iterator[tuple[str, tuple[float, float] | None]]: (endereço, coordenadas), na
+        ordem de conclusão, um por endereço distinto.
+    """
+    if geocodificador is None:
+        geocodificador = obter_geocodificador()
+
+    distintos = {}
+    for endereco in enderecos:
+        distintos.setdefault(normalizar_endereco(endereco), endereco)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {
+            executor.submit(geocodificador.geocodificar, endereco): endereco
+            for endereco in distintos.values()
+        }
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
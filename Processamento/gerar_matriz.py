@@ -1,9 +1,23 @@
 import numpy as np
 import pandas as pd
-from Processamento.config import ITENS_DISPONIVEIS, SAZONALIDADE, MERCADOS
-
-
-def gerar_matriz_usuario_item(mes=5, percentual_organico=0.3, num_usuarios=5000):
+from scipy import sparse
+from Processamento import config
+from Processamento.config import ITENS_DISPONIVEIS, SAZONALIDADE
+from Processamento.armazenamento import carregar_matriz, formato, salvar_matriz
+
+# Fator aplicado à utilidade de mercados não-orgânicos para usuários que preferem orgânicos
+PENALIDADE_NAO_ORGANICO = 0.6
+
+
+def gerar_matriz_usuario_item(
+    mes=5,
+    percentual_organico=0.3,
+    num_usuarios=5000,
+    path_saida="Processamento/usuario_item.csv",
+    seed=42,
+    dtype=np.float64,
+    tamanho_bloco=None
+):
     """
     Gera a matriz de preferência de usuários por itens sazonais.
 
@@ -15,46 +29,228 @@ def gerar_matriz_usuario_item(mes=5, percentual_organico=0.3, num_usuarios=5000)
         Proporção de usuários com preferência por produtos orgânicos (0 a 1).
     num_usuarios : int
         Número total de usuários simulados.
+    path_saida : str or None
+        Caminho do arquivo de saída (.csv, .npy ou .parquet; ver armazenamento.py).
+        Se None, a matriz não é salva em disco.
+    seed : int
+        Semente do gerador aleatório (resultado reprodutível).
+    dtype : numpy dtype
+        Tipo dos pesos (ex.: np.float32 para reduzir a memória pela metade).
+    tamanho_bloco : int or None
+        Se informado, o CSV é gravado bloco a bloco, sem montar a matriz
+        inteira em memória, e a função retorna None (apenas para saída .csv).
 
     Saída
     -----
     Salva o arquivo 'usuario_item.csv' contendo:
         - Pesos de interesse por item sazonal (linha: usuário, coluna: item).
         - Coluna 'Organico' indicando se o usuário tem preferência orgânica.
+
+    Retorno
+    -------
+    pandas.DataFrame or None
+        A mesma matriz gravada no CSV (None no modo em blocos).
+    """
+    blocos = gerar_blocos_usuario_item(
+        mes=mes,
+        percentual_organico=percentual_organico,
+        num_usuarios=num_usuarios,
+        tamanho_bloco=tamanho_bloco,
+        seed=seed,
+        dtype=dtype
+    )
+
+    if tamanho_bloco is not None:
+        if path_saida is None or formato(path_saida) != ".csv":
+            raise ValueError("O modo em blocos exige um 'path_saida' .csv.")
+        for i, bloco in enumerate(blocos):
+            bloco.to_csv(path_saida, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+        print("Matriz de usuário x item salva com sucesso.")
+        return None
+
+    usuario_item = next(blocos)
+    if path_saida is not None:
+        salvar_matriz(usuario_item, path_saida)
+        print("Matriz de usuário x item salva com sucesso.")
+
+    return usuario_item
+
+
+def gerar_blocos_usuario_item(
+    mes=5,
+    percentual_organico=0.3,
+    num_usuarios=5000,
+    tamanho_bloco=None,
+    seed=42,
+    dtype=np.float64
+):
     """
-    np.random.seed(42)
+    Gera a matriz usuário x item em blocos de linhas, de forma vetorizada.
+
+    Cada usuário escolhe n itens distintos, com n uniforme em [1, num_itens - 1],
+    e atribui peso 1/n a cada um. A escolha usa chaves aleatórias por linha: os
+    n itens com as menores chaves são os escolhidos, o que equivale a sortear
+    n itens sem reposição.
+
+    O resultado não depende de `tamanho_bloco`: cada componente aleatório usa um
+    fluxo próprio derivado de `seed`.
+
+    Parâmetros
+    ----------
+    mes : int
+        Mês atual para filtrar itens sazonais.
+    percentual_organico : float
+        Proporção de usuários com preferência por produtos orgânicos (0 a 1).
+    num_usuarios : int
+        Número total de usuários simulados.
+    tamanho_bloco : int or None
+        Número de usuários por bloco. Se None, gera um único bloco.
+    seed : int
+        Semente do gerador aleatório.
+    dtype : numpy dtype
+        Tipo dos pesos.
 
+    Retorno
+    -------
+    Iterator[pandas.DataFrame]
+        Blocos consecutivos da matriz, com a coluna 'Organico' ao final.
+    """
     # Filtra itens disponíveis para o mês atual
     itens_sazonais = [
         item for item in ITENS_DISPONIVEIS if mes in SAZONALIDADE.get(item, [])
     ]
-    num_itens = len(itens_sazonais)
 
-    # Inicializa matriz de zeros (usuários x itens)
-    matriz_usuario_item = np.zeros((num_usuarios, num_itens))
+    for pesos, organico in _gerar_blocos_pesos(
+        len(itens_sazonais), percentual_organico, num_usuarios, tamanho_bloco, seed, dtype
+    ):
+        bloco = pd.DataFrame(pesos, columns=itens_sazonais)
+        bloco["Organico"] = organico
+        yield bloco
 
-    # Atribui pesos aleatórios para os itens escolhidos por cada usuário
-    for usuario_id in range(num_usuarios):
-        n = np.random.randint(1, num_itens)
-        itens_escolhidos = np.random.choice(range(num_itens), n, replace=False)
-        for item_id in itens_escolhidos:
-            matriz_usuario_item[usuario_id, item_id] = 1 / n  # Peso igual por item
 
-    usuario_item = pd.DataFrame(matriz_usuario_item, columns=itens_sazonais)
+def _gerar_blocos_pesos(num_itens, percentual_organico, num_usuarios, tamanho_bloco, seed, dtype):
+    """
+    Núcleo de `gerar_blocos_usuario_item`, comum às versões densa e esparsa:
+    produz, por bloco de linhas, os pesos (já arredondados) e a flag orgânica (int8).
+    """
+    semente_qtd, semente_chaves, semente_org = np.random.SeedSequence(seed).spawn(3)
+    rng_chaves = np.random.default_rng(semente_chaves)
+
+    # Quantidade de itens escolhidos por usuário
+    qtd_itens = np.random.default_rng(semente_qtd).integers(1, num_itens, size=num_usuarios)
 
     # Define usuários com preferência por orgânicos
     qtd_organicos = int(num_usuarios * percentual_organico)
-    organico = np.array([1] * qtd_organicos + [0] * (num_usuarios - qtd_organicos))
-    np.random.shuffle(organico)
-    usuario_item["Organico"] = organico
+    organico = np.zeros(num_usuarios, dtype=np.int8)
+    organico[:qtd_organicos] = 1
+    np.random.default_rng(semente_org).shuffle(organico)
+
+    if tamanho_bloco is None:
+        tamanho_bloco = max(num_usuarios, 1)
+
+    for inicio in range(0, num_usuarios, tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, num_usuarios)
+        n = qtd_itens[inicio:fim, None]
+
+        # Os n itens de menor chave em cada linha são os escolhidos
+        chaves = rng_chaves.random((fim - inicio, num_itens))
+        limiar = np.take_along_axis(np.sort(chaves, axis=1), n - 1, axis=1)
+        escolhidos = chaves <= limiar
+
+        pesos = np.where(escolhidos, 1 / n, 0).astype(dtype)  # Peso igual por item
+        yield np.round(pesos, 2), organico[inicio:fim]
+
+
+class UsuarioItemEsparso:
+    """
+    Matriz usuário x item em formato CSR (scipy.sparse), com a flag orgânica
+    em um array booleano.
+
+    Cada usuário escolhe poucos itens, então a matriz densa é quase toda zeros;
+    aqui a memória cresce com o número de preferências, e não com usuários x itens.
+
+    Atributos:
+        pesos (scipy.sparse.csr_matrix): Pesos usuário x item, shape (n_usuarios, n_itens).
+        organico (np.ndarray): Preferência orgânica de cada usuário (bool).
+        itens (list[str]): Nomes dos itens (colunas de `pesos`).
+    """
 
-    usuario_item = usuario_item.round(2)
-    usuario_item.to_csv("Processamento/usuario_item.csv", index=False)
+    def __init__(self, pesos, organico, itens):
+        self.pesos = sparse.csr_matrix(pesos)
+        self.organico = np.asarray(organico, dtype=bool)
+        self.itens = list(itens)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.pesos.shape
+
+    def densa(self) -> pd.DataFrame:
+        """
+        Converte para o formato denso de `gerar_matriz_usuario_item` (coluna 'Organico' ao final).
+        """
+        tabela = pd.DataFrame(self.pesos.toarray(), columns=self.itens)
+        tabela["Organico"] = self.organico.astype(np.int8)
+        return tabela
+
+
+def gerar_usuario_item_esparso(
+    mes=5,
+    percentual_organico=0.3,
+    num_usuarios=5000,
+    seed=42,
+    dtype=np.float64,
+    tamanho_bloco=10000
+):
+    """
+    Gera a matriz usuário x item diretamente em formato esparso (CSR).
+
+    Os valores são os mesmos de `gerar_matriz_usuario_item` com a mesma semente;
+    a matriz é montada bloco a bloco, de modo que a versão densa nunca existe
+    inteira em memória.
+
+    Parâmetros
+    ----------
+    mes : int
+        Mês atual para filtrar itens sazonais.
+    percentual_organico : float
+        Proporção de usuários com preferência por produtos orgânicos (0 a 1).
+    num_usuarios : int
+        Número total de usuários simulados.
+    seed : int
+        Semente do gerador aleatório.
+    dtype : numpy dtype
+        Tipo dos pesos.
+    tamanho_bloco : int
+        Número de usuários gerados por vez.
+
+    Retorno
+    -------
+    UsuarioItemEsparso
+        Pesos em CSR e flag orgânica booleana.
+    """
+    itens_sazonais = [
+        item for item in ITENS_DISPONIVEIS if mes in SAZONALIDADE.get(item, [])
+    ]
+
+    blocos_pesos = []
+    blocos_organico = []
+    for pesos, organico in _gerar_blocos_pesos(
+        len(itens_sazonais), percentual_organico, num_usuarios, tamanho_bloco, seed, dtype
+    ):
+        blocos_pesos.append(sparse.csr_matrix(pesos))
+        blocos_organico.append(organico)
+
+    if blocos_pesos:
+        pesos = sparse.vstack(blocos_pesos, format="csr")
+        organico = np.concatenate(blocos_organico)
+    else:
+        pesos = sparse.csr_matrix((0, len(itens_sazonais)), dtype=dtype)
+        organico = np.zeros(0, dtype=bool)
 
-    print("Matriz de usuário x item salva com sucesso.")
+    return UsuarioItemEsparso(pesos, organico, itens_sazonais)
 
 
-def gerar_matriz_item_mercado(mes):
+def gerar_matriz_item_mercado(mes, mercados=None, path_saida="Processamento/item_mercado.csv"):
     """
     Gera a matriz de disponibilidade de itens sazonais por mercado.
 
@@ -62,30 +258,44 @@ def gerar_matriz_item_mercado(mes):
     ----------
     mes : int
         Mês atual para filtrar itens sazonais.
+    mercados : list of str or None
+        Chaves dos mercados (colunas). Se None, usa config.MERCADOS.
+    path_saida : str or None
+        Caminho do arquivo de saída (.csv, .npy ou .parquet; ver armazenamento.py).
+        Se None, a matriz não é salva em disco.
 
     Saída
     -----
     Salva o arquivo 'item_mercado.csv' contendo:
         - Disponibilidade de itens por mercado.
         - Linha 'Organico' indicando se o mercado oferece produtos orgânicos.
+
+    Retorno
+    -------
+    pandas.DataFrame
+        A mesma matriz gravada no CSV.
     """
-    np.random.seed(42)
+    # Gerador local (mesma sequência de np.random.seed(42)), sem alterar o estado global
+    rng = np.random.RandomState(42)
+
+    if mercados is None:
+        mercados = config.MERCADOS
 
     # Filtra itens sazonais
     itens_sazonais = [
         item for item in ITENS_DISPONIVEIS if mes in SAZONALIDADE.get(item, [])
     ]
     num_itens = len(itens_sazonais)
-    num_mercados = len(MERCADOS)
+    num_mercados = len(mercados)
 
     # Cria matriz de disponibilidade aleatória
-    matriz_item_mercado = np.random.rand(num_itens, num_mercados)
-    item_mercado = pd.DataFrame(matriz_item_mercado, index=itens_sazonais, columns=MERCADOS)
+    matriz_item_mercado = rng.rand(num_itens, num_mercados)
+    item_mercado = pd.DataFrame(matriz_item_mercado, index=itens_sazonais, columns=mercados)
 
     # Alterna oferta orgânica por cidade
     contagem = {}
     org_flag = []
-    for mercado in MERCADOS:
+    for mercado in mercados:
         cidade = mercado.rsplit("  ", 1)[-1]
         contagem[cidade] = contagem.get(cidade, 0) + 1
         org_flag.append(1 if contagem[cidade] % 2 == 1 else 0)
@@ -93,15 +303,20 @@ def gerar_matriz_item_mercado(mes):
     # Adiciona linha 'Organico' com flag por mercado
     item_mercado.loc["Organico"] = org_flag
     item_mercado = item_mercado.round(2)
-    item_mercado.to_csv("Processamento/item_mercado.csv", index=True)
+    if path_saida is not None:
+        salvar_matriz(item_mercado, path_saida, indice=True)
+        print("Matriz item x mercado salva com sucesso.")
 
-    print("Matriz item x mercado salva com sucesso.")
+    return item_mercado
 
 
 def gerar_matriz_utilidade(
     path_usuario_item="Processamento/usuario_item.csv",
     path_item_mercado="Processamento/item_mercado.csv",
-    path_saida="Processamento/matriz_utilidade.csv"
+    path_saida="Processamento/matriz_utilidade.csv",
+    usuario_item=None,
+    item_mercado=None,
+    dtype_saida=None
 ):
     """
     Gera a matriz de utilidade combinando usuários, itens e mercados.
@@ -111,46 +326,103 @@ def gerar_matriz_utilidade(
     Parâmetros
     ----------
     path_usuario_item : str
-        Caminho para o CSV contendo a matriz usuário x item.
+        Caminho para a matriz usuário x item (.csv, .npy ou .parquet).
     path_item_mercado : str
-        Caminho para o CSV contendo a matriz item x mercado.
-    path_saida : str
-        Caminho para salvar a matriz final de utilidade (usuário x mercado).
+        Caminho para a matriz item x mercado (.csv, .npy ou .parquet).
+    path_saida : str or None
+        Caminho para salvar a matriz final de utilidade (usuário x mercado),
+        em .csv, .npy ou .parquet. Se None, a matriz não é salva em disco.
+    usuario_item : pandas.DataFrame or UsuarioItemEsparso or None
+        Matriz usuário x item já em memória (com a coluna 'Organico' ao final),
+        ou sua versão esparsa (ver `gerar_usuario_item_esparso`), caso em que o
+        produto é esparso x denso. Se fornecida, `path_usuario_item` não é lido.
+    item_mercado : pandas.DataFrame or None
+        Matriz item x mercado já em memória (com a linha 'Organico' ao final).
+        Se fornecida, `path_item_mercado` não é lido.
+    dtype_saida : numpy dtype or None
+        Tipo dos valores gravados (ex.: np.float32 em .npy/.parquet). Se None, float64.
 
     Saída
     -----
     Salva o arquivo 'matriz_utilidade.csv' com os pesos de utilidade por usuário e mercado.
-    """
-    user_item = pd.read_csv(path_usuario_item)
-    item_mercado = pd.read_csv(path_item_mercado, index_col=0)
 
-    usuario_organico = user_item.iloc[:, -1].astype(float)
-    mercado_organico = item_mercado.iloc[-1, :].astype(float)
+    Retorno
+    -------
+    pandas.DataFrame
+        Matriz de utilidade (usuários x mercados).
+    """
+    if usuario_item is None:
+        usuario_item = carregar_matriz(path_usuario_item)
+    if item_mercado is None:
+        item_mercado = carregar_matriz(path_item_mercado, indice=True)
+
+    mercado_organico = item_mercado.iloc[-1, :].to_numpy(dtype=float)
+    item_mercado_sem_org = item_mercado.iloc[:-1, :]
+
+    if isinstance(usuario_item, UsuarioItemEsparso):
+        posicoes = [j for j, item in enumerate(usuario_item.itens) if item in item_mercado_sem_org.index]
+        itens_comuns = [usuario_item.itens[j] for j in posicoes]
+        pesos = usuario_item.pesos[:, posicoes]
+        usuario_organico = usuario_item.organico
+    else:
+        usuario_item_sem_org = usuario_item.iloc[:, :-1]
+        itens_comuns = usuario_item_sem_org.columns.intersection(item_mercado_sem_org.index)
+        pesos = usuario_item_sem_org[itens_comuns].to_numpy(dtype=float)
+        usuario_organico = usuario_item.iloc[:, -1].to_numpy(dtype=float)
+
+    utilidade = calcular_matriz_utilidade(
+        pesos,
+        usuario_organico,
+        item_mercado_sem_org.loc[itens_comuns].to_numpy(dtype=float),
+        mercado_organico
+    )
+    matriz_utilidade = pd.DataFrame(utilidade, columns=item_mercado.columns)
+
+    if path_saida is not None:
+        salvar_matriz(matriz_utilidade, path_saida, dtype=dtype_saida)
+        print("Matriz de utilidade salva com sucesso.")
+
+    return matriz_utilidade
+
+
+def calcular_matriz_utilidade(usuario_item, usuario_organico, item_mercado, mercado_organico):
+    """
+    Calcula a matriz de utilidade a partir de arrays já alinhados por item.
 
-    usuario_item_sem_org = user_item.iloc[:, :-1].astype(float)
-    item_mercado_sem_org = item_mercado.iloc[:-1, :].astype(float)
+    Parâmetros
+    ----------
+    usuario_item : numpy.ndarray or scipy.sparse matrix
+        Pesos usuário x item, shape (n_usuarios, n_itens). Se esparsa, o produto
+        esparso x denso percorre apenas as preferências não nulas.
+    usuario_organico : numpy.ndarray
+        Flag orgânica (0/1 ou bool) de cada usuário, shape (n_usuarios,).
+    item_mercado : numpy.ndarray
+        Disponibilidade item x mercado, shape (n_itens, n_mercados).
+    mercado_organico : numpy.ndarray
+        Flag orgânica (0/1) de cada mercado, shape (n_mercados,).
 
-    itens_comuns = usuario_item_sem_org.columns.intersection(item_mercado_sem_org.index)
-    usuario_item_sem_org = usuario_item_sem_org[itens_comuns]
-    item_mercado_sem_org = item_mercado_sem_org.loc[itens_comuns]
+    Retorno
+    -------
+    numpy.ndarray
+        Matriz de utilidade, shape (n_usuarios, n_mercados).
+    """
     # Produto matricial: (usuários x itens) x (itens x mercados)
-    matriz_utilidade = usuario_item_sem_org @ item_mercado_sem_org
+    utilidade = np.asarray(usuario_item @ item_mercado, dtype=float)
 
-    # Penaliza mercados não-orgânicos para usuários orgânicos
-    for user_idx in matriz_utilidade.index:
-        for mercado_idx in matriz_utilidade.columns:
-            if usuario_organico[user_idx] == 1.0 and mercado_organico[mercado_idx] == 0.0:
-                matriz_utilidade.loc[user_idx, mercado_idx] *= 0.6
+    # Penaliza mercados não-orgânicos para usuários orgânicos:
+    # máscara = organico_usuario x (1 - organico_mercado), aplicada de uma vez
+    mascara = np.asarray(usuario_organico, dtype=bool)[:, None] & (np.asarray(mercado_organico) == 0.0)[None, :]
+    np.multiply(utilidade, PENALIDADE_NAO_ORGANICO, out=utilidade, where=mascara)
 
-    matriz_utilidade.to_csv(path_saida, index=False)
-    print("Matriz de utilidade salva com sucesso.")
+    return utilidade
 
 
 def calcular_utilidade_novo_usuario(
     itens_preferidos,
     organico,
     mes,
-    path_item_mercado="Processamento/item_mercado.csv"
+    path_item_mercado="Processamento/item_mercado.csv",
+    item_mercado=None
 ):
     """
     Calcula a utilidade de um novo usuário com base em itens preferidos e preferência por produtos orgânicos.
@@ -164,14 +436,18 @@ def calcular_utilidade_novo_usuario(
     mes : int
         Mês atual (para considerar sazonalidade).
     path_item_mercado : str
-        Caminho para a matriz de item x mercado.
+        Caminho para a matriz de item x mercado (.csv, .npy ou .parquet).
+    item_mercado : pandas.DataFrame or None
+        Matriz item x mercado já carregada (com a linha 'Organico').
+        Se fornecida, o CSV em `path_item_mercado` não é lido.
 
     Retorno
     -------
     pandas.Series
         Série com valores de utilidade do usuário para cada mercado.
     """
-    item_mercado = pd.read_csv(path_item_mercado, index_col=0)
+    if item_mercado is None:
+        item_mercado = carregar_matriz(path_item_mercado, indice=True)
 
     mercado_organico = item_mercado.loc["Organico"]
     item_mercado_sem_org = item_mercado.drop(index="Organico")
@@ -195,6 +471,6 @@ def calcular_utilidade_novo_usuario(
 
     # Penaliza mercados que não oferecem produtos orgânicos
     if organico == 1:
-        utilidade = utilidade.where(mercado_organico == 1, utilidade * 0.6)
+        utilidade = utilidade.where(mercado_organico == 1, utilidade * PENALIDADE_NAO_ORGANICO)
 
     return utilidade.round(2)
@@ -1,10 +1,15 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from Processamento.config import MERCADOS  # Lista ordenada de mercados conforme índice
+from Processamento.armazenamento import carregar_matriz
+from Processamento.vizinhanca import IndiceLSH, MatrizIncremental, MatrizUtilidade, k_mais_similares
 
 
-def recomendar_para_novo_usuario(matriz_utilidade: pd.DataFrame, top_n: int = 5) -> pd.DataFrame:
+def recomendar_para_novo_usuario(
+    matriz_utilidade: pd.DataFrame | str,
+    top_n: int = 5,
+    k_vizinhos: int | None = None,
+    indice: IndiceLSH | None = None
+) -> pd.DataFrame:
     """
     Gera recomendações para o novo usuário com base em similaridade de usuários.
 
@@ -14,11 +19,19 @@ def recomendar_para_novo_usuario(matriz_utilidade: pd.DataFrame, top_n: int = 5)
 
     Parâmetros:
     -----------
-    matriz_utilidade : pd.DataFrame
+    matriz_utilidade : pd.DataFrame | str
         DataFrame sem labels, com linhas representando usuários e colunas representando mercados (itens).
-        A última linha deve ser a do novo usuário.
+        A última linha deve ser a do novo usuário. Também aceita o caminho de uma matriz
+        salva em .csv, .npy (lida via memory map) ou .parquet.
     top_n : int
         Número de recomendações a retornar com maiores notas previstas.
+    k_vizinhos : int | None
+        Se informado, apenas os k usuários mais similares entram na média ponderada.
+        Se None, todos os usuários da base são usados.
+    indice : IndiceLSH | None
+        Índice aproximado construído sobre as linhas da base (todas exceto a última),
+        com as mesmas colunas. Se informado, a similaridade só é calculada para os
+        candidatos devolvidos pelo índice.
 
     Retorno:
     --------
@@ -29,48 +42,217 @@ def recomendar_para_novo_usuario(matriz_utilidade: pd.DataFrame, top_n: int = 5)
         - nota_prevista : nota estimada pelo sistema de recomendação
         - nome_mercado : nome do mercado correspondente ao índice, segundo config.MERCADOS
     """
-    # Cópia da matriz original para evitar mutações acidentais
-    mat = matriz_utilidade.copy()
+    if isinstance(matriz_utilidade, str):
+        matriz_utilidade = carregar_matriz(matriz_utilidade)
 
-    # Garante que os nomes das colunas são do tipo inteiro (compatível com índice em MERCADOS)
-    #mat.columns = mat.columns.astype(int)
+    # Vetor do novo usuário (última linha) e base de usuários existentes
+    vetor_novo = matriz_utilidade.iloc[-1].to_numpy(dtype=float)        # shape: (n_items,)
+    base = matriz_utilidade.iloc[:-1]
 
-    # Número de usuários (linhas) e itens (colunas)
-    n_users, n_items = mat.shape
+    # Restringe a base aos candidatos do índice aproximado antes de convertê-la:
+    # só as linhas candidatas são copiadas para o array
+    if indice is not None:
+        candidatos = indice.consultar(vetor_novo, minimo=k_vizinhos or 1)
+        if candidatos.size > 0:
+            base = base.iloc[candidatos]
+    base_usuarios = base.to_numpy(dtype=float)                          # shape: (n_users - 1, n_items)
 
-    # Separa o vetor do novo usuário (última linha)
-    vetor_novo = mat.iloc[-1:].to_numpy()  # shape: (1, n_items)
+    # Calcula similaridades do novo usuário com todos os usuários existentes
+    from sklearn.metrics.pairwise import cosine_similarity
+    similaridades = cosine_similarity(vetor_novo[None, :], base_usuarios)[0]  # shape: (n_users - 1,)
 
-    # Base de usuários existentes (todas as linhas exceto a última)
-    base_usuarios = mat.iloc[:-1].to_numpy()  # shape: (n_users - 1, n_items)
+    # Mantém apenas os k vizinhos mais similares
+    if k_vizinhos is not None:
+        vizinhos = k_mais_similares(similaridades, k_vizinhos)
+        base_usuarios = base_usuarios[vizinhos]
+        similaridades = similaridades[vizinhos]
 
-    # Calcula similaridades do novo usuário com todos os usuários existentes
-    similaridades = cosine_similarity(vetor_novo, base_usuarios)[0]  # shape: (n_users - 1,)
-
-    # Inicializa vetor de predições com as notas atuais do novo usuário
-    predicoes = vetor_novo.flatten().copy()  # shape: (n_items,)
-
-    # Para cada item não avaliado (nota 0), realiza a previsão com média ponderada
-    for j in range(n_items):
-        if predicoes[j] == 0:
-            avaliacoes = base_usuarios[:, j]     # notas dos outros usuários para o item j
-            mask = avaliacoes > 0                # seleciona usuários que avaliaram esse item
-            if mask.sum() > 0 and similaridades[mask].sum() > 0:
-                # Previsão via média ponderada pelas similaridades
-                predicoes[j] = np.dot(similaridades[mask], avaliacoes[mask]) / similaridades[mask].sum()
-            else:
-                predicoes[j] = 0.0  # Sem dados suficientes para prever
-
-    # Cria DataFrame com os resultados
+    predicoes = prever_notas(base_usuarios, vetor_novo, similaridades)
+    indices_top = selecionar_top_n(predicoes, top_n)
+
+    # Cria DataFrame com os resultados (já ordenado pela nota prevista)
     df_recs = pd.DataFrame({
-        'item_index': mat.columns,
-        'nota_atual': vetor_novo.flatten(),
-        'nota_prevista': predicoes
+        'item_index': matriz_utilidade.columns[indices_top],
+        'nota_atual': vetor_novo[indices_top],
+        'nota_prevista': predicoes[indices_top]
     })
 
-    df_recs = df_recs.sort_values('nota_prevista', ascending=False).head(top_n).reset_index(drop=True)
-
     # Agora basta:
     df_recs['nome_mercado'] = df_recs['item_index']
 
     return df_recs
+
+
+def prever_notas(base_usuarios: np.ndarray, vetor_novo: np.ndarray, similaridades: np.ndarray) -> np.ndarray:
+    """
+    Prevê as notas não avaliadas (zero) do novo usuário com média ponderada pelas similaridades.
+
+    Todas as previsões são feitas de uma vez, com dois produtos vetor-matriz:
+    similaridades @ (notas x avaliado) / similaridades @ avaliado, onde
+    `avaliado` indica as notas positivas da base.
+
+    Parâmetros:
+    -----------
+    base_usuarios : np.ndarray
+        Notas dos usuários existentes, shape (n_users, n_items).
+    vetor_novo : np.ndarray
+        Notas do novo usuário, shape (n_items,).
+    similaridades : np.ndarray
+        Similaridade do novo usuário com cada usuário da base, shape (n_users,).
+
+    Retorno:
+    --------
+    np.ndarray
+        Notas atuais do novo usuário, com as não avaliadas substituídas pela previsão
+        (ou 0.0 quando não há dados suficientes para prever).
+    """
+    avaliado = (base_usuarios > 0).astype(float)
+    numerador = similaridades @ (base_usuarios * avaliado)
+    denominador = similaridades @ avaliado
+    return combinar_previsoes(vetor_novo, numerador, denominador)
+
+
+def combinar_previsoes(vetor_novo: np.ndarray, numerador: np.ndarray, denominador: np.ndarray) -> np.ndarray:
+    """
+    Substitui as notas não avaliadas (zero) de `vetor_novo` por numerador / denominador,
+    onde o denominador é positivo; as demais não avaliadas ficam 0.0.
+    """
+    # Previsão apenas para itens não avaliados e com similaridade acumulada positiva
+    prever = (vetor_novo == 0) & (denominador > 0)
+    predicoes = np.where(vetor_novo == 0, 0.0, vetor_novo)
+    np.divide(numerador, denominador, out=predicoes, where=prever)
+    return predicoes
+
+
+def selecionar_top_n(notas: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Devolve os índices das `top_n` maiores notas, em ordem decrescente.
+
+    Usa seleção parcial (np.partition) e ordena apenas os selecionados. Empates
+    são resolvidos pelo menor índice, de forma determinística (o mesmo critério
+    do processamento em lote, `lote.py`).
+    """
+    top_n = min(top_n, notas.shape[0])
+    if top_n <= 0:
+        return np.array([], dtype=int)
+    limiar = np.partition(-notas, top_n - 1)[top_n - 1]
+    candidatos = np.flatnonzero(-notas <= limiar)
+    return candidatos[np.argsort(-notas[candidatos], kind="stable")][:top_n]
+
+
+def recomendar_com_matriz(
+    matriz: MatrizUtilidade | MatrizIncremental,
+    vetor_novo: np.ndarray,
+    colunas=None,
+    top_n: int = 5,
+    k_vizinhos: int | None = None,
+    mercados: list[str] | None = None,
+    indice: IndiceLSH | None = None
+) -> pd.DataFrame:
+    """
+    Gera recomendações para um novo usuário a partir da matriz pré-normalizada do modelo.
+
+    Equivale a `recomendar_para_novo_usuario` sobre a matriz restrita a `colunas`
+    com o novo usuário na última linha, mas sem montar essa matriz: a similaridade
+    e as médias ponderadas são produtos matriz-vetor sobre a matriz completa.
+
+    Com `indice`, só as linhas candidatas são lidas, e o custo deixa de crescer
+    com o número de usuários da base.
+
+    Parâmetros:
+    -----------
+    matriz : MatrizUtilidade | MatrizIncremental
+        Matriz de utilidade da base de usuários.
+    vetor_novo : np.ndarray
+        Notas do novo usuário para todos os mercados da matriz, shape (n_mercados,).
+    colunas : array-like | None
+        Índices dos mercados considerados (ex.: mercados próximos). Se None, todos.
+    top_n : int
+        Número de recomendações a retornar com maiores notas previstas.
+    k_vizinhos : int | None
+        Se informado, apenas os k usuários mais similares entram na média ponderada.
+    mercados : list[str] | None
+        Nomes dos mercados (colunas da matriz), usados em 'nome_mercado'.
+    indice : IndiceLSH | None
+        Índice aproximado sobre as primeiras `indice.num_linhas` linhas da matriz
+        (ex.: `ModeloMensal.indice`). Se informado, a similaridade e as previsões
+        usam só os candidatos do índice para o vetor completo do novo usuário,
+        mais as linhas posteriores às indexadas (usuários registrados).
+
+    Retorno:
+    --------
+    pd.DataFrame
+        Mesmas colunas de `recomendar_para_novo_usuario`; 'item_index' é o índice
+        do mercado na matriz completa.
+    """
+    vetor_novo = np.asarray(vetor_novo, dtype=float)
+    colunas = np.arange(matriz.shape[1]) if colunas is None else np.asarray(colunas, dtype=int)
+
+    matriz, similaridades = similaridades_vizinhos(matriz, vetor_novo, colunas, k_vizinhos, indice)
+    return prever_top_n(matriz, vetor_novo, colunas, similaridades, top_n, mercados)
+
+
+def similaridades_vizinhos(
+    matriz: MatrizUtilidade | MatrizIncremental,
+    vetor_novo: np.ndarray,
+    colunas: np.ndarray,
+    k_vizinhos: int | None = None,
+    indice: IndiceLSH | None = None
+) -> tuple:
+    """
+    Primeira etapa de `recomendar_com_matriz`: escolhe os vizinhos do novo
+    usuário (candidatos do `indice` e/ou os `k_vizinhos` mais similares) e
+    calcula a similaridade de cada um sobre `colunas`.
+
+    Retorno:
+    --------
+    tuple
+        (matriz restrita aos vizinhos, similaridades na ordem das linhas dessa matriz).
+    """
+    if indice is not None:
+        candidatos = np.concatenate([
+            indice.consultar(vetor_novo, minimo=k_vizinhos or 1),
+            np.arange(indice.num_linhas, matriz.shape[0])
+        ])
+        if candidatos.size > 0:
+            matriz = matriz.linhas(candidatos)
+
+    similaridades = matriz.similaridades(vetor_novo, colunas)
+
+    if k_vizinhos is not None:
+        vizinhos = k_mais_similares(similaridades, k_vizinhos)
+        similaridades = similaridades[vizinhos]
+        matriz = matriz.linhas(vizinhos)
+    return matriz, similaridades
+
+
+def prever_top_n(
+    matriz: MatrizUtilidade | MatrizIncremental,
+    vetor_novo: np.ndarray,
+    colunas: np.ndarray,
+    similaridades: np.ndarray,
+    top_n: int = 5,
+    mercados: list[str] | None = None
+) -> pd.DataFrame:
+    """
+    Segunda etapa de `recomendar_com_matriz`: prevê as notas das `colunas` pela
+    média ponderada dos vizinhos (`similaridades_vizinhos`) e devolve as `top_n` maiores.
+    """
+    numerador, denominador = matriz.ponderar(similaridades)
+    numerador, denominador = numerador[colunas], denominador[colunas]
+
+    notas_atuais = vetor_novo[colunas]
+    predicoes = combinar_previsoes(notas_atuais, numerador, denominador)
+    indices_top = selecionar_top_n(predicoes, top_n)
+
+    df_recs = pd.DataFrame({
+        'item_index': colunas[indices_top],
+        'nota_atual': notas_atuais[indices_top],
+        'nota_prevista': predicoes[indices_top]
+    })
+    if mercados is not None:
+        df_recs['nome_mercado'] = [mercados[i] for i in df_recs['item_index']]
+    else:
+        df_recs['nome_mercado'] = df_recs['item_index']
+
+    return df_recs
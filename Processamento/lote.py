@@ -0,0 +1,315 @@
+import argparse
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from Processamento.geo import matriz_distancias_haversine
+from Processamento.gerar_previsao import combinar_previsoes
+from Processamento.catalogo import obter_catalogo
+from Processamento import modelo as modelo_mensal
+from Processamento.modelo import garantir_modelos_compartilhados, obter_modelo
+from Processamento.usuarios_registrados import linhas_utilidade, matriz_com_registrados
+
+# =============================================================================
+# PARÂMETROS
+# =============================================================================
+
+CAMINHO_USUARIOS = "data/users.csv"
+CAMINHO_SAIDA = "data/recomendacoes_lote.csv"
+
+# Usuários processados por vez: limita as matrizes intermediárias
+# (bloco x usuários da base) a algumas dezenas de MB
+TAMANHO_BLOCO = 500
+
+TOP_N = 3
+
+COLUNAS_SAIDA = ["id_usuario", "posicao", "id_mercado", "Nome", "Latitude", "Longitude", "Distance_km", "nota_prevista"]
+
+# =============================================================================
+# ENTRADA
+# =============================================================================
+
+
+def preparar_usuarios(usuarios: pd.DataFrame, mes_padrao: int | None = None) -> pd.DataFrame:
+    """
+    Padroniza uma tabela de usuários para o processamento em lote.
+
+    Aceita as colunas de 'data/users.csv' ou da tabela `Usuario`: id, latitude,
+    longitude, dist_max_km, preferencias (texto separado por vírgulas, como no
+    cadastro) e, opcionalmente, prefere_organicos e data_preferencia (ou mes).
+
+    Parâmetros:
+        usuarios (pd.DataFrame): Tabela de usuários.
+        mes_padrao (int | None): Mês usado quando o usuário não tem data de
+            preferência. Se None, o mês atual.
+
+    Retorno:
+        pd.DataFrame: Colunas id_usuario, latitude, longitude, dist_max_km,
+        itens (list[str]), organico (int) e mes (int).
+    """
+    if mes_padrao is None:
+        mes_padrao = pd.Timestamp.now().month
+
+    tabela = pd.DataFrame({
+        "id_usuario": usuarios["id"].to_numpy(),
+        "latitude": pd.to_numeric(usuarios["latitude"], errors="coerce").to_numpy(),
+        "longitude": pd.to_numeric(usuarios["longitude"], errors="coerce").to_numpy(),
+        "dist_max_km": pd.to_numeric(usuarios["dist_max_km"], errors="coerce").to_numpy(),
+    })
+    # Mesma normalização das preferências da rota /recomendacoes
+    tabela["itens"] = [
+        [p.strip().capitalize() for p in str(texto).split(",") if p.strip()]
+        if not pd.isna(texto) else []
+        for texto in usuarios["preferencias"]
+    ]
+    if "prefere_organicos" in usuarios:
+        tabela["organico"] = usuarios["prefere_organicos"].fillna(0).astype(int).to_numpy()
+    else:
+        tabela["organico"] = 0
+    if "mes" in usuarios:
+        tabela["mes"] = usuarios["mes"].fillna(mes_padrao).astype(int).to_numpy()
+    elif "data_preferencia" in usuarios:
+        datas = pd.to_datetime(usuarios["data_preferencia"], errors="coerce")
+        tabela["mes"] = datas.dt.month.fillna(mes_padrao).astype(int).to_numpy()
+    else:
+        tabela["mes"] = mes_padrao
+    return tabela
+
+# =============================================================================
+# RECOMENDAÇÃO EM LOTE
+# =============================================================================
+
+
+def gerar_recomendacoes_lote(
+    usuarios: pd.DataFrame,
+    top_n: int = TOP_N,
+    tamanho_bloco: int = TAMANHO_BLOCO,
+    workers: int = 1
+):
+    """
+    Recomenda mercados para muitos usuários, em blocos de `tamanho_bloco`.
+
+    Produz o mesmo resultado que chamar `main.gerar_recomendacoes` para cada
+    usuário (sem k_vizinhos), mas cada etapa é uma operação matricial sobre o
+    bloco inteiro: distâncias usuário x mercado, linhas de utilidade, similaridade
+    com a base restrita aos mercados próximos de cada usuário, previsões e top-N.
+
+    Com `workers` > 1, os blocos são distribuídos entre processos
+    (ProcessPoolExecutor). Os modelos dos meses envolvidos são antes gravados
+    como modelos compartilhados (`modelo.garantir_modelos_compartilhados`), e
+    cada processo os mapeia em memória: só os blocos de usuários e os resultados
+    trafegam entre processos. Os resultados voltam na ordem dos blocos, com no
+    máximo 2 x workers blocos em andamento.
+
+    Parâmetros:
+        usuarios (pd.DataFrame): Saída de `preparar_usuarios`.
+        top_n (int): Recomendações por usuário.
+        tamanho_bloco (int): Usuários por bloco.
+        workers (int): Número de processos; 1 processa no próprio processo.
+
+    Retorno:
+        Iterator[pd.DataFrame]: Um DataFrame por bloco, com as colunas COLUNAS_SAIDA
+        (uma linha por recomendação; usuários sem recomendação não aparecem).
+    """
+    # Usuários sem coordenadas ou raio não podem ser atendidos
+    validos = usuarios[["latitude", "longitude", "dist_max_km"]].notna().all(axis=1)
+    if not validos.all():
+        print(f"{(~validos).sum()} usuários sem coordenadas ou distância foram ignorados.")
+    usuarios = usuarios[validos]
+
+    blocos = (
+        (int(mes), grupo.iloc[inicio:inicio + tamanho_bloco])
+        for mes, grupo in usuarios.groupby("mes", sort=True)
+        for inicio in range(0, len(grupo), tamanho_bloco)
+    )
+
+    if workers <= 1:
+        for mes, bloco in blocos:
+            yield _processar_bloco(mes, bloco, top_n)
+        return
+
+    meses = sorted(int(mes) for mes in usuarios["mes"].unique())
+    garantir_modelos_compartilhados(meses, modelo_mensal.DIRETORIO_COMPARTILHADO)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_iniciar_processo,
+        initargs=(modelo_mensal.DIRETORIO_COMPARTILHADO,)
+    ) as executor:
+        pendentes = deque()
+        for mes, bloco in blocos:
+            pendentes.append(executor.submit(_processar_bloco, mes, bloco, top_n))
+            if len(pendentes) >= 2 * workers:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def _iniciar_processo(diretorio_modelos: str) -> None:
+    """
+    Inicialização de cada processo do lote: usa os modelos compartilhados de
+    `diretorio_modelos` e limita o BLAS a uma thread (o paralelismo vem dos processos).
+    """
+    modelo_mensal.DIRETORIO_COMPARTILHADO = diretorio_modelos
+    threadpool_limits(1)
+
+
+# Contexto de cada mês no processo atual, reaproveitado entre blocos
+_contextos: dict = {}
+
+
+def _processar_bloco(mes: int, bloco: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    modelo = obter_modelo(mes)
+    matriz = matriz_com_registrados(modelo)
+    contexto = _contextos.get(mes)
+    if (contexto is None or contexto.modelo is not modelo or contexto.matriz is not matriz
+            or contexto.catalogo is not obter_catalogo()):
+        contexto = _ContextoMes(modelo, matriz, obter_catalogo())
+        _contextos[mes] = contexto
+    return _recomendar_bloco(bloco, contexto, top_n)
+
+
+class _ContextoMes:
+    """
+    Dados de um mês compartilhados por todos os blocos: modelo, matriz de
+    utilidade (com os usuários registrados) e a correspondência entre as linhas
+    do CSV de coordenadas e as colunas do modelo.
+    """
+
+    def __init__(self, modelo, matriz, catalogo):
+        self.modelo = modelo
+        self.matriz = matriz
+        self.catalogo = catalogo
+        self.latitudes = catalogo.latitudes
+        self.longitudes = catalogo.longitudes
+
+        # Linhas do CSV são os ids dos mercados
+        self.coluna_por_linha = modelo.colunas_dos_mercados(catalogo.ids)
+
+
+def _recomendar_bloco(bloco: pd.DataFrame, contexto: _ContextoMes, top_n: int) -> pd.DataFrame:
+    modelo, matriz = contexto.modelo, contexto.matriz
+    num_usuarios, num_mercados = len(bloco), matriz.shape[1]
+
+    # 1. Distâncias usuário x linha do CSV e mercados (colunas do modelo) no raio
+    distancias = matriz_distancias_haversine(
+        bloco["latitude"].to_numpy(), bloco["longitude"].to_numpy(),
+        contexto.latitudes, contexto.longitudes
+    )
+    no_raio = distancias <= bloco["dist_max_km"].to_numpy()[:, None]
+    no_raio &= (contexto.coluna_por_linha >= 0)[None, :]
+    proximos = np.zeros((num_usuarios, num_mercados), dtype=bool)
+    usuarios_idx, linhas_idx = np.nonzero(no_raio)
+    proximos[usuarios_idx, contexto.coluna_por_linha[linhas_idx]] = True
+
+    # 2. Linhas de utilidade (o mesmo cálculo de um pedido, para o bloco inteiro)
+    linhas, com_itens = linhas_utilidade(modelo, bloco["itens"], bloco["organico"].to_numpy())
+    atendidos = com_itens & proximos.any(axis=1)
+
+    # 3. Similaridade do cosseno com a base, restrita aos mercados próximos de cada usuário
+    mascara = proximos.astype(float)
+    vetores = linhas * mascara
+    produto = matriz.produtos(vetores)
+    denominador = np.sqrt(matriz.somas_quadrados(mascara)) * np.linalg.norm(vetores, axis=1)[:, None]
+    similaridades = np.zeros_like(produto)
+    np.divide(produto, denominador, out=similaridades, where=denominador > 0)
+
+    # 4. Previsões (média ponderada pelas similaridades) só para os mercados próximos
+    predicoes = combinar_previsoes(linhas, *matriz.ponderar(similaridades))
+    predicoes[~proximos] = -np.inf
+
+    # 5. Top-N por usuário; ordenação estável, empates pelo menor índice de
+    # mercado (mesmo critério de `gerar_previsao.selecionar_top_n`)
+    colunas = np.argsort(-predicoes, axis=1, kind="stable")[:, :top_n]
+    notas = np.take_along_axis(predicoes, colunas, axis=1)
+
+    registros = []
+    ids = bloco["id_usuario"].to_numpy()
+    for u in np.flatnonzero(atendidos):
+        for posicao, (coluna, nota) in enumerate(zip(colunas[u], notas[u]), start=1):
+            if not np.isfinite(nota):
+                break
+            # O id do mercado é a sua linha no CSV (e nas tabelas do catálogo)
+            linha = modelo.ids_mercados[coluna]
+            registros.append((
+                ids[u], posicao, linha, contexto.catalogo.nomes_exibicao[linha],
+                contexto.latitudes[linha], contexto.longitudes[linha],
+                distancias[u, linha], nota
+            ))
+    return pd.DataFrame(registros, columns=COLUNAS_SAIDA)
+
+
+def recomendar_lote(
+    usuarios: pd.DataFrame,
+    caminho_saida: str = CAMINHO_SAIDA,
+    top_n: int = TOP_N,
+    tamanho_bloco: int = TAMANHO_BLOCO,
+    workers: int = 1
+) -> dict:
+    """
+    Gera as recomendações de todos os usuários e grava um único CSV.
+
+    O arquivo é escrito bloco a bloco num temporário e renomeado ao final, de
+    modo que leitores nunca veem um resultado parcial.
+
+    Parâmetros:
+        usuarios (pd.DataFrame): Saída de `preparar_usuarios`.
+        caminho_saida (str): CSV de saída (colunas COLUNAS_SAIDA).
+        top_n (int): Recomendações por usuário.
+        tamanho_bloco (int): Usuários por bloco.
+        workers (int): Número de processos (ver `gerar_recomendacoes_lote`).
+
+    Retorno:
+        dict: usuarios, recomendacoes, segundos e usuarios_por_segundo.
+    """
+    inicio = time.perf_counter()
+    total_recomendacoes = 0
+
+    pasta = os.path.dirname(caminho_saida) or "."
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".csv.tmp")
+    try:
+        with os.fdopen(descritor, "w", newline="", encoding="utf-8") as arquivo:
+            pd.DataFrame(columns=COLUNAS_SAIDA).to_csv(arquivo, index=False)
+            for resultado in gerar_recomendacoes_lote(usuarios, top_n, tamanho_bloco, workers):
+                resultado.to_csv(arquivo, index=False, header=False)
+                total_recomendacoes += len(resultado)
+        os.replace(temporario, caminho_saida)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "usuarios": len(usuarios),
+        "recomendacoes": total_recomendacoes,
+        "segundos": segundos,
+        "usuarios_por_segundo": len(usuarios) / segundos if segundos > 0 else float("inf"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recomendações em lote para uma tabela de usuários.")
+    parser.add_argument("--usuarios", default=CAMINHO_USUARIOS, help="CSV de usuários (formato de data/users.csv).")
+    parser.add_argument("--saida", default=CAMINHO_SAIDA)
+    parser.add_argument("--mes", type=int, default=None, help="Mês para usuários sem data de preferência (padrão: atual).")
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO, help="Usuários por bloco.")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para pontuar os blocos em paralelo.")
+    args = parser.parse_args()
+
+    usuarios = preparar_usuarios(pd.read_csv(args.usuarios), mes_padrao=args.mes)
+    estatisticas = recomendar_lote(usuarios, args.saida, args.top_n, args.tamanho_bloco, args.workers)
+    print(
+        f"{estatisticas['usuarios']} usuários, {estatisticas['recomendacoes']} recomendações "
+        f"em {estatisticas['segundos']:.2f} s ({estatisticas['usuarios_por_segundo']:.0f} usuários/s). "
+        f"Resultado em {args.saida}."
+    )
+
+
+if __name__ == "__main__":
+    main()
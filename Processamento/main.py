@@ -1,12 +1,16 @@
+import os
+import tempfile
 import pandas as pd
 import numpy as np
-import unicodedata
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-from geopy.distance import geodesic
 
 from Processamento.config import ITENS_DISPONIVEIS, SAZONALIDADE
-from Processamento.gerar_previsao import recomendar_para_novo_usuario
+from Processamento.cache_recomendacoes import chave_recomendacao, normalizar_itens, obter_cache
+from Processamento.catalogo import normalize_str, obter_catalogo
+from Processamento.geo import distancias_haversine
+from Processamento.geocodificacao import obter_geocodificador
+from Processamento.gerar_previsao import recomendar_para_novo_usuario, recomendar_com_matriz
+from Processamento.modelo import obter_modelo
+from Processamento.usuarios_registrados import linha_utilidade, matriz_com_registrados
 from Processamento.gerar_matriz import (
     gerar_matriz_usuario_item,
     gerar_matriz_item_mercado,
@@ -25,15 +29,23 @@ MES_ATUAL = 5
 DISTANCIA = 20
 
 # =============================================================================
-# FUNÇÕES AUXILIARES
+# VIZINHANÇA
 # =============================================================================
 
-def normalize_str(s):
-    s = str(s).lower().strip().replace(',', '').replace('"', '')
-    s = ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-    return s
+# Vizinhos usados nas previsões: os k mais similares (None = toda a base) e, com
+# VIZINHOS_APROXIMADOS, só os candidatos do índice LSH do modelo do mês: troca
+# alguma precisão por menos linhas lidas por pedido (usar com K_VIZINHOS; ver
+# a precisão medida em vizinhanca.IndiceLSH)
+K_VIZINHOS = int(os.environ["SRA_K_VIZINHOS"]) if os.environ.get("SRA_K_VIZINHOS") else None
+VIZINHOS_APROXIMADOS = os.environ.get("SRA_VIZINHOS_APROXIMADOS", "0") == "1"
 
-def gerar_recomendacoes(endereco, itens_preferidos, organico, mes_atual, distancia_max_km, latitude=None, longitude=None):
+# =============================================================================
+# FUNÇÕES AUXILIARES
+# =============================================================================
+
+def gerar_recomendacoes(endereco, itens_preferidos, organico, mes_atual, distancia_max_km, latitude=None, longitude=None,
+                        k_vizinhos=K_VIZINHOS, salvar_intermediarios=False, usar_cache=True,
+                        aproximado=VIZINHOS_APROXIMADOS):
     print("DEBUG:", endereco, itens_preferidos, organico, mes_atual, distancia_max_km, latitude, longitude)
     # Se latitude e longitude forem fornecidos, use-os; senão, geocode o endereço
     if latitude is not None and longitude is not None:
@@ -44,103 +56,153 @@ def gerar_recomendacoes(endereco, itens_preferidos, organico, mes_atual, distanc
             return []
         user_location = coordenadas   
 
+    # Itens normalizados uma única vez: a mesma lista vale para a chave do cache e para o cálculo
+    itens_preferidos = normalizar_itens(itens_preferidos)
+
     try:
-        df = pd.read_csv("Processamento/coordenadas_associacoes_df.csv")
+        catalogo = obter_catalogo()
         print("DataFrame de coordenadas carregado com sucesso.")
     except FileNotFoundError:
         print("[Erro] DataFrame de coordenadas está vazio.")
         return []
 
-    df["Distance_km"] = df.apply(
-        lambda row: calculate_distance(row["Latitude"], row["Longitude"], user_location),
-        axis=1
-    )
-    df_proximas = df[df["Distance_km"] <= distancia_max_km].sort_values("Distance_km")
-    print("Mercados próximos:", df_proximas)
-    if df_proximas.empty:
+    # Mercados no raio (ids do catálogo), já ordenados por distância
+    ids_proximos, distancias = catalogo.indice_espacial.no_raio(*user_location, distancia_max_km)
+    print("Mercados próximos:", ids_proximos)
+    if len(ids_proximos) == 0:
         return []
 
-    itens_preferidos_sazonais = [
-        item for item in itens_preferidos
-        if mes_atual in SAZONALIDADE.get(item, [])
-    ]
-    print("Itens sazonais:", itens_preferidos_sazonais)
-    if not itens_preferidos_sazonais:
+    # Pedidos equivalentes (mesmo mês, itens, orgânico e mercados no raio)
+    # reaproveitam a resposta enquanto o modelo do mês e os registrados não mudarem
+    if not usar_cache or salvar_intermediarios:
+        return _calcular_recomendacoes(
+            catalogo, ids_proximos, distancias, itens_preferidos, organico, mes_atual,
+            k_vizinhos, salvar_intermediarios, aproximado
+        )
+
+    cache = obter_cache()
+    modelo = obter_modelo(mes_atual)
+    vizinhos = matriz_com_registrados(modelo)
+    chave = chave_recomendacao(mes_atual, itens_preferidos, organico, ids_proximos, k_vizinhos, aproximado)
+    distancia_por_id = dict(zip(ids_proximos.tolist(), distancias.tolist()))
+    resultado = cache.buscar(chave, modelo, vizinhos, distancia_por_id)
+    if resultado is not None:
+        return resultado
+
+    resultado = _calcular_recomendacoes(
+        catalogo, ids_proximos, distancias, itens_preferidos, organico, mes_atual, k_vizinhos,
+        aproximado=aproximado
+    )
+    cache.gravar(chave, modelo, vizinhos, resultado)
+    return resultado
+
+def _calcular_recomendacoes(catalogo, ids_proximos, distancias, itens_preferidos, organico, mes_atual,
+                            k_vizinhos=None, salvar_intermediarios=False, aproximado=False):
+    sazonais = itens_sazonais(itens_preferidos, mes_atual)
+    print("Itens sazonais:", sazonais)
+    if not sazonais:
         return []
 
-    # indices_proximos = df_proximas.index.tolist()
-    colunas_proximas = [
-        normalize_str(m) + ' ' + normalize_str(e)
-        for m, e in zip(df_proximas['Mercado'], df_proximas['Endereço'])
-    ]
-    print("Colunas_proximas:", colunas_proximas)
+    # Matrizes do mês já geradas e mantidas em memória
+    modelo = obter_modelo(mes_atual)
+    linha_novo_usuario = linha_utilidade(modelo, sazonais, organico)
+    indices_proximos = colunas_proximas(modelo, ids_proximos)
 
-    gerar_matriz_usuario_item(mes=mes_atual, percentual_organico=0.3, num_usuarios=5000)
-    gerar_matriz_item_mercado(mes=mes_atual)
-    gerar_matriz_utilidade()
-    linha_novo_usuario = calcular_utilidade_novo_usuario(
-        itens_preferidos_sazonais, organico, mes=mes_atual
-    ).to_numpy()
-    linha_novo_usuario = np.where(linha_novo_usuario >= 0.3, linha_novo_usuario, 0)
-    try:
-        matriz_utilidade = pd.read_csv("Processamento/matriz_utilidade.csv")
-    except FileNotFoundError:
-        return []
-    matriz_utilidade.loc[len(matriz_utilidade)] = linha_novo_usuario
-    matriz_utilidade.columns = [normalize_str(col) for col in matriz_utilidade.columns]
-    matriz_utilidade.to_csv("Processamento/nova_matriz_utilidade.csv", index=False)
-    print("Colunas normalizadas em nova_matriz_utilidade.csv:", matriz_utilidade.columns.tolist())
+    if salvar_intermediarios:
+        salvar_matrizes_intermediarias(modelo, linha_novo_usuario, indices_proximos.tolist())
 
-    matriz_utilidade_final = pd.read_csv("Processamento/nova_matriz_utilidade.csv", usecols=colunas_proximas)
-    matriz_utilidade_final.to_csv("Processamento/matriz_utilidade_final.csv", index=False)
-    recomendacoes = recomendar_para_novo_usuario(matriz_utilidade_final, top_n=3)
-    
-    print("Colunas do CSV:", matriz_utilidade.columns.tolist())
-    print("Colunas_proximas:", colunas_proximas)
+    # Vizinhos: usuários simulados e usuários reais já registrados no mês
+    # (com `aproximado`, só os candidatos do índice LSH do modelo)
+    recomendacoes = recomendar_com_matriz(
+        matriz_com_registrados(modelo), linha_novo_usuario, indices_proximos,
+        top_n=3, k_vizinhos=k_vizinhos, indice=modelo.indice if aproximado else None
+    )
+    return montar_recomendacoes(catalogo, modelo, recomendacoes["item_index"], ids_proximos, distancias)
 
-    df_proximas['chave'] = (df_proximas['Mercado'].str.strip() + ' ' + df_proximas['Endereço'].str.strip()).apply(normalize_str)
-    recomendacoes['nome_mercado'] = recomendacoes['nome_mercado'].apply(normalize_str)
+# Etapas de `_calcular_recomendacoes`, também medidas uma a uma por benchmark_pipeline
 
-    print("Chaves em df_proximas:")
-    print(df_proximas['chave'].unique())
-    print("Mercados recomendados:")
-    print(recomendacoes['nome_mercado'].unique())
+def itens_sazonais(itens_preferidos: list[str], mes: int) -> list[str]:
+    """
+    Itens preferidos (já normalizados) que estão na safra do mês.
+    """
+    return [item for item in itens_preferidos if mes in SAZONALIDADE.get(item, [])]
+
+def colunas_proximas(modelo, ids_proximos) -> np.ndarray:
+    """
+    Colunas do modelo correspondentes aos mercados próximos (na ordem da matriz);
+    mercados do catálogo que não estão no modelo são ignorados.
+    """
+    colunas = modelo.colunas_dos_mercados(ids_proximos)
+    return np.sort(colunas[colunas >= 0])
 
+def montar_recomendacoes(catalogo, modelo, colunas_recomendadas, ids_proximos, distancias) -> list[dict]:
+    """
+    Resposta da recomendação: dados de exibição de cada mercado recomendado,
+    pelo id do mercado, direto das tabelas do catálogo.
+    """
+    distancia_por_id = dict(zip(ids_proximos.tolist(), distancias.tolist()))
     mercados_recomendados = []
-    for idx in recomendacoes["nome_mercado"].index:
-        mercado = recomendacoes.iloc[idx]
-        df_mercado = df_proximas[df_proximas['chave'] == mercado['nome_mercado']]
-        if not df_mercado.empty:
-            info = df_mercado.iloc[0]
-            mercados_recomendados.append({
-                "Nome": mercado['nome_mercado'].title(),
-                "Latitude": info['Latitude'],
-                "Longitude": info['Longitude'],
-                "Distance_km": info['Distance_km']
-            })
-        else:
-            print(f"[AVISO] Mercado '{mercado['nome_mercado']}' não encontrado em df_proximas.")
+    for coluna in colunas_recomendadas:
+        id_mercado = int(modelo.ids_mercados[coluna])
+        mercados_recomendados.append({
+            "Id": id_mercado,
+            "Nome": catalogo.nomes_exibicao[id_mercado],
+            "Latitude": float(catalogo.latitudes[id_mercado]),
+            "Longitude": float(catalogo.longitudes[id_mercado]),
+            "Distance_km": distancia_por_id[id_mercado]
+        })
     return mercados_recomendados
 
+def salvar_matrizes_intermediarias(modelo, linha_novo_usuario, indices_proximos) -> None:
+    """
+    Grava, para depuração, as matrizes intermediárias da recomendação:
+    'nova_matriz_utilidade.csv' (base + novo usuário, colunas normalizadas) e
+    'matriz_utilidade_final.csv' (apenas os mercados próximos).
+
+    Cada arquivo é escrito num temporário e renomeado ao final, então requisições
+    concorrentes nunca leem um CSV pela metade (prevalece a última gravação).
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo do mês usado na recomendação.
+        linha_novo_usuario (np.ndarray): Utilidade do novo usuário por mercado.
+        indices_proximos (list[int]): Colunas dos mercados próximos.
+    """
+    chaves = obter_catalogo().chaves
+    matriz_utilidade = pd.DataFrame(
+        np.vstack([modelo.utilidade, linha_novo_usuario]),
+        columns=[chaves[i] if i >= 0 else normalize_str(m) for i, m in zip(modelo.ids_mercados, modelo.mercados)]
+    )
+    gravar_csv_atomico(matriz_utilidade, "Processamento/nova_matriz_utilidade.csv")
+    gravar_csv_atomico(matriz_utilidade.iloc[:, indices_proximos], "Processamento/matriz_utilidade_final.csv")
+
+def gravar_csv_atomico(df: pd.DataFrame, caminho: str) -> None:
+    """
+    Grava o DataFrame num arquivo temporário do mesmo diretório e o renomeia para `caminho`.
+    """
+    pasta = os.path.dirname(caminho) or "."
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".csv.tmp")
+    try:
+        with os.fdopen(descritor, "w", newline="", encoding="utf-8") as arquivo:
+            df.to_csv(arquivo, index=False)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
 def get_coordinates(address: str) -> tuple[float, float] | None:
     """
     Obtém as coordenadas (latitude, longitude) de um endereço usando o Nominatim.
 
+    As consultas passam pelo cache de `geocodificacao` (LRU em memória + SQLite),
+    então endereços repetidos não geram novas chamadas de rede.
+
     Parâmetros:
         address (str): Endereço a ser geocodificado.
 
     Retorno:
         tuple[float, float] | None: Coordenadas geográficas ou None se não encontrado.
     """
-    geolocator = Nominatim(user_agent="meu_app_localizacao")
-    try:
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude
-        print(f"[Erro] Endereço não encontrado: {address}")
-    except GeocoderTimedOut:
-        print(f"[Erro] Timeout ao tentar geocodificar: {address}")
-    return None
+    return obter_geocodificador().geocodificar(address)
 
 
 def calculate_distance(
@@ -149,6 +211,9 @@ def calculate_distance(
     """
     Calcula a distância geodésica entre o usuário e um mercado.
 
+    É a referência exata (elipsoide WGS-84); o pipeline usa
+    `geo.distancias_haversine`, vetorizada, cuja precisão está documentada em geo.py.
+
     Parâmetros:
         market_lat (float): Latitude do mercado.
         market_lon (float): Longitude do mercado.
@@ -157,6 +222,8 @@ def calculate_distance(
     Retorno:
         float: Distância em quilômetros.
     """
+    from geopy.distance import geodesic
+
     market_location = (market_lat, market_lon)
     return geodesic(user_location, market_location).km
 
@@ -186,10 +253,7 @@ def main() -> None:
         return
 
     # Calcular distância entre usuário e mercados
-    df["Distance_km"] = df.apply(
-        lambda row: calculate_distance(row["Latitude"], row["Longitude"], user_location),
-        axis=1
-    )
+    df["Distance_km"] = distancias_haversine(*user_location, df["Latitude"], df["Longitude"])
 
     # Filtrar mercados em até DISTANCIA km
     df_proximas = df[df["Distance_km"] <= DISTANCIA].sort_values("Distance_km")
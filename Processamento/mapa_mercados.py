@@ -0,0 +1,207 @@
+import hashlib
+import json
+import threading
+
+from Processamento.catalogo import CatalogoMercados, obter_catalogo
+
+# =============================================================================
+# PARÂMETROS DO MAPA
+# =============================================================================
+
+CENTRO_MAPA = (-15.8, -47.9)
+ZOOM_INICIAL = 11
+
+# Até este número de mercados os marcadores vão embutidos no HTML do mapa; acima
+# dele o HTML só traz o cluster vazio e os marcadores são lidos do feed GeoJSON
+LIMITE_MARCADORES = 2000
+
+# Endereço do feed relativo ao HTML do mapa (as duas rotas ficam em /mapa/)
+URL_GEOJSON = "mercados.geojson"
+
+# Casas decimais das coordenadas no feed (6 casas ~ 0,1 m)
+CASAS_COORDENADAS = 6
+
+# =============================================================================
+# CONTEÚDO RENDERIZADO
+# =============================================================================
+
+
+class ConteudoMapa:
+    """
+    Conteúdo pronto para servir, gerado uma vez por versão do catálogo.
+
+    Atributos:
+        conteudo (bytes): Corpo da resposta.
+        tipo (str): Mimetype.
+        etag (str): Hash do conteúdo dos mercados (igual entre processos e reinícios).
+        etag_fraca (bool): True quando o corpo pode variar entre processos sem mudar
+            de significado (o HTML do folium sorteia os nomes dos elementos).
+        modificado_em (float): Data de modificação do CSV do catálogo (timestamp).
+    """
+
+    def __init__(self, conteudo: bytes, tipo: str, etag: str, etag_fraca: bool, modificado_em: float):
+        self.conteudo = conteudo
+        self.tipo = tipo
+        self.etag = etag
+        self.etag_fraca = etag_fraca
+        self.modificado_em = modificado_em
+
+
+def geojson_mercados(catalogo: CatalogoMercados) -> bytes:
+    """
+    FeatureCollection compacta com um ponto por mercado do catálogo
+    (propriedades 'nome' e 'endereco'), na ordem do CSV.
+    """
+    recursos = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(float(lon), CASAS_COORDENADAS), round(float(lat), CASAS_COORDENADAS)],
+            },
+            "properties": {"nome": str(nome), "endereco": str(endereco)},
+        }
+        for nome, endereco, lat, lon in zip(
+            catalogo.df["Mercado"], catalogo.df["Endereço"], catalogo.latitudes, catalogo.longitudes
+        )
+    ]
+    colecao = {"type": "FeatureCollection", "features": recursos}
+    return json.dumps(colecao, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Script que lê o feed GeoJSON no navegador e acrescenta os marcadores ao cluster pai
+_SCRIPT_MARCADORES_DO_FEED = """
+    {% macro script(this, kwargs) %}
+        fetch({{ this.url|tojson }})
+            .then(function (resposta) { return resposta.json(); })
+            .then(function (colecao) {
+                colecao.features.forEach(function (recurso) {
+                    var coordenadas = recurso.geometry.coordinates;
+                    var popup = document.createElement("div");
+                    var nome = document.createElement("strong");
+                    nome.textContent = recurso.properties.nome;
+                    popup.appendChild(nome);
+                    popup.appendChild(document.createElement("br"));
+                    popup.appendChild(document.createTextNode("Endereço: " + recurso.properties.endereco));
+                    L.marker([coordenadas[1], coordenadas[0]])
+                        .bindPopup(popup)
+                        .addTo({{ this._parent.get_name() }});
+                });
+            });
+    {% endmacro %}
+"""
+
+
+def html_mapa(catalogo: CatalogoMercados) -> bytes:
+    """
+    Renderiza o mapa dos mercados (folium, com MarkerCluster).
+
+    Catálogos com até LIMITE_MARCADORES mercados têm os marcadores embutidos;
+    os maiores carregam os pontos de URL_GEOJSON, o que mantém o HTML pequeno.
+
+    O folium é importado aqui, e não no módulo: só é necessário para renderizar.
+    """
+    import folium
+    from branca.element import MacroElement
+    from folium.plugins import MarkerCluster
+    from jinja2 import Template
+
+    mapa = folium.Map(location=list(CENTRO_MAPA), zoom_start=ZOOM_INICIAL)
+    cluster = MarkerCluster().add_to(mapa)
+
+    if len(catalogo) > LIMITE_MARCADORES:
+        marcadores = MacroElement()
+        marcadores._name = "MarcadoresDoFeed"
+        marcadores._template = Template(_SCRIPT_MARCADORES_DO_FEED)
+        marcadores.url = URL_GEOJSON
+        cluster.add_child(marcadores)
+    else:
+        for nome_mercado, endereco, lat, lon in zip(
+            catalogo.df['Mercado'], catalogo.df['Endereço'], catalogo.latitudes, catalogo.longitudes
+        ):
+            folium.Marker(
+                location=[float(lat), float(lon)],
+                popup=f"<strong>{nome_mercado}</strong><br>Endereço: {endereco}",
+                icon=folium.Icon(color='blue')
+            ).add_to(cluster)
+
+    return mapa.get_root().render().encode("utf-8")
+
+# =============================================================================
+# CACHE POR VERSÃO DO CATÁLOGO
+# =============================================================================
+
+_conteudos: dict[str, ConteudoMapa] = {}
+_renderizando: dict[str, threading.Event] = {}   # tipo -> evento da renderização em andamento
+_assinatura = None
+_trava = threading.Lock()
+
+
+def _obter(tipo: str) -> ConteudoMapa:
+    """
+    Devolve o conteúdo `tipo` ('geojson' ou 'html') da versão atual do catálogo,
+    gerando-o só na primeira chamada após cada mudança do CSV.
+
+    O GeoJSON é gerado sob a trava; o HTML (folium, bem mais lento) é
+    renderizado fora dela por uma única thread, enquanto as demais que pedem
+    HTML esperam o resultado. Assim o feed já gerado é só uma leitura do
+    dicionário, mesmo durante a renderização do mapa.
+    """
+    global _assinatura
+    catalogo = obter_catalogo()
+
+    while True:
+        with _trava:
+            if _assinatura != catalogo.assinatura:
+                _conteudos.clear()
+                _assinatura = catalogo.assinatura
+
+            if "geojson" not in _conteudos:
+                feed = geojson_mercados(catalogo)
+                _conteudos["geojson"] = ConteudoMapa(
+                    feed, "application/geo+json", hashlib.sha256(feed).hexdigest()[:32],
+                    etag_fraca=False, modificado_em=catalogo.assinatura[1] / 1e9
+                )
+
+            if tipo in _conteudos:
+                return _conteudos[tipo]
+
+            feed = _conteudos["geojson"]
+            evento = _renderizando.get(tipo)
+            if evento is None:
+                evento = _renderizando[tipo] = threading.Event()
+                break
+
+        # Outra thread está renderizando: espera e confere de novo (a
+        # renderização pode ter falhado ou ser de uma versão anterior do catálogo)
+        evento.wait()
+
+    try:
+        chave = f"{feed.etag}:{LIMITE_MARCADORES}:{CENTRO_MAPA}:{ZOOM_INICIAL}"
+        conteudo = ConteudoMapa(
+            html_mapa(catalogo), "text/html", hashlib.sha256(chave.encode()).hexdigest()[:32],
+            etag_fraca=True, modificado_em=feed.modificado_em
+        )
+        with _trava:
+            # Só guarda se o catálogo não mudou durante a renderização
+            if _assinatura == catalogo.assinatura:
+                _conteudos[tipo] = conteudo
+        return conteudo
+    finally:
+        with _trava:
+            del _renderizando[tipo]
+        evento.set()
+
+
+def obter_mapa_html() -> ConteudoMapa:
+    """
+    HTML do mapa dos mercados para a versão atual do catálogo.
+    """
+    return _obter("html")
+
+
+def obter_geojson() -> ConteudoMapa:
+    """
+    Feed GeoJSON dos mercados para a versão atual do catálogo.
+    """
+    return _obter("geojson")
@@ -0,0 +1,848 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Processamento import config
+from scipy import sparse
+
+from Processamento.catalogo import obter_catalogo
+from Processamento.vizinhanca import PLANOS_LSH, TABELAS_LSH, IndiceLSH, MatrizIncremental, MatrizUtilidade
+from Processamento.gerar_matriz import (
+    gerar_usuario_item_esparso,
+    gerar_matriz_item_mercado,
+    gerar_matriz_utilidade,
+    calcular_matriz_utilidade
+)
+
+# =============================================================================
+# PARÂMETROS DA SIMULAÇÃO
+# =============================================================================
+
+NUM_USUARIOS_SIMULADOS = 5000
+PERCENTUAL_ORGANICO = 0.3
+MESES = range(1, 13)
+
+# Diretório dos modelos pré-gerados e compartilhados entre processos (ver
+# `salvar_modelos_compartilhados`); pode ser trocado pela variável de ambiente
+DIRETORIO_COMPARTILHADO = os.environ.get("SRA_DIRETORIO_MODELOS", "Processamento/modelos")
+
+# =============================================================================
+# MODELO MENSAL
+# =============================================================================
+
+
+class ModeloMensal:
+    """
+    Matrizes de recomendação pré-computadas para um mês.
+
+    As matrizes são geradas uma única vez (as entradas são determinísticas e
+    dependem apenas do mês) e mantidas em memória como arrays NumPy imutáveis,
+    de modo que várias requisições possam usá-las ao mesmo tempo.
+
+    Atributos:
+        mes (int): Mês a que o modelo se refere.
+        versao (str): Impressão digital das entradas usadas na geração.
+        itens (list[str]): Itens sazonais do mês (colunas de usuario_item).
+        posicao_item (dict[str, int]): Posição de cada item em `itens`.
+        mercados (list[str]): Chaves dos mercados (colunas da utilidade).
+        ids_mercados (np.ndarray): Id (posição no catálogo / config.MERCADOS) do mercado
+            de cada coluna; -1 para mercados fora do catálogo. Por padrão, 0 a n-1.
+        usuario_item (scipy.sparse.csr_matrix): Pesos usuário x item, sem a coluna 'Organico'.
+        usuario_organico (np.ndarray): Flag orgânica (bool) de cada usuário simulado.
+        item_mercado (np.ndarray): Disponibilidade item x mercado, sem a linha 'Organico'.
+        mercado_organico (np.ndarray): Flag orgânica de cada mercado.
+        matriz (MatrizUtilidade | MatrizIncremental): A utilidade usuário x mercado com
+            normas pré-computadas, para a similaridade (montada a partir de `utilidade`,
+            se não informada); depois de atualizações incrementais, uma MatrizIncremental.
+        indice (IndiceLSH): Índice aproximado de vizinhos sobre a utilidade (construído
+            com o modelo, se não informado), usado nas recomendações com `aproximado=True`.
+        revisao (int | None): Revisão do modelo compartilhado de que este modelo veio
+            (None se nunca foi gravado).
+        atualizacoes (list[dict]): Atualizações incrementais aplicadas desde a geração,
+            em ordem (ver `reaplicar_atualizacoes`).
+        publicadas (int): Quantas de `atualizacoes` já estão na revisão `revisao`.
+
+    Os arrays podem ser arquivos mapeados em memória (`carregar_modelo_compartilhado`);
+    nesse caso `matriz` é informada já montada sobre os termos gravados em disco.
+    """
+
+    def __init__(self, mes, versao, itens, mercados, usuario_item, usuario_organico,
+                 item_mercado, mercado_organico, utilidade=None, matriz=None, indice=None,
+                 ids_mercados=None, revisao=None, atualizacoes=None, publicadas=0):
+        self.mes = mes
+        self.versao = versao
+        self.itens = itens
+        self.posicao_item = {item: i for i, item in enumerate(itens)}
+        self.mercados = mercados
+        if ids_mercados is None:
+            ids_mercados = np.arange(len(mercados))
+        self.ids_mercados = np.array(ids_mercados, dtype=np.int64)
+        self.usuario_item = usuario_item
+        self.usuario_organico = usuario_organico
+        self.item_mercado = item_mercado
+        self.mercado_organico = mercado_organico
+        self.matriz = MatrizUtilidade(utilidade) if matriz is None else matriz
+        self.indice = IndiceLSH(self.utilidade) if indice is None else indice
+        self.revisao = revisao
+        self.atualizacoes = [] if atualizacoes is None else atualizacoes
+        self.publicadas = publicadas
+
+        # Arquivos (em disco) dos arrays que não mudaram desde o carregamento:
+        # nome -> (caminho, array); reaproveitados ao gravar uma nova revisão
+        self.arquivos: dict[str, tuple[str, np.ndarray]] = {}
+
+        # Coluna de cada id de mercado (-1 se o mercado não está no modelo)
+        validos = np.flatnonzero(self.ids_mercados >= 0)
+        self._coluna_por_id = np.full(self.ids_mercados.max(initial=-1) + 1, -1, dtype=np.int64)
+        self._coluna_por_id[self.ids_mercados[validos]] = validos
+
+        # O modelo é compartilhado entre requisições concorrentes: somente leitura
+        for array in (usuario_item.data, usuario_item.indices, usuario_item.indptr,
+                      usuario_organico, item_mercado, mercado_organico,
+                      self.ids_mercados, self._coluna_por_id):
+            array.flags.writeable = False
+
+    @property
+    def utilidade(self) -> np.ndarray:
+        """
+        Matriz de utilidade usuário x mercado como array (uma cópia, se o modelo
+        recebeu atualizações incrementais desde a última compactação).
+        """
+        return self.matriz.densa()
+
+    def colunas_dos_mercados(self, ids) -> np.ndarray:
+        """
+        Colunas da utilidade correspondentes aos ids de mercado informados
+        (-1 para ids que não estão no modelo).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        colunas = np.full(ids.shape, -1, dtype=np.int64)
+        conhecidos = (ids >= 0) & (ids < len(self._coluna_por_id))
+        colunas[conhecidos] = self._coluna_por_id[ids[conhecidos]]
+        return colunas
+
+    def tabela_utilidade(self) -> pd.DataFrame:
+        """
+        Monta a matriz de utilidade como DataFrame, com os mercados como colunas.
+        """
+        return pd.DataFrame(self.utilidade, columns=self.mercados)
+
+
+def construir_modelo(mes: int, versao: str | None = None) -> ModeloMensal:
+    """
+    Gera as matrizes usuário x item, item x mercado e de utilidade de um mês.
+
+    Nenhum arquivo é gravado: as matrizes são geradas e combinadas em memória.
+
+    Parâmetros:
+        mes (int): Mês para o qual o modelo será gerado.
+        versao (str | None): Versão das entradas; calculada se não informada.
+
+    Retorno:
+        ModeloMensal: Modelo com as matrizes em memória.
+    """
+    if versao is None:
+        versao = versao_entradas()
+
+    mercados = config.carregar_mercados()
+
+    usuario_item = gerar_usuario_item_esparso(
+        mes=mes,
+        percentual_organico=PERCENTUAL_ORGANICO,
+        num_usuarios=NUM_USUARIOS_SIMULADOS
+    )
+    item_mercado = gerar_matriz_item_mercado(mes=mes, mercados=mercados, path_saida=None)
+    utilidade = gerar_matriz_utilidade(
+        usuario_item=usuario_item, item_mercado=item_mercado, path_saida=None
+    )
+
+    return ModeloMensal(
+        mes=mes,
+        versao=versao,
+        itens=usuario_item.itens,
+        mercados=mercados,
+        ids_mercados=np.arange(len(mercados)),
+        usuario_item=usuario_item.pesos,
+        usuario_organico=usuario_item.organico,
+        item_mercado=item_mercado.drop(index="Organico").to_numpy(dtype=float),
+        mercado_organico=item_mercado.loc["Organico"].to_numpy(dtype=float),
+        utilidade=utilidade.to_numpy(dtype=float)
+    )
+
+# =============================================================================
+# ATUALIZAÇÕES INCREMENTAIS
+# =============================================================================
+#
+# Disponibilidade de itens e mercados muda com frequência; em vez de refazer o
+# produto usuários x itens x mercados inteiro, cada função abaixo recalcula só
+# a coluna (mercado) ou as linhas (usuários que escolheram o item) afetadas, e
+# atualiza as normas e o índice de vizinhos junto. O modelo original não é
+# alterado: é devolvido um novo ModeloMensal, a ser publicado com `publicar_modelo`.
+# A matriz do novo modelo guarda só a coluna ou as linhas novas sobre a do
+# original (MatrizIncremental), sem copiá-la.
+# O resultado coincide com uma regeneração completa a menos de arredondamento
+# de ponto flutuante (~1e-15).
+#
+# Cada atualização fica registrada no modelo (`atualizacoes`, gravadas com ele),
+# para ser refeita sobre um modelo regenerado quando as entradas mudam.
+
+
+def _vetor_itens(modelo: ModeloMensal, disponibilidade) -> np.ndarray:
+    """
+    Converte a disponibilidade de um mercado (dict item -> valor, ou sequência
+    na ordem de `modelo.itens`) em array; itens ausentes do dict valem 0.
+    """
+    if isinstance(disponibilidade, dict):
+        return np.array([float(disponibilidade.get(item, 0.0)) for item in modelo.itens])
+    vetor = np.asarray(disponibilidade, dtype=float)
+    if vetor.shape != (len(modelo.itens),):
+        raise ValueError(f"Disponibilidade deve ter {len(modelo.itens)} valores (um por item do mês).")
+    return vetor
+
+
+def _derivar_modelo(modelo: ModeloMensal, atualizacao: dict, matriz, indice, **alteracoes) -> ModeloMensal:
+    campos = {
+        "mes": modelo.mes, "versao": modelo.versao, "itens": modelo.itens,
+        "mercados": modelo.mercados, "ids_mercados": modelo.ids_mercados,
+        "usuario_item": modelo.usuario_item,
+        "usuario_organico": modelo.usuario_organico, "item_mercado": modelo.item_mercado,
+        "mercado_organico": modelo.mercado_organico,
+    }
+    campos.update(alteracoes)
+    derivado = ModeloMensal(
+        **campos, matriz=matriz, indice=indice, revisao=modelo.revisao,
+        atualizacoes=modelo.atualizacoes + [atualizacao], publicadas=modelo.publicadas
+    )
+    derivado.arquivos = modelo.arquivos
+    return derivado
+
+
+def atualizar_mercado(modelo: ModeloMensal, mercado: str, disponibilidade, organico: int,
+                      id_mercado: int | None = None) -> ModeloMensal:
+    """
+    Altera a disponibilidade de um mercado, ou acrescenta um mercado novo.
+
+    Recalcula apenas a coluna do mercado na utilidade (produto esparso da
+    matriz usuário x item pela disponibilidade, mais a penalidade orgânica).
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo atual.
+        mercado (str): Chave do mercado (como em `modelo.mercados`).
+        disponibilidade (dict | array-like): Disponibilidade de cada item do mês.
+        organico (int): 1 se o mercado oferece orgânicos, 0 caso contrário.
+        id_mercado (int | None): Id de um mercado novo; se None, é procurado no
+            catálogo pela chave (-1 se não estiver lá). Ignorado para mercados existentes.
+
+    Retorno:
+        ModeloMensal: Novo modelo com o mercado atualizado.
+    """
+    coluna_itens = _vetor_itens(modelo, disponibilidade)
+    coluna = calcular_matriz_utilidade(
+        modelo.usuario_item, modelo.usuario_organico,
+        coluna_itens[:, None], np.array([float(organico)])
+    )[:, 0]
+
+    indice = modelo.indice.copiar() if modelo.indice is not None else None
+    if mercado in modelo.mercados:
+        j = modelo.mercados.index(mercado)
+        if indice is not None:
+            indice.atualizar_coluna(j, modelo.matriz.coluna(j), coluna)
+        item_mercado = modelo.item_mercado.copy()
+        item_mercado[:, j] = coluna_itens
+        mercado_organico = modelo.mercado_organico.copy()
+        mercado_organico[j] = organico
+        mercados = modelo.mercados
+        ids_mercados = modelo.ids_mercados
+    else:
+        j = len(modelo.mercados)
+        if indice is not None:
+            indice.acrescentar_coluna(coluna)
+        item_mercado = np.hstack([modelo.item_mercado, coluna_itens[:, None]])
+        mercado_organico = np.append(modelo.mercado_organico, float(organico))
+        mercados = modelo.mercados + [mercado]
+        if id_mercado is None:
+            id_mercado = obter_catalogo().id_por_chave.get(mercado, -1)
+        ids_mercados = np.append(modelo.ids_mercados, id_mercado)
+
+    atualizacao = {
+        "tipo": "mercado", "mercado": mercado, "organico": int(organico),
+        "disponibilidade": dict(zip(modelo.itens, coluna_itens.tolist())),
+        "id_mercado": int(ids_mercados[j]),
+    }
+    return _derivar_modelo(
+        modelo, atualizacao, modelo.matriz.com_coluna(j, coluna), indice,
+        mercados=mercados, ids_mercados=ids_mercados,
+        item_mercado=item_mercado, mercado_organico=mercado_organico
+    )
+
+
+def remover_mercado(modelo: ModeloMensal, mercado: str) -> ModeloMensal:
+    """
+    Remove um mercado (coluna) do modelo.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo atual.
+        mercado (str): Chave do mercado.
+
+    Retorno:
+        ModeloMensal: Novo modelo sem o mercado.
+    """
+    if mercado not in modelo.mercados:
+        raise ValueError(f"Mercado não encontrado no modelo: {mercado}")
+    j = modelo.mercados.index(mercado)
+
+    indice = modelo.indice.copiar() if modelo.indice is not None else None
+    if indice is not None:
+        indice.remover_coluna(j, modelo.matriz.coluna(j))
+
+    atualizacao = {"tipo": "remover_mercado", "mercado": mercado}
+    return _derivar_modelo(
+        modelo, atualizacao, modelo.matriz.sem_coluna(j), indice,
+        mercados=modelo.mercados[:j] + modelo.mercados[j + 1:],
+        ids_mercados=np.delete(modelo.ids_mercados, j),
+        item_mercado=np.delete(modelo.item_mercado, j, axis=1),
+        mercado_organico=np.delete(modelo.mercado_organico, j)
+    )
+
+
+def atualizar_item(modelo: ModeloMensal, item: str, disponibilidade) -> ModeloMensal:
+    """
+    Altera a disponibilidade de um item em todos os mercados.
+
+    A variação da utilidade é de posto 1 (pesos do item x variação da linha do
+    item) e só atinge os usuários que escolheram o item, que são as únicas
+    linhas recalculadas.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo atual.
+        item (str): Nome do item (um dos `modelo.itens`).
+        disponibilidade (array-like): Nova disponibilidade do item em cada mercado,
+            na ordem de `modelo.mercados`.
+
+    Retorno:
+        ModeloMensal: Novo modelo com o item atualizado.
+    """
+    if item not in modelo.itens:
+        raise ValueError(f"Item não encontrado no modelo do mês {modelo.mes}: {item}")
+    i = modelo.itens.index(item)
+    linha = np.asarray(disponibilidade, dtype=float)
+    if linha.shape != (len(modelo.mercados),):
+        raise ValueError(f"Disponibilidade deve ter {len(modelo.mercados)} valores (um por mercado).")
+
+    pesos_item = modelo.usuario_item[:, [i]].tocoo()
+    usuarios, pesos = pesos_item.row, pesos_item.data
+
+    variacao = calcular_matriz_utilidade(
+        pesos[:, None], modelo.usuario_organico[usuarios],
+        (linha - modelo.item_mercado[i])[None, :], modelo.mercado_organico
+    )
+    valores_linhas = modelo.matriz.linhas(usuarios).valores + variacao
+
+    indice = modelo.indice.copiar() if modelo.indice is not None else None
+    if indice is not None:
+        indice.atualizar_linhas(usuarios, valores_linhas)
+
+    item_mercado = modelo.item_mercado.copy()
+    item_mercado[i] = linha
+    atualizacao = {"tipo": "item", "item": item, "disponibilidade": dict(zip(modelo.mercados, linha.tolist()))}
+    return _derivar_modelo(
+        modelo, atualizacao, modelo.matriz.com_linhas(usuarios, valores_linhas), indice,
+        item_mercado=item_mercado
+    )
+
+
+def reaplicar_atualizacoes(modelo: ModeloMensal, atualizacoes: list[dict]) -> ModeloMensal:
+    """
+    Refaz sobre `modelo` atualizações registradas por outro modelo do mesmo mês
+    (ex.: publicadas antes de uma mudança das entradas, ou por outro processo).
+
+    A disponibilidade é registrada por nome (itens de um mercado, mercados de um
+    item): itens que deixaram de existir são ignorados, os novos valem 0 num
+    mercado atualizado, e mercados que não estavam na atualização de um item
+    mantêm o valor atual. Atualizações que não se aplicam mais (ex.: item fora
+    de época) são ignoradas, com um aviso.
+
+    Retorno:
+        ModeloMensal: Novo modelo com as atualizações aplicadas.
+    """
+    for atualizacao in atualizacoes:
+        try:
+            if atualizacao["tipo"] == "mercado":
+                modelo = atualizar_mercado(
+                    modelo, atualizacao["mercado"], atualizacao["disponibilidade"],
+                    atualizacao["organico"], atualizacao["id_mercado"]
+                )
+            elif atualizacao["tipo"] == "remover_mercado":
+                modelo = remover_mercado(modelo, atualizacao["mercado"])
+            elif atualizacao["tipo"] == "item":
+                item, disponibilidade = atualizacao["item"], atualizacao["disponibilidade"]
+                i = modelo.posicao_item.get(item)
+                atuais = modelo.item_mercado[i].tolist() if i is not None else [0.0] * len(modelo.mercados)
+                linha = [disponibilidade.get(mercado, atual) for mercado, atual in zip(modelo.mercados, atuais)]
+                modelo = atualizar_item(modelo, item, linha)
+            else:
+                raise ValueError(f"Tipo de atualização desconhecido: {atualizacao['tipo']}")
+        except (ValueError, KeyError) as e:
+            print(f"Atualização do mês {modelo.mes} não reaplicada: {e}")
+    return modelo
+
+# =============================================================================
+# MODELOS COMPARTILHADOS ENTRE PROCESSOS (MEMORY MAP)
+# =============================================================================
+#
+# Com vários processos servindo a aplicação (ex.: workers do gunicorn), cada um
+# geraria a sua própria cópia dos modelos. Em vez disso, uma etapa de build grava
+# os arrays de cada mês em arquivos .npy, e os processos os abrem com
+# np.load(mmap_mode='r'): as páginas ficam uma única vez no page cache do sistema
+# operacional, e abrir um modelo não exige gerar nem interpretar nada.
+#
+# Cada gravação de um mês é uma revisão (0, 1, 2...). Arquivos de um mês
+# (prefixo 'mes_05', por exemplo):
+#   mes_05_r<revisão>_<array>.npy   um arquivo por array (a matriz esparsa usuário x item
+#                        ocupa três: dados, índices e ponteiros; o índice de vizinhos,
+#                        cinco: planos, média, projeções e baldes; uma matriz com
+#                        atualizações incrementais, também os de ARRAYS_INCREMENTAIS)
+#   mes_05.json          versão das entradas, revisão, itens, mercados, ids, atualizações
+#                        incrementais e o arquivo de cada array; gravado por último, de
+#                        modo que um modelo incompleto nunca é lido
+#   mes_05.lock          trava entre processos das gravações do mês
+#
+# Uma revisão nova só grava os arrays que mudaram; os demais continuam nos arquivos
+# da revisão anterior. Arquivos que deixam de ser referenciados são apagados (quem
+# ainda os tem mapeados não é afetado; quem leu o JSON antigo e não achou um
+# arquivo lê o JSON de novo). Os processos percebem uma revisão nova pelo JSON
+# (`obter_modelo`), e é assim que as atualizações publicadas chegam a todos eles.
+
+ARRAYS_COMPARTILHADOS = (
+    "usuario_item_dados", "usuario_item_indices", "usuario_item_ponteiros", "usuario_organico", "item_mercado", "mercado_organico",
+    "utilidade", "quadrados", "normas", "avaliado",
+    "indice_planos", "indice_media", "indice_projecoes", "indice_ordens", "indice_codigos_ordenados"
+)
+
+# Arrays de uma MatrizIncremental além da base ("utilidade", "quadrados", "normas", "avaliado")
+ARRAYS_INCREMENTAIS = ("extras", "fonte_colunas", "linhas_alteradas", "valores_alterados", "normas_atuais")
+
+
+def _prefixo(diretorio: str, mes: int) -> str:
+    return os.path.join(diretorio, f"mes_{mes:02d}")
+
+
+def _gravar_atomico(caminho: str, gravar) -> None:
+    """
+    Grava um arquivo via arquivo temporário + os.replace, para que processos
+    lendo o diretório nunca vejam um arquivo pela metade.
+    """
+    diretorio = os.path.dirname(caminho) or "."
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            gravar(arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+@contextlib.contextmanager
+def trava_arquivo(caminho: str):
+    """
+    Trava exclusiva entre processos sobre o arquivo `caminho` (criado se não
+    existir), liberada ao sair do bloco. Sem fcntl (ex.: Windows), não trava.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(caminho, "a") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _arrays_do_modelo(modelo: ModeloMensal) -> dict[str, np.ndarray]:
+    """
+    Arrays gravados de um modelo, por nome (ARRAYS_COMPARTILHADOS, mais
+    ARRAYS_INCREMENTAIS se a matriz for uma MatrizIncremental).
+    """
+    matriz = modelo.matriz
+    base = matriz.base if isinstance(matriz, MatrizIncremental) else matriz
+    arrays = {
+        "usuario_item_dados": modelo.usuario_item.data,
+        "usuario_item_indices": modelo.usuario_item.indices,
+        "usuario_item_ponteiros": modelo.usuario_item.indptr,
+        "usuario_organico": modelo.usuario_organico,
+        "item_mercado": modelo.item_mercado,
+        "mercado_organico": modelo.mercado_organico,
+        "utilidade": base.valores,
+        "quadrados": base.quadrados,
+        "normas": base.normas,
+        "avaliado": base.avaliado,
+        "indice_planos": modelo.indice.planos,
+        "indice_media": modelo.indice.media,
+        "indice_projecoes": modelo.indice.projecoes,
+        "indice_ordens": modelo.indice.ordens,
+        "indice_codigos_ordenados": modelo.indice.codigos_ordenados,
+    }
+    if isinstance(matriz, MatrizIncremental):
+        arrays.update({
+            "extras": matriz.extras.valores,
+            "fonte_colunas": matriz.fonte,
+            "linhas_alteradas": matriz.linhas_alteradas,
+            "valores_alterados": matriz.alteradas.valores,
+            "normas_atuais": matriz.normas,
+        })
+    return arrays
+
+
+def _ler_metadados(diretorio: str, mes: int) -> dict | None:
+    try:
+        with open(f"{_prefixo(diretorio, mes)}.json", encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def assinatura_modelo_compartilhado(mes: int, diretorio: str = DIRETORIO_COMPARTILHADO) -> tuple | None:
+    """
+    Identifica a revisão gravada do mês pelo estado do JSON (None se não houver):
+    muda a cada gravação, de qualquer processo.
+    """
+    try:
+        estado = os.stat(f"{_prefixo(diretorio, mes)}.json")
+    except FileNotFoundError:
+        return None
+    return estado.st_ino, estado.st_mtime_ns, estado.st_size
+
+
+def _gravar_revisao(modelo: ModeloMensal, diretorio: str) -> int:
+    """
+    Grava o modelo como a próxima revisão do mês; quem chama detém a trava do mês.
+
+    Arrays que continuam os mesmos (mesmo objeto) desde que o modelo foi carregado
+    deste diretório não são regravados: o JSON aponta para os arquivos existentes.
+
+    Retorno:
+        int: A revisão gravada.
+    """
+    prefixo = _prefixo(diretorio, modelo.mes)
+    anterior = _ler_metadados(diretorio, modelo.mes)
+    revisao = anterior.get("revisao", -1) + 1 if anterior is not None else 0
+
+    arquivos = {}
+    for nome, array in _arrays_do_modelo(modelo).items():
+        caminho, origem = modelo.arquivos.get(nome, (None, None))
+        if (origem is array and os.path.dirname(caminho) == os.path.abspath(diretorio)
+                and os.path.exists(caminho)):
+            arquivos[nome] = os.path.basename(caminho)
+            continue
+        arquivos[nome] = f"{os.path.basename(prefixo)}_r{revisao}_{nome}.npy"
+        array = np.ascontiguousarray(array)
+        _gravar_atomico(os.path.join(diretorio, arquivos[nome]),
+                        lambda arquivo: np.save(arquivo, array, allow_pickle=False))
+
+    metadados = {"mes": modelo.mes, "versao": modelo.versao, "revisao": revisao,
+                 "itens": modelo.itens, "mercados": modelo.mercados,
+                 "ids_mercados": modelo.ids_mercados.tolist(), "seed_indice": modelo.indice.seed,
+                 "atualizacoes": modelo.atualizacoes, "arquivos": arquivos}
+    _gravar_atomico(f"{prefixo}.json",
+                    lambda arquivo: arquivo.write(json.dumps(metadados, ensure_ascii=False).encode("utf-8")))
+
+    # Arquivos de revisões anteriores que a nova não usa mais
+    usados = set(arquivos.values())
+    inicio = f"{os.path.basename(prefixo)}_"
+    for nome_arquivo in os.listdir(diretorio):
+        if nome_arquivo.startswith(inicio) and nome_arquivo.endswith(".npy") and nome_arquivo not in usados:
+            try:
+                os.remove(os.path.join(diretorio, nome_arquivo))
+            except OSError:
+                pass
+    return revisao
+
+
+def salvar_modelo_compartilhado(modelo: ModeloMensal, diretorio: str = DIRETORIO_COMPARTILHADO) -> int:
+    """
+    Grava os arrays de um modelo em arquivos .npy, para serem mapeados em memória,
+    como uma nova revisão do mês.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo a gravar.
+        diretorio (str): Diretório de destino (criado se não existir).
+
+    Retorno:
+        int: A revisão gravada.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    with trava_arquivo(f"{_prefixo(diretorio, modelo.mes)}.lock"):
+        return _gravar_revisao(modelo, diretorio)
+
+
+def carregar_modelo_compartilhado(mes: int, versao: str,
+                                  diretorio: str = DIRETORIO_COMPARTILHADO) -> ModeloMensal | None:
+    """
+    Abre a revisão mais recente do modelo de um mês gravado por `salvar_modelo_compartilhado`.
+
+    Os arrays são mapeados em memória somente para leitura: nada é copiado para
+    o processo, e processos que abrem o mesmo arquivo compartilham as páginas.
+
+    Parâmetros:
+        mes (int): Mês do modelo.
+        versao (str): Versão esperada das entradas (ver `versao_entradas`).
+        diretorio (str): Diretório dos modelos compartilhados.
+
+    Retorno:
+        ModeloMensal | None: O modelo, ou None se não houver modelo gravado
+        para o mês ou se ele tiver sido gerado com outra versão das entradas.
+    """
+    # Uma revisão gravada entre a leitura do JSON e a dos arrays pode ter
+    # apagado algum deles: nesse caso, o JSON (já da revisão nova) é lido de novo
+    for _ in range(3):
+        try:
+            metadados = _ler_metadados(diretorio, mes)
+            if metadados is None or metadados["versao"] != versao:
+                return None
+            ids_mercados = metadados["ids_mercados"]    # ausente em modelos gravados antes dos ids
+            seed_indice = metadados["seed_indice"]      # ausente em modelos gravados sem o índice
+            caminhos = {nome: os.path.abspath(os.path.join(diretorio, arquivo))
+                        for nome, arquivo in metadados["arquivos"].items()}   # ausente antes das revisões
+            arrays = {nome: np.load(caminho, mmap_mode="r", allow_pickle=False)
+                      for nome, caminho in caminhos.items()}
+            faltando = set(ARRAYS_COMPARTILHADOS) - set(arrays)
+            if faltando:
+                raise KeyError(", ".join(sorted(faltando)))
+            break
+        except FileNotFoundError:
+            continue
+        except (ValueError, KeyError) as e:
+            print(f"Modelo compartilhado do mês {mes} ignorado: {e}")
+            return None
+    else:
+        return None
+
+    matriz = MatrizUtilidade(
+        arrays["utilidade"],
+        quadrados=arrays["quadrados"],
+        normas=arrays["normas"],
+        avaliado=arrays["avaliado"]
+    )
+    if "fonte_colunas" in arrays:
+        matriz = MatrizIncremental(
+            matriz,
+            extras=MatrizUtilidade(arrays["extras"]),
+            fonte=arrays["fonte_colunas"],
+            linhas_alteradas=arrays["linhas_alteradas"],
+            alteradas=MatrizUtilidade(arrays["valores_alterados"]),
+            normas=arrays["normas_atuais"]
+        )
+    atualizacoes = metadados.get("atualizacoes", [])
+    modelo = ModeloMensal(
+        mes=mes,
+        versao=versao,
+        itens=metadados["itens"],
+        mercados=metadados["mercados"],
+        ids_mercados=ids_mercados,
+        usuario_item=sparse.csr_matrix(
+            (arrays["usuario_item_dados"], arrays["usuario_item_indices"], arrays["usuario_item_ponteiros"]),
+            shape=(len(arrays["usuario_item_ponteiros"]) - 1, len(metadados["itens"])),
+            copy=False
+        ),
+        usuario_organico=arrays["usuario_organico"],
+        item_mercado=arrays["item_mercado"],
+        mercado_organico=arrays["mercado_organico"],
+        matriz=matriz,
+        indice=IndiceLSH.de_arrays(
+            arrays["indice_planos"], arrays["indice_media"], arrays["indice_projecoes"],
+            arrays["indice_ordens"], arrays["indice_codigos_ordenados"], seed=seed_indice
+        ),
+        revisao=metadados["revisao"],
+        atualizacoes=atualizacoes,
+        publicadas=len(atualizacoes)
+    )
+    modelo.arquivos = {
+        nome: (caminhos[nome], array)
+        for nome, array in _arrays_do_modelo(modelo).items() if nome in caminhos
+    }
+    return modelo
+
+
+def _gerar_modelo(mes: int, versao: str, diretorio: str) -> ModeloMensal:
+    """
+    Gera o modelo do mês e refaz sobre ele as atualizações incrementais
+    registradas no modelo gravado em `diretorio` (de qualquer versão), que
+    senão se perderiam com a regeneração.
+    """
+    modelo = construir_modelo(mes, versao)
+    metadados = _ler_metadados(diretorio, mes)
+    if metadados and metadados.get("atualizacoes"):
+        modelo = reaplicar_atualizacoes(modelo, metadados["atualizacoes"])
+    return modelo
+
+
+def garantir_modelos_compartilhados(meses=MESES, diretorio: str = DIRETORIO_COMPARTILHADO) -> None:
+    """
+    Grava em `diretorio` apenas os modelos que ainda não existem na versão atual
+    (ex.: antes de iniciar processos que vão mapeá-los).
+    """
+    versao = versao_entradas()
+    for mes in meses:
+        if carregar_modelo_compartilhado(mes, versao, diretorio) is None:
+            salvar_modelo_compartilhado(_gerar_modelo(mes, versao, diretorio), diretorio)
+
+
+def salvar_modelos_compartilhados(meses=MESES, diretorio: str = DIRETORIO_COMPARTILHADO) -> None:
+    """
+    Etapa de build: gera os modelos dos meses informados e os grava em `diretorio`.
+
+    Deve ser executada antes de iniciar os workers (e sempre que as entradas
+    mudarem); modelos de uma versão antiga são ignorados pelos processos. As
+    atualizações incrementais já publicadas são refeitas sobre os modelos novos.
+    """
+    versao = versao_entradas()
+    for mes in meses:
+        salvar_modelo_compartilhado(_gerar_modelo(mes, versao, diretorio), diretorio)
+        print(f"Modelo do mês {mes} gravado em {diretorio}.")
+
+# =============================================================================
+# ARMAZENAMENTO DOS MODELOS
+# =============================================================================
+
+_modelos: dict[int, ModeloMensal] = {}
+_assinaturas: dict[int, tuple | None] = {}   # JSON compartilhado visto ao obter cada modelo
+_trava = threading.Lock()
+
+
+def versao_entradas(caminho_coordenadas: str = config.CAMINHO_COORDENADAS) -> str:
+    """
+    Calcula uma impressão digital das entradas do modelo.
+
+    Considera `config.SAZONALIDADE`, `config.ITENS_DISPONIVEIS`, a data de
+    modificação/tamanho do CSV de coordenadas e as dimensões do índice LSH;
+    qualquer alteração gera uma nova versão e invalida os modelos em memória
+    (e os compartilhados).
+    """
+    try:
+        estado = os.stat(caminho_coordenadas)
+        assinatura_csv = [estado.st_mtime_ns, estado.st_size]
+    except FileNotFoundError:
+        assinatura_csv = None
+
+    conteudo = json.dumps(
+        [config.SAZONALIDADE, config.ITENS_DISPONIVEIS, assinatura_csv, [PLANOS_LSH, TABELAS_LSH]],
+        sort_keys=True
+    )
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+def obter_modelo(mes: int) -> ModeloMensal:
+    """
+    Devolve o modelo do mês, gerando-o na primeira chamada.
+
+    Se houver um modelo compartilhado da versão atual em DIRETORIO_COMPARTILHADO,
+    ele é mapeado em memória em vez de gerado.
+
+    O modelo só é trocado quando a versão das entradas muda ou quando uma nova
+    revisão do modelo compartilhado é gravada (ex.: `publicar_modelo` em outro
+    processo); nos demais casos a chamada é uma consulta em memória e um stat.
+
+    Se as entradas mudaram, o modelo é regenerado com as atualizações publicadas
+    na versão anterior, e o resultado é gravado para os demais processos.
+    """
+    versao = versao_entradas()
+    assinatura = assinatura_modelo_compartilhado(mes, DIRETORIO_COMPARTILHADO)
+    modelo = _modelos.get(mes)
+    if modelo is not None and modelo.versao == versao and _assinaturas.get(mes) == assinatura:
+        return modelo
+
+    with _trava:
+        modelo = _modelos.get(mes)
+        if modelo is None or modelo.versao != versao or _assinaturas.get(mes) != assinatura:
+            modelo = carregar_modelo_compartilhado(mes, versao, DIRETORIO_COMPARTILHADO)
+            if modelo is None:
+                modelo = _gerar_modelo(mes, versao, DIRETORIO_COMPARTILHADO)
+                if modelo.atualizacoes:
+                    modelo = _gravar_regenerado(modelo)
+            _modelos[mes] = modelo
+            _assinaturas[mes] = assinatura
+    return modelo
+
+
+def _gravar_regenerado(modelo: ModeloMensal) -> ModeloMensal:
+    """
+    Grava um modelo regenerado com atualizações refeitas, a menos que outro
+    processo já tenha gravado o da versão atual enquanto este era gerado.
+    Devolve o modelo gravado (mapeado em memória), ou `modelo` se a gravação falhar.
+    """
+    try:
+        os.makedirs(DIRETORIO_COMPARTILHADO, exist_ok=True)
+        with trava_arquivo(f"{_prefixo(DIRETORIO_COMPARTILHADO, modelo.mes)}.lock"):
+            gravado = carregar_modelo_compartilhado(modelo.mes, modelo.versao, DIRETORIO_COMPARTILHADO)
+            if gravado is None:
+                _gravar_revisao(modelo, DIRETORIO_COMPARTILHADO)
+                gravado = carregar_modelo_compartilhado(modelo.mes, modelo.versao, DIRETORIO_COMPARTILHADO)
+    except OSError as e:
+        print(f"Modelo do mês {modelo.mes} não gravado em {DIRETORIO_COMPARTILHADO}: {e}")
+        return modelo
+    return gravado if gravado is not None else modelo
+
+
+def publicar_modelo(modelo: ModeloMensal) -> ModeloMensal:
+    """
+    Publica o modelo do mês (ex.: após atualizações incrementais) para todos os
+    processos: grava-o como nova revisão em DIRETORIO_COMPARTILHADO, que os
+    demais processos passam a usar na próxima chamada a `obter_modelo`.
+
+    Se outro processo publicou depois que `modelo` foi derivado, as atualizações
+    novas de `modelo` são refeitas sobre a revisão mais recente, em vez de
+    descartar as do outro processo.
+
+    Requisições em andamento continuam usando o modelo anterior.
+
+    Retorno:
+        ModeloMensal: O modelo publicado, mapeado dos arquivos gravados.
+    """
+    os.makedirs(DIRETORIO_COMPARTILHADO, exist_ok=True)
+    with _trava, trava_arquivo(f"{_prefixo(DIRETORIO_COMPARTILHADO, modelo.mes)}.lock"):
+        atual = carregar_modelo_compartilhado(modelo.mes, modelo.versao, DIRETORIO_COMPARTILHADO)
+        if atual is not None and atual.revisao != modelo.revisao:
+            modelo = reaplicar_atualizacoes(atual, modelo.atualizacoes[modelo.publicadas:])
+        _gravar_revisao(modelo, DIRETORIO_COMPARTILHADO)
+        assinatura = assinatura_modelo_compartilhado(modelo.mes, DIRETORIO_COMPARTILHADO)
+        publicado = carregar_modelo_compartilhado(modelo.mes, modelo.versao, DIRETORIO_COMPARTILHADO)
+        _modelos[modelo.mes] = publicado
+        _assinaturas[modelo.mes] = assinatura
+    return publicado
+
+
+def aquecer_modelos(meses=MESES) -> None:
+    """
+    Pré-gera os modelos dos meses informados (por padrão, os 12 meses).
+    Útil na inicialização da aplicação para evitar latência no primeiro acesso.
+    """
+    for mes in meses:
+        obter_modelo(mes)
+
+
+def limpar_modelos() -> None:
+    """
+    Descarta todos os modelos em memória.
+    """
+    with _trava:
+        _modelos.clear()
+        _assinaturas.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera os modelos mensais compartilhados (memory map).")
+    parser.add_argument("--diretorio", default=DIRETORIO_COMPARTILHADO)
+    parser.add_argument("--meses", type=int, nargs="+", default=list(MESES))
+    args = parser.parse_args()
+    salvar_modelos_compartilhados(args.meses, args.diretorio)
@@ -0,0 +1,445 @@
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from Processamento.config import SAZONALIDADE
+from Processamento.gerar_matriz import calcular_matriz_utilidade
+from Processamento.modelo import ModeloMensal, obter_modelo, trava_arquivo
+from Processamento.vizinhanca import MatrizEmBlocos, MatrizUtilidade
+
+# =============================================================================
+# PARÂMETROS
+# =============================================================================
+
+# Registro dos usuários reais: uma linha JSON por inscrição, acrescentada ao
+# final; compactado de tempos em tempos (ver `compactar_registro`)
+CAMINHO_REGISTRO = "Processamento/usuarios_registrados.jsonl"
+
+# Notas abaixo deste valor são tratadas como "não avaliado" na linha do usuário
+NOTA_MINIMA = 0.3
+
+# Linhas livres acrescentadas de uma vez quando os buffers enchem (no mínimo;
+# o crescimento é geométrico, para que cada inscrição custe O(mercados) amortizado)
+TAMANHO_BLOCO = 256
+
+# Número de linhas substituídas (reinscrições), no bloco de um mês ou no arquivo
+# de registro, que dispara a compactação
+LIMITE_COMPACTACAO = 1024
+
+# =============================================================================
+# LINHA DE UTILIDADE DE UM USUÁRIO
+# =============================================================================
+
+
+def linhas_utilidade(modelo: ModeloMensal, itens_por_usuario, organicos) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula de uma vez as linhas de utilidade de vários usuários, direto dos
+    arrays do modelo (`item_mercado` e `mercado_organico`): peso igual para os
+    itens preferidos sazonais, penalidade orgânica, notas arredondadas a 2 casas
+    e notas abaixo de NOTA_MINIMA zeradas.
+
+    É o cálculo de `gerar_matriz.calcular_utilidade_novo_usuario`, usado tanto
+    por um pedido (`linha_utilidade`) quanto pelo processamento em lote.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo do mês.
+        itens_por_usuario (Iterable[list[str]]): Itens escolhidos por cada usuário.
+        organicos (array-like): 1 se o usuário prefere orgânicos, 0 caso contrário.
+
+    Retorno:
+        tuple[np.ndarray, np.ndarray]: Linhas de utilidade, shape (n_usuarios, n_mercados),
+        e máscara dos usuários com algum item sazonal do modelo (os demais têm linha nula).
+    """
+    itens_por_usuario = list(itens_por_usuario)
+    pesos = np.zeros((len(itens_por_usuario), len(modelo.itens)))
+    for u, itens in enumerate(itens_por_usuario):
+        validos = [
+            modelo.posicao_item[item] for item in itens
+            if modelo.mes in SAZONALIDADE.get(item, []) and item in modelo.posicao_item
+        ]
+        if validos:
+            pesos[u, validos] = 1 / len(validos)
+
+    linhas = np.round(calcular_matriz_utilidade(
+        pesos, np.asarray(organicos) == 1, modelo.item_mercado, modelo.mercado_organico
+    ), 2)
+    return np.where(linhas >= NOTA_MINIMA, linhas, 0), pesos.any(axis=1)
+
+
+def linha_utilidade(modelo: ModeloMensal, itens_preferidos: list[str], organico: int) -> np.ndarray:
+    """
+    Calcula a linha de utilidade (uma nota por mercado do modelo) de um usuário.
+
+    É a mesma linha usada para o novo usuário em `main.gerar_recomendacoes`:
+    utilidade dos itens preferidos, com notas abaixo de NOTA_MINIMA zeradas.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo do mês.
+        itens_preferidos (list[str]): Itens escolhidos pelo usuário.
+        organico (int): 1 se o usuário prefere orgânicos, 0 caso contrário.
+
+    Retorno:
+        np.ndarray: Utilidade por mercado, shape (n_mercados,).
+
+    Levanta:
+        ValueError: Se nenhum item preferido for sazonal no mês do modelo.
+    """
+    linhas, com_itens = linhas_utilidade(modelo, [itens_preferidos], [organico])
+    if not com_itens[0]:
+        raise ValueError("Nenhum item preferido está disponível neste mês ou presente na matriz.")
+    return linhas[0]
+
+# =============================================================================
+# LINHAS DOS USUÁRIOS REGISTRADOS
+# =============================================================================
+
+
+class UsuariosRegistrados:
+    """
+    Usuários reais registrados num mês, como um bloco de linhas à parte da
+    matriz de utilidade do modelo.
+
+    A matriz usada nas consultas de vizinhança é a do modelo seguida do bloco
+    (MatrizEmBlocos): a do modelo nunca é copiada e continua compartilhada
+    entre processos, se mapeada em memória. O bloco fica em buffers
+    pré-alocados com folga, só com as linhas registradas: inscrever um usuário
+    escreve uma linha na primeira posição livre e publica uma nova visão das
+    linhas já preenchidas. Quando os buffers enchem, são realocados com
+    capacidade maior (copiando só o bloco).
+
+    Leitores nunca veem escrita em andamento: as visões publicadas cobrem apenas
+    linhas que não mudam mais, e realocação e compactação criam buffers novos.
+
+    Reinscrever um usuário (mesma chave) acrescenta uma linha nova e marca a
+    anterior como substituída; a compactação descarta as substituídas.
+
+    Parâmetros:
+        modelo (ModeloMensal): Modelo do mês cuja utilidade é a base.
+        caminho (str): Arquivo de registro de onde vêm as inscrições.
+    """
+
+    def __init__(self, modelo: ModeloMensal, caminho: str = CAMINHO_REGISTRO):
+        self.modelo = modelo
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._chaves: list = []                  # chave de cada linha do bloco
+        self._linha_por_chave: dict = {}         # chave -> linha mais recente no bloco
+        self._inscricoes: dict = {}              # chave -> (itens ordenados, orgânico) mais recentes
+        self._substituidas = 0
+        self._valores = None
+        self._n = 0
+        self._matriz = modelo.matriz
+        self.arquivo = None                      # (inode, bytes já aplicados) do registro
+        self.linhas_substituidas = 0             # linhas do mês no registro que já foram substituídas
+
+    @property
+    def num_registrados(self) -> int:
+        return len(self._linha_por_chave)
+
+    def matriz(self):
+        """
+        Utilidade atual (base + registrados), para consultas de vizinhança.
+        """
+        return self._matriz
+
+    def inscricao(self, chave) -> tuple | None:
+        """
+        Inscrição mais recente do usuário no registro: (itens ordenados, orgânico).
+        """
+        return self._inscricoes.get(chave)
+
+    def inscrever(self, registros) -> None:
+        """
+        Aplica inscrições lidas do registro (dicts com 'chave', 'itens' e
+        'organico', uma por chave), calculando as linhas de uma vez.
+        """
+        registros = list(registros)
+        for registro in registros:
+            self._inscricoes[registro["chave"]] = (sorted(registro["itens"]), int(registro["organico"]))
+        linhas, com_itens = linhas_utilidade(
+            self.modelo, [registro["itens"] for registro in registros],
+            [registro["organico"] for registro in registros]
+        )
+        self.adicionar_varios(
+            [registro["chave"] for registro, valido in zip(registros, com_itens) if valido],
+            linhas[com_itens]
+        )
+
+    def adicionar(self, chave, linha: np.ndarray) -> None:
+        """
+        Inscreve (ou reinscreve) um usuário com a sua linha de utilidade.
+
+        Parâmetros:
+            chave: Identificador do usuário.
+            linha (np.ndarray): Utilidade por mercado, shape (n_mercados,).
+        """
+        self.adicionar_varios([chave], np.asarray(linha, dtype=float)[None, :])
+
+    def adicionar_varios(self, chaves: list, linhas: np.ndarray) -> None:
+        """
+        Inscreve vários usuários (linhas na ordem de `chaves`) e publica a matriz uma única vez.
+        """
+        linhas = np.asarray(linhas, dtype=float)
+        with self._trava:
+            if self._valores is None or self._n + len(chaves) > self._valores.shape[0]:
+                total = self._n + len(chaves)
+                self._alocar(total + max(TAMANHO_BLOCO, total // 2), np.arange(self._n))
+
+            n = self._n
+            for chave, linha in zip(chaves, linhas):
+                anterior = self._linha_por_chave.get(chave)
+                if anterior is not None and np.array_equal(self._valores[anterior], linha):
+                    continue
+                self._valores[n] = linha
+                self._quadrados[n] = linha ** 2
+                self._normas[n] = np.sqrt(self._quadrados[n].sum())
+                self._avaliado[n] = linha > 0
+                self._chaves.append(chave)
+                self._linha_por_chave[chave] = n
+                if anterior is not None:
+                    self._substituidas += 1
+                n += 1
+            if n != self._n:
+                self._publicar(n)
+
+            if self._substituidas >= LIMITE_COMPACTACAO:
+                self._compactar()
+
+    def compactar(self) -> None:
+        """
+        Descarta as linhas substituídas por reinscrições e ajusta a folga dos buffers.
+        """
+        with self._trava:
+            self._compactar()
+
+    def _compactar(self) -> None:
+        if self._valores is None:
+            return
+        manter = np.array(sorted(self._linha_por_chave.values()), dtype=int)
+        self._chaves = [self._chaves[i] for i in manter]
+        self._linha_por_chave = {chave: i for i, chave in enumerate(self._chaves)}
+        self._substituidas = 0
+        self._alocar(len(manter) + TAMANHO_BLOCO, manter)
+        self._publicar(len(manter))
+
+    def _alocar(self, capacidade: int, manter: np.ndarray) -> None:
+        """
+        Cria buffers novos para o bloco com `capacidade` linhas e copia para o
+        início deles as linhas `manter` do bloco atual, na ordem dada.
+        """
+        num_mercados = self.modelo.matriz.shape[1]
+        valores = np.empty((capacidade, num_mercados))
+        quadrados = np.empty((capacidade, num_mercados))
+        avaliado = np.empty((capacidade, num_mercados))
+        normas = np.empty(capacidade)
+        n = len(manter)
+        if n:
+            valores[:n] = self._valores[manter]
+            quadrados[:n] = self._quadrados[manter]
+            avaliado[:n] = self._avaliado[manter]
+            normas[:n] = self._normas[manter]
+        self._valores, self._quadrados, self._avaliado, self._normas = valores, quadrados, avaliado, normas
+        self._n = n
+
+    def _publicar(self, n: int) -> None:
+        self._n = n
+        if n == 0:
+            self._matriz = self.modelo.matriz
+            return
+        bloco = MatrizUtilidade(
+            self._valores[:n],
+            quadrados=self._quadrados[:n],
+            normas=self._normas[:n],
+            avaliado=self._avaliado[:n]
+        )
+        self._matriz = MatrizEmBlocos([self.modelo.matriz, bloco])
+
+# =============================================================================
+# REGISTRO EM DISCO E ACESSO POR MÊS
+# =============================================================================
+#
+# O registro é um arquivo JSONL lido e escrito por todos os processos. Anexar
+# uma linha e compactar o arquivo (trocá-lo por um só com a inscrição mais
+# recente de cada usuário e mês) acontecem sob uma trava entre processos
+# (CAMINHO_REGISTRO + ".lock"); cada mês guarda o inode e quantos bytes já
+# aplicou, e relê o arquivo do início quando o inode muda.
+
+_registrados: dict[int, UsuariosRegistrados] = {}
+_travas_meses: dict[int, threading.Lock] = {}
+_trava = threading.Lock()                # criação das travas dos meses e limpeza
+_trava_arquivo = threading.Lock()
+
+
+def _trava_mes(mes: int) -> threading.Lock:
+    trava = _travas_meses.get(mes)
+    if trava is None:
+        with _trava:
+            trava = _travas_meses.setdefault(mes, threading.Lock())
+    return trava
+
+
+def _estado_registro(caminho: str) -> tuple | None:
+    try:
+        estado = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return estado.st_ino, estado.st_size
+
+
+def registrar_usuario(chave, itens_preferidos: list[str], organico: int, mes: int,
+                      caminho: str = CAMINHO_REGISTRO) -> bool:
+    """
+    Registra um usuário real para que ele passe a ser vizinho nas próximas recomendações.
+
+    A inscrição é acrescentada ao arquivo de registro (lido também pelos demais
+    processos) e aplicada ao modelo do mês em memória. Se o usuário já está
+    inscrito no mês com os mesmos itens e a mesma preferência por orgânicos,
+    nada é gravado. Quando as inscrições substituídas do mês passam de
+    LIMITE_COMPACTACAO, o arquivo é compactado.
+
+    Parâmetros:
+        chave: Identificador do usuário (ex.: id da sessão ou do banco).
+        itens_preferidos (list[str]): Itens escolhidos.
+        organico (int): 1 se prefere orgânicos, 0 caso contrário.
+        mes (int): Mês da preferência.
+        caminho (str): Arquivo de registro.
+
+    Retorno:
+        bool: False se nenhum item preferido for sazonal no mês (nada é registrado).
+    """
+    itens = [item for item in itens_preferidos if mes in SAZONALIDADE.get(item, [])]
+    if not itens:
+        return False
+
+    modelo = obter_modelo(mes)
+    usuarios = obter_usuarios_registrados(modelo, caminho)
+    if usuarios.inscricao(chave) == (sorted(itens), int(organico)):
+        return True
+
+    registro = {"chave": chave, "mes": mes, "itens": itens, "organico": int(organico)}
+    with _trava_arquivo, trava_arquivo(caminho + ".lock"):
+        with open(caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    usuarios = obter_usuarios_registrados(modelo, caminho)
+    if usuarios.linhas_substituidas >= LIMITE_COMPACTACAO:
+        compactar_registro(caminho)
+    return True
+
+
+def compactar_registro(caminho: str = CAMINHO_REGISTRO) -> None:
+    """
+    Reescreve o arquivo de registro só com a inscrição mais recente de cada
+    usuário em cada mês (e sem linhas inválidas).
+
+    O arquivo novo substitui o antigo de uma vez (os.replace); os processos
+    percebem a troca pelo inode e refazem os registrados a partir dele.
+    """
+    with _trava_arquivo, trava_arquivo(caminho + ".lock"):
+        try:
+            with open(caminho, "rb") as arquivo:
+                conteudo = arquivo.read()
+        except FileNotFoundError:
+            return
+
+        ultimas = {}
+        for bruta in conteudo.splitlines():
+            try:
+                registro = json.loads(bruta)
+                chave = (registro["chave"], registro["mes"])
+                ultimas.pop(chave, None)
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+            ultimas[chave] = bruta
+
+        pasta = os.path.dirname(caminho) or "."
+        descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".jsonl.tmp")
+        try:
+            with os.fdopen(descritor, "wb") as arquivo:
+                arquivo.writelines(bruta + b"\n" for bruta in ultimas.values())
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.remove(temporario)
+            raise
+
+
+def obter_usuarios_registrados(modelo: ModeloMensal, caminho: str = CAMINHO_REGISTRO) -> UsuariosRegistrados:
+    """
+    Devolve os usuários registrados do mês do modelo, já sobre a utilidade dele.
+
+    Na primeira chamada (ou quando o modelo do mês muda, ou o arquivo é
+    compactado) o registro é lido do início; nas seguintes, só as inscrições
+    acrescentadas desde a última leitura (inclusive por outros processos) são
+    aplicadas. Se o arquivo não mudou, a chamada é só um stat, sem trava.
+    """
+    estado = _estado_registro(caminho)
+    usuarios = _registrados.get(modelo.mes)
+    if (usuarios is not None and usuarios.modelo is modelo and usuarios.caminho == caminho
+            and usuarios.arquivo == estado):
+        return usuarios
+
+    with _trava_mes(modelo.mes):
+        usuarios = _registrados.get(modelo.mes)
+        if (usuarios is None or usuarios.modelo is not modelo or usuarios.caminho != caminho
+                or (usuarios.arquivo is not None and estado is not None and usuarios.arquivo[0] != estado[0])):
+            usuarios = UsuariosRegistrados(modelo, caminho)
+        _aplicar_novos_registros(usuarios, caminho)
+        _registrados[modelo.mes] = usuarios
+    return usuarios
+
+
+def matriz_com_registrados(modelo: ModeloMensal, caminho: str = CAMINHO_REGISTRO):
+    """
+    Utilidade do modelo acrescida dos usuários registrados no mês.
+    """
+    return obter_usuarios_registrados(modelo, caminho).matriz()
+
+
+def _aplicar_novos_registros(usuarios: UsuariosRegistrados, caminho: str) -> None:
+    """
+    Aplica as linhas do registro posteriores às já aplicadas em `usuarios`,
+    todas as do mês de uma vez (a última inscrição de cada chave).
+    """
+    try:
+        with open(caminho, "rb") as arquivo:
+            estado = os.fstat(arquivo.fileno())
+            if usuarios.arquivo is not None and usuarios.arquivo[0] != estado.st_ino:
+                # O arquivo foi compactado depois do stat: a próxima chamada relê do início
+                return
+            aplicados = usuarios.arquivo[1] if usuarios.arquivo is not None else 0
+            arquivo.seek(aplicados)
+            conteudo = arquivo.read()
+    except FileNotFoundError:
+        return
+
+    # Só linhas completas; uma escrita em andamento é lida na próxima vez
+    fim = conteudo.rfind(b"\n") + 1
+    usuarios.arquivo = (estado.st_ino, aplicados + fim)
+
+    ultimos = {}
+    for bruta in conteudo[:fim].splitlines():
+        try:
+            registro = json.loads(bruta)
+        except json.JSONDecodeError:
+            print("Linha inválida no registro de usuários ignorada:", bruta[:80])
+            continue
+        if registro.get("mes") != usuarios.modelo.mes or "chave" not in registro:
+            continue
+        chave = registro["chave"]
+        if usuarios.inscricao(chave) is not None or chave in ultimos:
+            usuarios.linhas_substituidas += 1
+        ultimos.pop(chave, None)
+        ultimos[chave] = registro
+    if ultimos:
+        usuarios.inscrever(ultimos.values())
+
+
+def limpar_usuarios_registrados() -> None:
+    """
+    Descarta as matrizes de registrados em memória (o arquivo de registro é mantido).
+    """
+    with _trava:
+        _registrados.clear()
@@ -0,0 +1,735 @@
+import copy
+from itertools import combinations
+
+import numpy as np
+
+# =============================================================================
+# MATRIZ DE UTILIDADE PRÉ-NORMALIZADA
+# =============================================================================
+
+
+class MatrizUtilidade:
+    """
+    Matriz de utilidade (usuários x mercados) com os termos da similaridade do
+    cosseno pré-computados.
+
+    Guarda as normas L2 das linhas e os quadrados das notas, de modo que a
+    similaridade de um novo usuário com toda a base, restrita ou não a um
+    subconjunto de colunas (mercados próximos), sai de produtos matriz-vetor
+    sobre a matriz completa, sem copiar colunas.
+
+    As utilidades são não negativas por construção, então a máscara de notas
+    avaliadas (> 0) também fica pré-computada para o denominador das previsões.
+
+    Os arrays são marcados como somente leitura: a matriz é compartilhada entre
+    requisições concorrentes e nunca é alterada depois de construída.
+
+    Parâmetros:
+        valores (np.ndarray): Matriz de utilidade, shape (n_users, n_mercados).
+        quadrados, normas, avaliado (np.ndarray | None): Termos já calculados
+            (ex.: arquivos mapeados em memória por `modelo.carregar_modelo_compartilhado`).
+            Se None, são calculados a partir de `valores`.
+    """
+
+    def __init__(self, valores: np.ndarray, quadrados=None, normas=None, avaliado=None):
+        self.valores = np.ascontiguousarray(valores, dtype=float)
+        self.quadrados = self.valores ** 2 if quadrados is None else quadrados
+        self.normas = np.sqrt(self.quadrados.sum(axis=1)) if normas is None else normas
+        self.avaliado = (self.valores > 0).astype(float) if avaliado is None else avaliado
+
+        # Estado compartilhado entre requisições: somente leitura
+        for array in (self.valores, self.quadrados, self.normas, self.avaliado):
+            array.flags.writeable = False
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.valores.shape
+
+    def mascara_colunas(self, colunas=None) -> np.ndarray:
+        """
+        Vetor 0/1 com as colunas selecionadas (todas, se `colunas` for None).
+        """
+        return _mascara_colunas(self.shape[1], colunas)
+
+    def similaridades(self, vetor: np.ndarray, colunas=None) -> np.ndarray:
+        """
+        Similaridade do cosseno entre `vetor` e cada linha da matriz.
+
+        Parâmetros:
+            vetor (np.ndarray): Notas do novo usuário para todos os mercados, shape (n_mercados,).
+            colunas (array-like | None): Índices das colunas consideradas. Se None,
+                usa todas e as normas pré-computadas (um único produto matriz-vetor).
+
+        Retorno:
+            np.ndarray: Similaridades, shape (n_users,); 0 para vetores nulos.
+        """
+        return _similaridades(self, vetor, colunas)
+
+    # -------------------------------------------------------------------------
+    # Operações usadas pelas recomendações
+    # -------------------------------------------------------------------------
+    # Os vetores e pesos podem ter uma dimensão (um usuário) ou duas (um lote,
+    # uma linha por usuário). As mesmas operações existem em MatrizIncremental,
+    # de modo que quem recomenda não depende de como a matriz está guardada.
+
+    def produtos(self, vetores: np.ndarray) -> np.ndarray:
+        """
+        Produto escalar de cada vetor com cada linha: shape (n_users,) ou (n_vetores, n_users).
+        """
+        return self.valores @ vetores if vetores.ndim == 1 else vetores @ self.valores.T
+
+    def somas_quadrados(self, mascaras: np.ndarray) -> np.ndarray:
+        """
+        Soma dos quadrados de cada linha nas colunas da máscara (o quadrado da
+        norma restrita a essas colunas): shape (n_users,) ou (n_mascaras, n_users).
+        """
+        return self.quadrados @ mascaras if mascaras.ndim == 1 else mascaras @ self.quadrados.T
+
+    def ponderar(self, pesos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Somas ponderadas das linhas: (pesos @ valores, pesos @ avaliado), os
+        termos da média ponderada das previsões.
+        """
+        return pesos @ self.valores, pesos @ self.avaliado
+
+    def linhas(self, indices) -> "MatrizUtilidade":
+        """
+        Nova matriz (cópia) só com as linhas informadas.
+        """
+        indices = np.asarray(indices, dtype=int)
+        return MatrizUtilidade(
+            self.valores[indices], quadrados=self.quadrados[indices],
+            normas=self.normas[indices], avaliado=self.avaliado[indices]
+        )
+
+    def coluna(self, j: int) -> np.ndarray:
+        """
+        Cópia da coluna `j`.
+        """
+        return np.array(self.valores[:, j])
+
+    def densa(self) -> np.ndarray:
+        """
+        Os valores como um array (sem cópia).
+        """
+        return self.valores
+
+    # -------------------------------------------------------------------------
+    # Atualizações incrementais
+    # -------------------------------------------------------------------------
+    # A matriz é imutável (compartilhada entre requisições e, às vezes, mapeada
+    # em memória): cada atualização devolve uma MatrizIncremental que guarda só
+    # a coluna ou as linhas novas e usa esta matriz como base, sem copiá-la.
+
+    def com_coluna(self, j: int, coluna) -> "MatrizIncremental":
+        """
+        Substitui a coluna `j` (ou acrescenta uma coluna ao final, se j == n_mercados).
+        """
+        return MatrizIncremental(self).com_coluna(j, coluna)
+
+    def sem_coluna(self, j: int) -> "MatrizIncremental":
+        """
+        Remove a coluna `j`.
+        """
+        return MatrizIncremental(self).sem_coluna(j)
+
+    def com_linhas(self, linhas, valores_linhas) -> "MatrizIncremental":
+        """
+        Substitui as linhas informadas (`valores_linhas`: shape (k, n_mercados)).
+        """
+        return MatrizIncremental(self).com_linhas(linhas, valores_linhas)
+
+
+def _mascara_colunas(num_colunas: int, colunas=None) -> np.ndarray:
+    if colunas is None:
+        return np.ones(num_colunas)
+    mascara = np.zeros(num_colunas)
+    mascara[colunas] = 1.0
+    return mascara
+
+
+def _similaridades(matriz, vetor: np.ndarray, colunas=None) -> np.ndarray:
+    """
+    Similaridade do cosseno entre `vetor` e cada linha de `matriz` (MatrizUtilidade
+    ou MatrizIncremental), restrita às `colunas`.
+    """
+    vetor = np.asarray(vetor, dtype=float)
+    if colunas is None:
+        normas = matriz.normas
+    else:
+        mascara = matriz.mascara_colunas(colunas)
+        vetor = vetor * mascara
+        normas = np.sqrt(matriz.somas_quadrados(mascara))
+
+    produto = matriz.produtos(vetor)
+    denominador = normas * np.linalg.norm(vetor)
+    similaridades = np.zeros_like(produto)
+    np.divide(produto, denominador, out=similaridades, where=denominador > 0)
+    return similaridades
+
+# =============================================================================
+# MATRIZ COM ATUALIZAÇÕES SOBRE UMA BASE
+# =============================================================================
+
+# Acima desta fração de colunas novas (em relação às da base) ou de linhas
+# substituídas (em relação ao total), a MatrizIncremental é compactada numa
+# MatrizUtilidade densa: a partir daí, cada operação custaria mais que uma cópia
+LIMITE_COMPACTACAO = 0.25
+
+
+class MatrizIncremental:
+    """
+    Matriz de utilidade descrita como uma base imutável mais as alterações
+    feitas depois dela, sem copiar a base.
+
+    A matriz lógica tem as colunas de `fonte`: cada uma é uma coluna da base
+    (fonte < n_colunas_base) ou uma das colunas `extras` (as acrescentadas ou
+    substituídas, fonte - n_colunas_base). As `linhas_alteradas` (ordenadas)
+    valem `alteradas`, e não o que está na base ou nas extras.
+
+    Oferece as mesmas operações que MatrizUtilidade (similaridades, produtos,
+    somas_quadrados, ponderar, linhas, coluna, densa e as atualizações), cada
+    uma feita sobre a base inteira com pesos nas colunas certas, mais as extras,
+    corrigindo as linhas alteradas: custa o mesmo que na matriz densa mais
+    O(n_users x colunas extras + linhas alteradas x n_mercados).
+
+    Parâmetros:
+        base (MatrizUtilidade): Matriz de origem (pode estar mapeada em memória).
+        extras (MatrizUtilidade | None): Colunas extras, shape (n_users, n_extras).
+        fonte (array-like | None): Origem de cada coluna lógica; padrão: as colunas da base.
+        linhas_alteradas (array-like | None): Índices (crescentes) das linhas substituídas.
+        alteradas (MatrizUtilidade | None): Valores dessas linhas, shape (k, n_mercados).
+        normas (np.ndarray | None): Normas das linhas da matriz lógica; padrão: as da base.
+    """
+
+    def __init__(self, base: MatrizUtilidade, extras=None, fonte=None, linhas_alteradas=None,
+                 alteradas=None, normas=None):
+        num_linhas, num_colunas_base = base.shape
+        self.base = base
+        self.extras = MatrizUtilidade(np.zeros((num_linhas, 0))) if extras is None else extras
+        self.fonte = np.arange(num_colunas_base) if fonte is None else np.asarray(fonte, dtype=np.int64)
+        self.linhas_alteradas = (np.array([], dtype=np.int64) if linhas_alteradas is None
+                                 else np.asarray(linhas_alteradas, dtype=np.int64))
+        self.alteradas = (MatrizUtilidade(np.zeros((0, len(self.fonte)))) if alteradas is None
+                          else alteradas)
+        self.normas = base.normas if normas is None else normas
+
+        for array in (self.fonte, self.linhas_alteradas, self.normas):
+            array.flags.writeable = False
+
+        # Colunas lógicas que vêm da base e das extras, e a coluna de origem de cada uma
+        da_base = self.fonte < num_colunas_base
+        self._posicoes_base = np.flatnonzero(da_base)
+        self._colunas_base = self.fonte[da_base]
+        self._posicoes_extras = np.flatnonzero(~da_base)
+        self._colunas_extras = self.fonte[~da_base] - num_colunas_base
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.base.shape[0], len(self.fonte)
+
+    def mascara_colunas(self, colunas=None) -> np.ndarray:
+        """
+        Vetor 0/1 com as colunas selecionadas (todas, se `colunas` for None).
+        """
+        return _mascara_colunas(self.shape[1], colunas)
+
+    def similaridades(self, vetor: np.ndarray, colunas=None) -> np.ndarray:
+        """
+        Similaridade do cosseno entre `vetor` e cada linha (ver MatrizUtilidade.similaridades).
+        """
+        return _similaridades(self, vetor, colunas)
+
+    def _espalhar(self, vetores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Distribui vetores sobre as colunas lógicas entre as colunas da base e as
+        extras (colunas da base fora de `fonte` recebem 0).
+        """
+        na_base = np.zeros(vetores.shape[:-1] + (self.base.shape[1],))
+        na_base[..., self._colunas_base] = vetores[..., self._posicoes_base]
+        nas_extras = np.zeros(vetores.shape[:-1] + (self.extras.shape[1],))
+        nas_extras[..., self._colunas_extras] = vetores[..., self._posicoes_extras]
+        return na_base, nas_extras
+
+    def _combinar_linhas(self, resultado: np.ndarray, das_alteradas: np.ndarray) -> np.ndarray:
+        resultado[..., self.linhas_alteradas] = das_alteradas
+        return resultado
+
+    def produtos(self, vetores: np.ndarray) -> np.ndarray:
+        na_base, nas_extras = self._espalhar(vetores)
+        resultado = self.base.produtos(na_base) + self.extras.produtos(nas_extras)
+        return self._combinar_linhas(resultado, self.alteradas.produtos(vetores))
+
+    def somas_quadrados(self, mascaras: np.ndarray) -> np.ndarray:
+        na_base, nas_extras = self._espalhar(mascaras)
+        resultado = self.base.somas_quadrados(na_base) + self.extras.somas_quadrados(nas_extras)
+        return self._combinar_linhas(resultado, self.alteradas.somas_quadrados(mascaras))
+
+    def ponderar(self, pesos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        pesos_alteradas = pesos[..., self.linhas_alteradas]
+        if self.linhas_alteradas.size:
+            pesos = pesos.copy()
+            pesos[..., self.linhas_alteradas] = 0.0
+        termos = []
+        for termo_base, termo_extras, termo_alteradas in zip(
+            self.base.ponderar(pesos), self.extras.ponderar(pesos), self.alteradas.ponderar(pesos_alteradas)
+        ):
+            logico = np.concatenate([termo_base, termo_extras], axis=-1)[..., self.fonte]
+            termos.append(logico + termo_alteradas)
+        return termos[0], termos[1]
+
+    def linhas(self, indices) -> MatrizUtilidade:
+        """
+        Nova matriz densa (cópia) só com as linhas informadas.
+        """
+        indices = np.asarray(indices, dtype=int)
+        valores = np.hstack([self.base.valores[indices], self.extras.valores[indices]])[:, self.fonte]
+        if self.linhas_alteradas.size:
+            posicoes = np.searchsorted(self.linhas_alteradas, indices)
+            posicoes = np.minimum(posicoes, len(self.linhas_alteradas) - 1)
+            alterada = self.linhas_alteradas[posicoes] == indices
+            valores[alterada] = self.alteradas.valores[posicoes[alterada]]
+        return MatrizUtilidade(valores, normas=np.array(self.normas[indices]))
+
+    def coluna(self, j: int) -> np.ndarray:
+        """
+        Cópia da coluna `j`.
+        """
+        origem = self.fonte[j]
+        if origem < self.base.shape[1]:
+            coluna = np.array(self.base.valores[:, origem])
+        else:
+            coluna = np.array(self.extras.valores[:, origem - self.base.shape[1]])
+        coluna[self.linhas_alteradas] = self.alteradas.valores[:, j]
+        return coluna
+
+    def densa(self) -> np.ndarray:
+        """
+        Os valores da matriz lógica como um array novo (cópia completa).
+        """
+        valores = np.hstack([self.base.valores, self.extras.valores])[:, self.fonte]
+        valores[self.linhas_alteradas] = self.alteradas.valores
+        return valores
+
+    def compactada(self) -> MatrizUtilidade:
+        """
+        A matriz lógica como MatrizUtilidade densa.
+        """
+        return MatrizUtilidade(self.densa(), normas=np.array(self.normas))
+
+    def _derivar(self, **alteracoes):
+        campos = {
+            "base": self.base, "extras": self.extras, "fonte": self.fonte,
+            "linhas_alteradas": self.linhas_alteradas, "alteradas": self.alteradas, "normas": self.normas,
+        }
+        campos.update(alteracoes)
+        matriz = MatrizIncremental(**campos)
+        num_linhas, num_colunas_base = self.base.shape
+        if (matriz.extras.shape[1] > LIMITE_COMPACTACAO * max(num_colunas_base, 1)
+                or len(matriz.linhas_alteradas) > LIMITE_COMPACTACAO * num_linhas):
+            return matriz.compactada()
+        return matriz
+
+    def com_coluna(self, j: int, coluna) -> "MatrizUtilidade | MatrizIncremental":
+        """
+        Substitui a coluna `j` (ou acrescenta uma coluna ao final, se j == n_mercados):
+        a coluna vai para as extras, e as normas são corrigidas pela diferença dos quadrados.
+        """
+        coluna = np.asarray(coluna, dtype=float)
+        num_colunas = self.shape[1]
+        extras = MatrizUtilidade(
+            np.hstack([self.extras.valores, coluna[:, None]]),
+            quadrados=np.hstack([self.extras.quadrados, coluna[:, None] ** 2]),
+            avaliado=np.hstack([self.extras.avaliado, (coluna > 0).astype(float)[:, None]])
+        )
+        origem = self.base.shape[1] + extras.shape[1] - 1
+        if j == num_colunas:
+            fonte = np.append(self.fonte, origem)
+            alteradas = np.hstack([self.alteradas.valores, coluna[self.linhas_alteradas, None]])
+            quadrados_antigos = 0.0
+        else:
+            fonte = self.fonte.copy()
+            fonte[j] = origem
+            alteradas = self.alteradas.valores.copy()
+            alteradas[:, j] = coluna[self.linhas_alteradas]
+            quadrados_antigos = self.coluna(j) ** 2
+        normas = np.sqrt(np.clip(self.normas ** 2 - quadrados_antigos + coluna ** 2, 0.0, None))
+        return self._derivar(extras=extras, fonte=fonte, alteradas=MatrizUtilidade(alteradas), normas=normas)
+
+    def sem_coluna(self, j: int) -> "MatrizUtilidade | MatrizIncremental":
+        """
+        Remove a coluna `j` (a origem dela deixa de ser referenciada).
+        """
+        normas = np.sqrt(np.clip(self.normas ** 2 - self.coluna(j) ** 2, 0.0, None))
+        return self._derivar(
+            fonte=np.delete(self.fonte, j),
+            alteradas=MatrizUtilidade(np.delete(self.alteradas.valores, j, axis=1)),
+            normas=normas
+        )
+
+    def com_linhas(self, linhas, valores_linhas) -> "MatrizUtilidade | MatrizIncremental":
+        """
+        Substitui as linhas informadas (`valores_linhas`: shape (k, n_mercados)).
+        """
+        linhas = np.asarray(linhas, dtype=np.int64)
+        valores_linhas = np.asarray(valores_linhas, dtype=float)
+        manter = ~np.isin(self.linhas_alteradas, linhas)
+        todas = np.concatenate([self.linhas_alteradas[manter], linhas])
+        valores = np.vstack([self.alteradas.valores[manter], valores_linhas])
+        ordem = np.argsort(todas, kind="stable")
+        normas = np.array(self.normas)
+        normas[linhas] = np.sqrt((valores_linhas ** 2).sum(axis=1))
+        return self._derivar(
+            linhas_alteradas=todas[ordem], alteradas=MatrizUtilidade(valores[ordem]), normas=normas
+        )
+
+# =============================================================================
+# MATRIZ EM BLOCOS DE LINHAS
+# =============================================================================
+
+
+class MatrizEmBlocos:
+    """
+    Matrizes com as mesmas colunas empilhadas por linhas, sem copiá-las (ex.: a
+    matriz do modelo, mapeada em memória, seguida das linhas dos usuários
+    registrados).
+
+    Oferece as mesmas operações que MatrizUtilidade; cada uma é feita bloco a
+    bloco e os resultados são concatenados (ou somados, em `ponderar`).
+
+    Parâmetros:
+        blocos (list): MatrizUtilidade ou MatrizIncremental, na ordem das linhas.
+    """
+
+    def __init__(self, blocos: list):
+        self.blocos = list(blocos)
+        self.inicios = np.cumsum([0] + [bloco.shape[0] for bloco in self.blocos])
+        self.normas = np.concatenate([bloco.normas for bloco in self.blocos])
+        self.normas.flags.writeable = False
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return int(self.inicios[-1]), self.blocos[0].shape[1]
+
+    def mascara_colunas(self, colunas=None) -> np.ndarray:
+        """
+        Vetor 0/1 com as colunas selecionadas (todas, se `colunas` for None).
+        """
+        return _mascara_colunas(self.shape[1], colunas)
+
+    def similaridades(self, vetor: np.ndarray, colunas=None) -> np.ndarray:
+        """
+        Similaridade do cosseno entre `vetor` e cada linha (ver MatrizUtilidade.similaridades).
+        """
+        return _similaridades(self, vetor, colunas)
+
+    def produtos(self, vetores: np.ndarray) -> np.ndarray:
+        return np.concatenate([bloco.produtos(vetores) for bloco in self.blocos], axis=-1)
+
+    def somas_quadrados(self, mascaras: np.ndarray) -> np.ndarray:
+        return np.concatenate([bloco.somas_quadrados(mascaras) for bloco in self.blocos], axis=-1)
+
+    def ponderar(self, pesos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        numerador, denominador = 0.0, 0.0
+        for bloco, inicio, fim in zip(self.blocos, self.inicios[:-1], self.inicios[1:]):
+            termo_numerador, termo_denominador = bloco.ponderar(pesos[..., inicio:fim])
+            numerador = numerador + termo_numerador
+            denominador = denominador + termo_denominador
+        return numerador, denominador
+
+    def linhas(self, indices) -> MatrizUtilidade:
+        """
+        Nova matriz densa (cópia) só com as linhas informadas, na ordem dada.
+        """
+        indices = np.asarray(indices, dtype=int)
+        valores = np.empty((len(indices), self.shape[1]))
+        normas = np.empty(len(indices))
+        do_bloco = np.searchsorted(self.inicios, indices, side="right") - 1
+        for b, bloco in enumerate(self.blocos):
+            posicoes = np.flatnonzero(do_bloco == b)
+            if posicoes.size:
+                parte = bloco.linhas(indices[posicoes] - self.inicios[b])
+                valores[posicoes] = parte.valores
+                normas[posicoes] = parte.normas
+        return MatrizUtilidade(valores, normas=normas)
+
+    def coluna(self, j: int) -> np.ndarray:
+        """
+        Cópia da coluna `j`.
+        """
+        return np.concatenate([bloco.coluna(j) for bloco in self.blocos])
+
+    def densa(self) -> np.ndarray:
+        """
+        Os valores de todos os blocos como um array novo (cópia completa).
+        """
+        return np.vstack([bloco.densa() for bloco in self.blocos])
+
+# =============================================================================
+# SELEÇÃO DOS K VIZINHOS MAIS PRÓXIMOS
+# =============================================================================
+
+
+def k_mais_similares(similaridades: np.ndarray, k: int) -> np.ndarray:
+    """
+    Devolve os índices dos `k` usuários mais similares, sem ordem garantida.
+
+    Usa seleção parcial (np.argpartition), em tempo linear no número de usuários.
+
+    Parâmetros:
+        similaridades (np.ndarray): Similaridade com cada usuário, shape (n_users,).
+        k (int): Número de vizinhos desejado.
+
+    Retorno:
+        np.ndarray: Índices dos k vizinhos (todos, se k >= n_users).
+    """
+    n_users = similaridades.shape[0]
+    if k >= n_users:
+        return np.arange(n_users)
+    return np.argpartition(-similaridades, k - 1)[:k]
+
+# =============================================================================
+# ÍNDICE APROXIMADO (LSH POR PROJEÇÕES ALEATÓRIAS)
+# =============================================================================
+
+# Parâmetros padrão do índice: hiperplanos por tabela, tabelas e até quantos
+# bits o código de um balde examinado na consulta pode diferir do código do
+# vetor consultado (multi-probe). Revocação medida no docstring de IndiceLSH.
+PLANOS_LSH = 10
+TABELAS_LSH = 8
+DISTANCIA_SONDAGEM = 1
+
+
+class IndiceLSH:
+    """
+    Índice aproximado de vizinhos pela similaridade do cosseno.
+
+    Cada tabela sorteia `num_planos` hiperplanos aleatórios; o código de uma
+    linha é o padrão de sinais das suas projeções. Linhas com ângulo pequeno
+    entre si tendem a cair no mesmo balde, então a consulta só examina os
+    usuários dos baldes do vetor consultado, e não a base inteira.
+
+    As linhas são centradas (menos a média de cada coluna, fixada na construção)
+    antes de projetar: as utilidades são todas não negativas, e hiperplanos pela
+    origem quase não separam vetores de um mesmo ortante (no modelo de maio, com
+    12 planos, a consulta devolvia ~40% da base; centrada, ~2%).
+
+    A consulta examina também os baldes com código a um bit do vetor
+    consultado (multi-probe, `DISTANCIA_SONDAGEM`): com poucos planos por tabela
+    os baldes exatos perdem muitos vizinhos próximos de uma fronteira.
+
+    Precisão medida no modelo de maio (5000 usuários, 39 mercados; 300 vetores
+    de novos usuários com 1 a 3 itens sazonais), com os parâmetros padrão
+    (10 planos, 8 tabelas, sondagem de 1 bit):
+
+    - candidatos por consulta: ~800 (~16% da base), ~0,25 ms;
+    - revocação dos k vizinhos exatos (cosseno sobre todos os mercados):
+      ~96% para k=20 e ~91% para k=50;
+    - em `main.gerar_recomendacoes`, o top-3 difere do caminho exato em ~1% dos
+      pedidos com k_vizinhos=20 e em ~4% sem k (sem k, o caminho exato pondera
+      a base inteira, e o aproximado, só os candidatos).
+
+    Os parâmetros anteriores (12 planos, 4 tabelas, só o balde exato) davam
+    ~60 candidatos, revocação de ~40% para k=50 e o dobro de divergências no top-3.
+
+    O modo aproximado troca precisão por latência: o custo da consulta segue a
+    fração de candidatos, e não o tamanho da base. Com 5000 usuários ele não é
+    mais rápido que o exato; para bases maiores, cada plano a mais por tabela
+    divide os baldes (e os candidatos) por ~2, ao custo de revocação, o que
+    se compensa com mais tabelas.
+
+    Os baldes ficam em arrays ordenados por código (busca binária), sem
+    estruturas Python por usuário.
+
+    As projeções das linhas nos hiperplanos ficam guardadas, de modo que o
+    índice acompanha atualizações da matriz (coluna alterada, acrescentada ou
+    removida; linhas alteradas) com atualizações de posto 1, sem reprojetar a
+    matriz inteira. Esses métodos alteram o índice: para um índice em uso por
+    outras threads, aplique-os a uma cópia (`copiar`).
+
+    Parâmetros:
+        matriz (np.ndarray): Linhas indexadas (usuários x mercados).
+        num_planos (int): Bits por código; mais bits = baldes menores.
+        num_tabelas (int): Tabelas independentes; mais tabelas = maior revocação.
+        seed (int): Semente para sortear os hiperplanos.
+    """
+
+    def __init__(self, matriz: np.ndarray, num_planos: int = PLANOS_LSH, num_tabelas: int = TABELAS_LSH,
+                 seed: int = 42):
+        matriz = np.asarray(matriz, dtype=float)
+        self.seed = seed
+        self.num_linhas, dimensao = matriz.shape
+        self.media = matriz.mean(axis=0) if self.num_linhas else np.zeros(dimensao)
+        self.planos = np.random.default_rng(seed).standard_normal((num_tabelas, dimensao, num_planos))
+        self.pesos_bits = 1 << np.arange(num_planos, dtype=np.int64)
+
+        # Projeções de cada linha centrada, shape (num_tabelas, n_linhas, num_planos)
+        self.projecoes = np.matmul(matriz - self.media, self.planos)
+        self._ordenar()
+
+    @classmethod
+    def de_arrays(cls, planos, media, projecoes, ordens, codigos_ordenados, seed: int = 42) -> "IndiceLSH":
+        """
+        Remonta um índice a partir dos seus arrays (ex.: mapeados em memória por
+        `modelo.carregar_modelo_compartilhado`), sem projetar nem ordenar a base.
+        """
+        indice = cls.__new__(cls)
+        indice.seed = seed
+        indice.planos = planos
+        indice.media = media
+        indice.projecoes = projecoes
+        indice.num_linhas = projecoes.shape[1]
+        indice.pesos_bits = 1 << np.arange(planos.shape[2], dtype=np.int64)
+        indice.ordens = ordens
+        indice.codigos_ordenados = codigos_ordenados
+        return indice
+
+    def _ordenar(self) -> None:
+        """
+        Calcula os códigos a partir das projeções e ordena os baldes.
+        """
+        codigos = (self.projecoes > 0) @ self.pesos_bits
+        self.ordens = np.argsort(codigos, axis=1, kind="stable")
+        self.codigos_ordenados = np.take_along_axis(codigos, self.ordens, axis=1)
+
+    def _reordenar(self, linhas=None) -> None:
+        """
+        Recalcula os códigos das `linhas` (todas, se None) e move nos baldes só
+        as linhas cujo código mudou: elas saem da ordem atual e são inseridas
+        por busca binária, em O(n_linhas) por tabela em vez de uma nova ordenação.
+
+        O resultado é o mesmo de `_ordenar` (ordem por código e, dentro do
+        código, por linha).
+        """
+        linhas = np.arange(self.num_linhas) if linhas is None else np.unique(np.asarray(linhas, dtype=np.int64))
+        codigos = (self.projecoes[:, linhas, :] > 0) @ self.pesos_bits
+        ordens, ordenados = [], []
+        for ordem, codigos_ordenados, novos in zip(self.ordens, self.codigos_ordenados, codigos):
+            atuais = np.empty(self.num_linhas, dtype=codigos_ordenados.dtype)
+            atuais[ordem] = codigos_ordenados
+            mudou = atuais[linhas] != novos
+            if not mudou.any():
+                ordens.append(ordem)
+                ordenados.append(codigos_ordenados)
+                continue
+
+            movidas, codigos_movidos = linhas[mudou], novos[mudou]
+            sai = np.zeros(self.num_linhas, dtype=bool)
+            sai[movidas] = True
+            fica = ~sai[ordem]
+            ordem_fica, codigos_fica = ordem[fica], codigos_ordenados[fica]
+
+            # Chave (código, linha), crescente na ordem atual
+            chaves_fica = codigos_fica * self.num_linhas + ordem_fica
+            chaves_movidas = codigos_movidos * self.num_linhas + movidas
+            posicao = np.argsort(chaves_movidas)
+            destino = np.searchsorted(chaves_fica, chaves_movidas[posicao])
+            ordens.append(np.insert(ordem_fica, destino, movidas[posicao]))
+            ordenados.append(np.insert(codigos_fica, destino, codigos_movidos[posicao]))
+        self.ordens = np.stack(ordens)
+        self.codigos_ordenados = np.stack(ordenados)
+
+    def _codificar(self, matriz: np.ndarray) -> np.ndarray:
+        """
+        Calcula o código de cada linha (não centrada) em cada tabela, shape (num_tabelas, n_linhas).
+        """
+        sinais = np.matmul(matriz - self.media, self.planos) > 0
+        return sinais @ self.pesos_bits
+
+    def copiar(self) -> "IndiceLSH":
+        """
+        Cópia independente do índice, para ser atualizada sem afetar a original.
+        """
+        novo = copy.copy(self)
+        novo.projecoes = self.projecoes.copy()
+        return novo
+
+    def atualizar_coluna(self, j: int, coluna_antiga, coluna_nova) -> None:
+        """
+        Reflete a troca da coluna `j` da matriz indexada.
+        """
+        delta = np.asarray(coluna_nova, dtype=float) - np.asarray(coluna_antiga, dtype=float)
+        self.projecoes += delta[None, :, None] * self.planos[:, j, None, :]
+        self._reordenar()
+
+    def acrescentar_coluna(self, coluna) -> None:
+        """
+        Reflete uma nova coluna ao final da matriz: sorteia um novo componente
+        para cada hiperplano (com semente derivada da dimensão, para que o
+        resultado não dependa do histórico de atualizações) e centra a coluna
+        pela sua própria média.
+        """
+        coluna = np.asarray(coluna, dtype=float)
+        num_tabelas, dimensao, num_planos = self.planos.shape
+        plano_novo = np.random.default_rng([self.seed, dimensao]).standard_normal((num_tabelas, 1, num_planos))
+        media_coluna = coluna.mean() if coluna.size else 0.0
+        self.planos = np.concatenate([self.planos, plano_novo], axis=1)
+        self.media = np.append(self.media, media_coluna)
+        self.projecoes = self.projecoes + (coluna - media_coluna)[None, :, None] * plano_novo
+        self._reordenar()
+
+    def remover_coluna(self, j: int, coluna_antiga) -> None:
+        """
+        Reflete a remoção da coluna `j` da matriz indexada.
+        """
+        centrada = np.asarray(coluna_antiga, dtype=float) - self.media[j]
+        self.projecoes = self.projecoes - centrada[None, :, None] * self.planos[:, j, None, :]
+        self.planos = np.delete(self.planos, j, axis=1)
+        self.media = np.delete(self.media, j)
+        self._reordenar()
+
+    def atualizar_linhas(self, linhas, valores_linhas) -> None:
+        """
+        Reprojeta apenas as linhas informadas, shape de `valores_linhas`: (k, dimensao).
+        """
+        self.projecoes[:, np.asarray(linhas, dtype=int), :] = np.matmul(
+            np.asarray(valores_linhas, dtype=float) - self.media, self.planos
+        )
+        self._reordenar(linhas)
+
+    def consultar(self, vetor: np.ndarray, minimo: int = 1, distancia: int = DISTANCIA_SONDAGEM) -> np.ndarray:
+        """
+        Devolve os índices candidatos a vizinhos do vetor.
+
+        Em cada tabela são examinados o balde do vetor e os baldes cujo código
+        difere dele em até `distancia` bits. Se ainda houver menos de `minimo`
+        candidatos, a distância é aumentada (até 2 bits).
+
+        Parâmetros:
+            vetor (np.ndarray): Vetor consultado (não centrado), shape (dimensao,).
+            minimo (int): Número mínimo desejado de candidatos.
+            distancia (int): Bits trocados nos códigos dos baldes examinados (0 = só o exato).
+
+        Retorno:
+            np.ndarray: Índices (ordenados, sem repetição) das linhas candidatas.
+        """
+        codigos = self._codificar(np.asarray(vetor, dtype=float)[None, :])[:, 0]
+        candidatos = self._buscar(codigos[:, None] ^ self._mascaras(distancia)[None, :])
+        while candidatos.size < minimo and distancia < 2:
+            distancia += 1
+            candidatos = self._buscar(codigos[:, None] ^ self._mascaras(distancia)[None, :])
+        return candidatos
+
+    def _mascaras(self, distancia: int) -> np.ndarray:
+        """
+        Máscaras XOR com até `distancia` bits ligados (a primeira é 0, o balde exato).
+        """
+        num_planos = len(self.pesos_bits)
+        mascaras = [0]
+        for bits in range(1, min(distancia, num_planos) + 1):
+            mascaras.extend(int(self.pesos_bits[list(c)].sum()) for c in combinations(range(num_planos), bits))
+        return np.asarray(mascaras, dtype=np.int64)
+
+    def _buscar(self, codigos: np.ndarray) -> np.ndarray:
+        """
+        Junta as linhas dos baldes informados; `codigos` tem uma linha por tabela.
+        """
+        codigos = codigos.reshape(len(self.ordens), -1)
+        partes = []
+        for ordem, ordenados, cods in zip(self.ordens, self.codigos_ordenados, codigos):
+            inicios = np.searchsorted(ordenados, cods, side="left")
+            fins = np.searchsorted(ordenados, cods, side="right")
+            partes.extend(ordem[i:f] for i, f in zip(inicios, fins) if f > i)
+        if not partes:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(partes))
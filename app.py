@@ -1,13 +1,17 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from models import db, Usuario, Avaliacao
-from folium.plugins import MarkerCluster
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
+from models import db, Avaliacao
 from datetime import datetime
 import pandas as pd
-import folium
 import os
-import csv
+import threading
+import uuid
 
 from Processamento.main import gerar_recomendacoes
+from Processamento.cache_recomendacoes import obter_cache
+from Processamento.catalogo import obter_catalogo
+from Processamento.mapa_mercados import obter_geojson, obter_mapa_html
+from Processamento.modelo import obter_modelo
+from Processamento.usuarios_registrados import registrar_usuario as registrar_usuario_modelo
 
 print("Iniciando app Flask...")
 
@@ -24,15 +28,32 @@ with app.app_context():
     except Exception as e:
         print("Erro ao criar o banco de dados:", e)
 
+def aquecer_aplicacao():
+    # Catálogo, mapa e modelo do mês atual, gerados uma vez (refeitos só se as
+    # entradas mudarem); requisições que chegam antes aguardam nas travas deles
+    try:
+        obter_catalogo()
+        obter_mapa_html()
+        obter_modelo(pd.Timestamp.now().month)
+        print("Aquecimento concluído.")
+    except FileNotFoundError as e:
+        print("Erro ao carregar o catálogo de mercados:", e)
+
+# O aquecimento roda em segundo plano para não atrasar a importação do app
+# (SRA_AQUECER=0 desativa; tudo é então gerado na primeira requisição)
+aquecimento = None
+if os.environ.get('SRA_AQUECER', '1') != '0':
+    aquecimento = threading.Thread(target=aquecer_aplicacao, name='aquecimento', daemon=True)
+    aquecimento.start()
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/avaliar', methods=['GET', 'POST'])
 def avaliar():
-    # Carrega os produtores do CSV
-    df = pd.read_csv("Processamento/coordenadas_associacoes_df.csv")
-    produtores = sorted((df['Mercado'].str.strip() + " - " + df['Endereço'].str.strip()).unique())
+    # Produtores do catálogo (lista já ordenada)
+    produtores = obter_catalogo().produtores
 
     if request.method == 'POST':
         nome = request.form['nome']
@@ -66,6 +87,7 @@ def cadastrar_user():
 
 @app.route('/registrar', methods=['POST'])
 def registrar_usuario():
+    session.setdefault('id_usuario', uuid.uuid4().hex)
     session['nome'] = request.form['nome']
     session['dist_max_km'] = float(request.form['dist_max_km'])
     session['latitude'] = request.form['latitude']
@@ -137,6 +159,10 @@ def recomendacoes():
     )
 
     print("Mercados Recomendados: ", mercados)
+
+    # O usuário passa a ser vizinho nas recomendações seguintes do mês
+    if mercados and session.get('id_usuario'):
+        registrar_usuario_modelo(session['id_usuario'], preferencias, organico, mes_atual)
     
     if not mercados:
         flash('Nenhuma das suas preferências está disponível no mês selecionado. Tente outros produtos ou outra data.', 'warning')
@@ -145,33 +171,32 @@ def recomendacoes():
                            mercados=mercados,
                            lat=latitude, lon=longitude)
 
-@app.route('/mapa')
-def mapa():    
-    mapa = folium.Map(location=[-15.8, -47.9], zoom_start=11)
-    cluster = MarkerCluster().add_to(mapa)
-
-    usuario_id = request.args.get('usuario_id')
-    usuario = Usuario.query.get(usuario_id)
-
-    with open('Processamento/coordenadas_associacoes_df.csv', newline='', encoding='utf-8') as csvfile:
-        leitor = csv.DictReader(csvfile)
-        for linha in leitor:
-            nome_mercado = linha['Mercado']
-            endereco = linha['Endereço']
-            lat = float(linha['Latitude'])
-            lon = float(linha['Longitude'])
-
-            folium.Marker(
-                location=[lat, lon],
-                popup=f"<strong>{nome_mercado}</strong><br>Endereço: {endereco}",
-                icon=folium.Icon(color='blue')
-            ).add_to(cluster)
-
-    os.makedirs('static/mapas', exist_ok=True)
-    mapa.save('static/mapas/mapa.html')
+@app.route('/recomendacoes/cache')
+def estatisticas_cache():
+    # Contadores do cache de recomendações (acertos, falhas, descartes), para dimensioná-lo
+    return jsonify(obter_cache().estatisticas())
 
+@app.route('/mapa')
+def mapa():
     return render_template('mapa.html')
 
+@app.route('/mapa/mercados.html')
+def mapa_html():
+    # Mapa pré-renderizado por versão do catálogo; o navegador revalida pelo ETag
+    return servir_conteudo_mapa(obter_mapa_html())
+
+@app.route('/mapa/mercados.geojson')
+def mapa_geojson():
+    # Feed compacto com os mercados (usado pelo mapa quando o catálogo é grande)
+    return servir_conteudo_mapa(obter_geojson())
+
+def servir_conteudo_mapa(conteudo):
+    resposta = Response(conteudo.conteudo, mimetype=conteudo.tipo)
+    resposta.set_etag(conteudo.etag, weak=conteudo.etag_fraca)
+    resposta.last_modified = conteudo.modificado_em
+    resposta.cache_control.no_cache = True
+    return resposta.make_conditional(request)
+
 
 if __name__ == '__main__':
     app.run(debug=True)